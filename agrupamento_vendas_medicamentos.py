@@ -1,17 +1,89 @@
+import argparse
 import pandas as pd
 import json
 import os
 import time
 import decimal
+import gzip
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from datetime import datetime
-from tqdm import tqdm
-from meuDB import get_db_cursor
+from dimensoes import (DimensaoCache, TABELA_MUNICIPIOS, TABELA_PRINCIPIOS, TABELA_CONSELHOS,
+                       TABELA_VENDAS_CODIFICADA)
+from exportacao_parquet import DIRETORIO_PARQUET, padrao_arquivos
+from estados import TABELA_MUNICIPIOS_UF, TABELA_VENDAS_UF, normalizar_ufs
+from cache_resultados import CacheResultados, versao_agregada, versao_arquivos, versao_tabela
+from atualizacao_incremental import AtualizadorIncremental, CAMINHO_BASE_INCREMENTAL
+from vendas_agregadas import FONTES_AGREGADA, TABELA_AGREGADA, VendasAgregadas
+from colunas_compactas import MontadorColunas
+from relatorio_vendas import (RelatorioVendas, calcular_ranking, calcular_relatorio, lideres_ranking,
+                              imprimir_analise_por_ano, imprimir_amostra)
+from metricas import (Metricas, SILENCIOSO, adicionar_argumentos, definir_verbosidade, detalhado,
+                      nivel_dos_argumentos, verbosidade)
 import logging
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+MODOS_AGRUPAMENTO = ('consulta_unica', 'por_municipio')
+FORMATOS_JSON = ('registros', 'colunar')
+TAMANHO_TRECHO_JSON = 100_000  # valores escritos por vez no JSON colunar
+# Nome da tabela de nomes de cada coluna de texto no JSON colunar
+TABELAS_NOMES_JSON = {
+    'MUNICIPIO_VENDA': 'municipios',
+    'PRINCIPIO_ATIVO': 'principios',
+    'CONSELHO_PRESCRITOR': 'conselhos',
+    'UF_CONSELHO_PRESCRITOR': 'ufs_conselho',
+    'UF_VENDA': 'ufs',
+}
+
+# Dimensões de agrupamento, na ordem de idx_groupby_principal (depois de ANO_VENDA, MES_VENDA);
+# UF_VENDA só existe em vendas_medicamentos_uf, onde vem antes de tudo no índice
+DIMENSOES = ('MUNICIPIO_VENDA', 'PRINCIPIO_ATIVO', 'CONSELHO_PRESCRITOR', 'UF_CONSELHO_PRESCRITOR', 'UF_VENDA')
+DIMENSOES_PADRAO = ('MUNICIPIO_VENDA', 'PRINCIPIO_ATIVO')
+GRANULARIDADES = ('ano', 'mes')
+PARTICOES = ('ano', 'mes', 'uf')
+
+_COLUNAS_NOMES = {dimensao: dimensao for dimensao in DIMENSOES if dimensao != 'UF_VENDA'}
+
+# Fonte dos totais: tabela, coluna somada, coluna de cada dimensão disponível e
+# tabela que define a versão dos dados (para o cache de resultados)
+FONTES = {
+    # mantida pela ingestão (sem conselho prescritor), no mesmo commit do detalhe
+    'agregada': {'tabela': TABELA_AGREGADA, 'quantidade': 'TOTAL_VENDIDO', 'versao': TABELA_AGREGADA,
+                 'colunas': {'MUNICIPIO_VENDA': 'MUNICIPIO_VENDA', 'PRINCIPIO_ATIVO': 'PRINCIPIO_ATIVO'}},
+    # ~30M linhas
+    'detalhe': {'tabela': 'trampo.vendas_medicamentos', 'quantidade': 'QTD_VENDIDA',
+                'versao': 'trampo.vendas_medicamentos', 'colunas': _COLUNAS_NOMES},
+    # chaves inteiras (dimensoes.py); os nomes voltam só no DataFrame final
+    'codificada': {'tabela': TABELA_VENDAS_CODIFICADA, 'quantidade': 'QTD_VENDIDA',
+                   'versao': TABELA_VENDAS_CODIFICADA,
+                   'colunas': {'MUNICIPIO_VENDA': 'ID_MUNICIPIO', 'PRINCIPIO_ATIVO': 'ID_PRINCIPIO_ATIVO',
+                               'CONSELHO_PRESCRITOR': 'ID_CONSELHO_PRESCRITOR',
+                               'UF_CONSELHO_PRESCRITOR': 'UF_CONSELHO_PRESCRITOR'}},
+    # arquivos de exportacao_parquet.py, consultados com DuckDB (sem MySQL);
+    # usa o conjunto agregado, ou o detalhe quando há dimensões de conselho
+    'parquet': {'tabela': None, 'quantidade': None, 'versao': None, 'colunas': _COLUNAS_NOMES},
+    # vários estados (estados.py), com UF_VENDA na frente do índice
+    'estados': {'tabela': TABELA_VENDAS_UF, 'quantidade': 'QTD_VENDIDA', 'versao': TABELA_VENDAS_UF,
+                'colunas': {**_COLUNAS_NOMES, 'UF_VENDA': 'UF_VENDA'}},
+}
+
+# Rankings gravados junto com os outros arquivos: nome -> (grupos, item ranqueado)
+RANKINGS_PADRAO = {
+    'principios_por_ano': (('ANO_VENDA',), 'PRINCIPIO_ATIVO'),
+    'municipios_por_ano': (('ANO_VENDA',), 'MUNICIPIO_VENDA'),
+    'principios_por_municipio_ano': (('ANO_VENDA', 'MUNICIPIO_VENDA'), 'PRINCIPIO_ATIVO'),
+}
+
+# Tabela de dimensão de cada coluna codificada na fonte 'codificada'
+TABELAS_DIMENSAO = {
+    'MUNICIPIO_VENDA': TABELA_MUNICIPIOS,
+    'PRINCIPIO_ATIVO': TABELA_PRINCIPIOS,
+    'CONSELHO_PRESCRITOR': TABELA_CONSELHOS,
+}
+
 class DecimalEncoder(json.JSONEncoder):
     """Encoder personalizado para converter Decimal para float"""
     def default(self, obj):
@@ -19,99 +91,172 @@ class DecimalEncoder(json.JSONEncoder):
             return float(obj)
         return super(DecimalEncoder, self).default(obj)
 
+def abrir_saida(caminho_arquivo, comprimir=False):
+    """Abre o arquivo de saída em texto UTF-8, com gzip quando `comprimir`"""
+    if comprimir:
+        return gzip.open(caminho_arquivo, 'wt', encoding='utf-8', compresslevel=6)
+    return open(caminho_arquivo, 'w', encoding='utf-8')
+
+def escrever_array_json(arquivo, valores):
+    """Escreve uma lista JSON de números em trechos, sem montar a string inteira (NaN sai como null)"""
+    arquivo.write('[')
+    for inicio in range(0, len(valores), TAMANHO_TRECHO_JSON):
+        if inicio:
+            arquivo.write(',')
+        trecho = valores[inicio:inicio + TAMANHO_TRECHO_JSON].tolist()
+        if valores.dtype.kind == 'f':
+            arquivo.write(','.join('null' if valor != valor else str(valor) for valor in trecho))
+        else:
+            arquivo.write(','.join(map(str, trecho)))
+    arquivo.write(']')
+
+def escrever_json_colunar(arquivo, df):
+    """Escreve o DataFrame agrupado no formato colunar do dashboard
+    
+    {"formato": "colunar", "registros": n, "municipios": [...], "principios": [...],
+     "ANO_VENDA": [...], "MUNICIPIO_VENDA": [índices], "PRINCIPIO_ATIVO": [índices],
+     "TOTAL_VENDIDO": [...]}
+    
+    Municípios e princípios ativos vão uma vez só nas tabelas de nomes; as
+    colunas guardam o índice de cada linha nessas tabelas (-1 para nome nulo).
+    Com outras dimensões/granularidade, cada coluna de texto ganha sua tabela
+    (TABELAS_NOMES_JSON) e MES_VENDA sai como array numérico.
+    """
+    compacto = dict(ensure_ascii=False, separators=(',', ':'))
+    colunas = []
+    arquivo.write('{"formato":"colunar","registros":%d' % len(df))
+    for nome in df.columns:
+        if nome in TABELAS_NOMES_JSON:
+            codigos, nomes = pd.factorize(df[nome], sort=True)
+            arquivo.write(f',"{TABELAS_NOMES_JSON[nome]}":' + json.dumps(nomes.tolist(), **compacto))
+            colunas.append((nome, codigos))
+        elif nome == 'TOTAL_VENDIDO':
+            totais = df[nome].to_numpy(dtype=float)
+            if (totais % 1 == 0).all():
+                totais = totais.astype('int64')  # somas de unidades: sem ".0" no arquivo
+            colunas.append((nome, totais))
+        else:
+            colunas.append((nome, df[nome].to_numpy(dtype='int64')))
+    for nome, valores in colunas:
+        arquivo.write(f',"{nome}":')
+        escrever_array_json(arquivo, valores)
+    arquivo.write('}')
+
+def escolher_fonte(fonte):
+    """Troca a fonte 'agregada' pela de origem se vendas_agregadas não tiver todos os meses carregados
+    
+    A agregada fica vazia (ou sem os meses mais antigos) até rodar
+    vendas_agregadas.py --reconstruir; ler dela daria totais incompletos.
+    Os meses vêm do detalhe e da tabela codificada (carga --codificado).
+    """
+    if fonte != 'agregada':
+        return fonte
+    por_fonte = {origem: VendasAgregadas(fontes=(origem,)).meses_faltando() for origem in FONTES_AGREGADA}
+    faltando = sorted(set().union(*por_fonte.values()))
+    if not faltando:
+        return fonte
+    origem = 'detalhe' if por_fonte['detalhe'] else 'codificada'
+    meses = ', '.join(f"{mes:02d}/{ano}" for ano, mes in faltando[:6]) + (', ...' if len(faltando) > 6 else '')
+    print(f"⚠️  vendas_agregadas não tem {len(faltando)} mês(es) já carregados ({meses})")
+    print(f"   Usando a fonte {origem}; rode 'python vendas_agregadas.py --reconstruir --fonte {origem}' "
+          "para voltar à agregada")
+    return origem
+
 class AgrupadorVendasMedicamentos:
-    def __init__(self):
-        self.df_final = pd.DataFrame(columns=[
-            'ANO_VENDA', 
-            'MUNICIPIO_VENDA', 
-            'PRINCIPIO_ATIVO', 
-            'TOTAL_VENDIDO'
-        ])
-        self.tempo_espera = 1  # segundos entre consultas
+    def __init__(self, fonte='agregada', diretorio_parquet=DIRETORIO_PARQUET,
+                 dimensoes=DIMENSOES_PADRAO, granularidade='ano', cache=None, ufs=None, metricas=None):
+        if fonte not in FONTES:
+            raise ValueError(f"Fonte inválida: {fonte} (opções: {', '.join(FONTES)})")
+        if granularidade not in GRANULARIDADES:
+            raise ValueError(f"Granularidade inválida: {granularidade} (opções: {', '.join(GRANULARIDADES)})")
+        dimensoes = list(dimensoes)
+        if fonte == 'estados' and 'UF_VENDA' not in dimensoes:
+            dimensoes = ['UF_VENDA'] + dimensoes  # resultado sempre separado por estado
+        invalidas = [dimensao for dimensao in dimensoes if dimensao not in DIMENSOES]
+        if invalidas or not dimensoes:
+            raise ValueError(f"Dimensões inválidas: {invalidas} (opções: {', '.join(DIMENSOES)})")
+        
+        self.dimensoes = dimensoes
+        self.granularidade = granularidade  # 'ano' ou 'mes' (séries mensais)
+        self.colunas_tempo = ['ANO_VENDA', 'MES_VENDA'] if granularidade == 'mes' else ['ANO_VENDA']
+        self.colunas_resultado = self.colunas_tempo + dimensoes + ['TOTAL_VENDIDO']
+        self.tempo_espera = 1  # espera base (s) para novas tentativas e recuo quando o banco fica lento
+        self.max_paralelo = 4  # consultas simultâneas no modo por_municipio (e por UF)
+        self.tamanho_fetch = 50_000  # linhas por fetchmany no modo consulta_unica
+        self.fonte = fonte
+        self.tabela = FONTES[fonte]['tabela']
+        self.coluna_quantidade = FONTES[fonte]['quantidade']
+        # SUM de inteiro vira DECIMAL no MySQL (Decimal no Python); o CAST traz o total já como inteiro
+        self.tipo_total = 'SIGNED'
+        self.colunas_fonte = FONTES[fonte]['colunas']  # dimensão -> coluna na fonte
+        self.codificada = fonte == 'codificada'
+        # Colunas que chegam como IDs (int) e só viram nomes em decodificar
+        self._colunas_ids = [dimensao for dimensao in dimensoes if self.codificada and dimensao in TABELAS_DIMENSAO]
+        self.df_final = MontadorColunas(self.colunas_resultado, self._colunas_ids).dataframe()
+        self._duckdb = None
+        self._relatorio = None  # (df_final, parâmetros, RelatorioVendas) do último relatório
+        self._nomes_dimensoes = {}  # dimensão -> {ID: nome}, só na fonte codificada
+        self.cache = cache  # CacheResultados opcional
+        # Tempos de consulta, fetch, concatenação e serialização, linhas lidas
+        self.metricas = metricas if metricas is not None else Metricas('agrupamento', fonte=fonte)
+        self.ufs = normalizar_ufs(ufs) if ufs else None  # filtro de UFs na fonte estados
+        self._versao = None
+        self._padrao_parquet = None
+        if fonte == 'parquet':
+            conjunto = 'agregada' if all(d in FONTES['agregada']['colunas'] for d in dimensoes) else 'detalhe'
+            self._padrao_parquet = padrao_arquivos(diretorio_parquet, conjunto)
+            self.tabela = (f"read_parquet('{padrao_arquivos(diretorio_parquet, conjunto)}', "
+                           f"hive_partitioning = true)")
+            self.coluna_quantidade = 'TOTAL_VENDIDO' if conjunto == 'agregada' else 'QTD_VENDIDA'
+            self.tipo_total = 'BIGINT'  # no DuckDB SIGNED é inteiro de 32 bits
+        
+        faltando = [dimensao for dimensao in dimensoes if dimensao not in self.colunas_fonte]
+        if faltando:
+            sugestao = 'estados' if 'UF_VENDA' in faltando else 'detalhe'
+            raise ValueError(f"A fonte '{fonte}' não tem {', '.join(faltando)} (use --fonte {sugestao})")
+        if self.ufs and 'UF_VENDA' not in self.colunas_fonte:
+            raise ValueError("Filtro de UFs só existe na fonte 'estados'")
+        self.coluna_municipio = self.colunas_fonte['MUNICIPIO_VENDA']
 
-    # No método obter_estatisticas(), modifique:
-    def obter_estatisticas(self):
-        if self.df_final.empty:
-            return {"status": "vazio"}
-        
-        # Verificação de soma
-        soma_dataframe = float(self.df_final['TOTAL_VENDIDO'].sum())
-        soma_por_ano = 0
-        for ano in self.df_final['ANO_VENDA'].unique():
-            df_ano = self.df_final[self.df_final['ANO_VENDA'] == ano]
-            soma_por_ano += float(df_ano['TOTAL_VENDIDO'].sum())
-        
-        print(f"🔍 DEBUG - Soma pelo DataFrame: {soma_dataframe:,.0f}")
-        print(f"🔍 DEBUG - Soma por ano: {soma_por_ano:,.0f}")
-        print(f"🔍 DEBUG - Diferença: {soma_por_ano - soma_dataframe:,.0f}")
-        
-        estatisticas = {
-            "total_registros": len(self.df_final),
-            "municipios_unicos": self.df_final['MUNICIPIO_VENDA'].nunique(),
-            "anos_unicos": self.df_final['ANO_VENDA'].nunique(),
-            "principios_unicos": self.df_final['PRINCIPIO_ATIVO'].nunique(),
-            "total_vendido": soma_dataframe,  # Usar a soma direta do DataFrame
-            "data_geracao": datetime.now().isoformat()
-        }
+    def relatorio(self, top_n=3, ano_amostra=2016, tamanho_amostra=5):
+        """RelatorioVendas do agrupamento, calculado uma vez por DataFrame e parâmetros
         
-        return estatisticas
+        Na fonte parquet as contas são feitas pelo DuckDB direto nos arquivos.
+        """
+        chave = (top_n, ano_amostra, tamanho_amostra)
+        if self._relatorio is None or self._relatorio[0] is not self.df_final or self._relatorio[1] != chave:
+            if self.fonte == 'parquet':
+                relatorio = self.relatorio_parquet(top_n, ano_amostra, tamanho_amostra)
+            else:
+                relatorio = calcular_relatorio(self.df_final, top_n, ano_amostra, tamanho_amostra)
+            self._relatorio = (self.df_final, chave, relatorio)
+        return self._relatorio[2]
 
     def analisar_dados_por_ano(self):
         """Faz análise detalhada por ano"""
-        if self.df_final.empty:
-            print("⚠️ DataFrame vazio")
-            return
-        
-        print("\n🔍 ANÁLISE DETALHADA POR ANO:")
-        print("=" * 50)
-        
-        # Anos presentes
-        anos_unicos = sorted(self.df_final['ANO_VENDA'].unique())
-        print(f"📅 ANOS NO DATAFRAME: {anos_unicos}")
-        
-        # Estatísticas por ano
-        for ano in anos_unicos:
-            df_ano = self.df_final[self.df_final['ANO_VENDA'] == ano]
-            total_vendido_ano = df_ano['TOTAL_VENDIDO'].sum()
-            municipios_ano = df_ano['MUNICIPIO_VENDA'].nunique()
-            
-            print(f"\n📊 {ano}:")
-            print(f"   📦 Total vendido: {total_vendido_ano:,.0f} unidades")
-            print(f"   🏙️  Municípios: {municipios_ano}")
-            print(f"   📋 Registros: {len(df_ano):,}")
-            
-            # Top 3 princípios ativos desse ano
-            top_principios = df_ano.groupby('PRINCIPIO_ATIVO')['TOTAL_VENDIDO'].sum().nlargest(3)
-            print(f"   💊 Top 3 princípios ativos:")
-            for principio, total in top_principios.items():
-                print(f"      - {principio}: {total:,.0f}")
+        imprimir_analise_por_ano(self.relatorio(), "PARQUET" if self.fonte == 'parquet' else "DATAFRAME")
 
     def mostrar_amostra_2016(self, n=5):
         """Mostra amostra específica de 2016"""
-        if self.df_final.empty:
-            return
-        
-        df_2016 = self.df_final[self.df_final['ANO_VENDA'] == 2016]
-        
-        if df_2016.empty:
-            print("\n❌ Nenhum dado encontrado para 2016")
-            return
-        
-        print(f"\n🎯 AMOSTRA DE DADOS DE 2016 (primeiros {n} registros):")
-        print("=" * 60)
-        print(df_2016.head(n).to_string(index=False))
-        
-        print(f"\n📈 Total de registros de 2016: {len(df_2016):,}")
-        print(f"📦 Volume total 2016: {df_2016['TOTAL_VENDIDO'].sum():,.0f} unidades")
+        imprimir_amostra(self.relatorio(tamanho_amostra=n))
         
     def obter_municipios_rj(self):
         """Obtém a lista de municípios do RJ do banco"""
+        return self.obter_municipios('RJ')
+    
+    def obter_municipios(self, uf='RJ'):
+        """Lista de municípios de uma UF: municipios_rj para o RJ, municipios_uf para as demais"""
+        from meuDB import get_db_cursor
         municipios = []
         
         try:
             with get_db_cursor(dictionary=True) as cursor:
-                print("🔄 Consultando municípios do RJ...")
-                cursor.execute("SELECT ID, NOME FROM trampo.municipios_rj ORDER BY NOME")
+                print(f"🔄 Consultando municípios do {uf}...")
+                if uf == 'RJ':
+                    cursor.execute("SELECT ID, NOME FROM trampo.municipios_rj ORDER BY NOME")
+                else:
+                    cursor.execute(f"SELECT NULL AS ID, NOME FROM {TABELA_MUNICIPIOS_UF} WHERE UF = %s ORDER BY NOME",
+                                   (uf,))
                 resultados = cursor.fetchall()
                 
                 for municipio in resultados:
@@ -120,66 +265,92 @@ class AgrupadorVendasMedicamentos:
                         'nome': municipio['NOME']
                     })
                 
-                print(f"✅ Encontrados {len(municipios)} municípios do RJ")
+                print(f"✅ Encontrados {len(municipios)} municípios do {uf}")
                 return municipios
                 
         except Exception as e:
             print(f"❌ Erro ao obter municípios: {e}")
             return []
     
-    def converter_decimals_para_float(self, dados):
-        """Converte valores Decimal para float em uma lista de dicionários"""
-        for registro in dados:
-            for chave, valor in registro.items():
-                if isinstance(valor, decimal.Decimal):
-                    registro[chave] = float(valor)
-        return dados
+    def decodificar(self, df):
+        """Na fonte codificada, troca os IDs das dimensões pelos nomes"""
+        if not self.codificada or df.empty:
+            return df
+        for dimensao, tabela in TABELAS_DIMENSAO.items():
+            if dimensao in df.columns:
+                if dimensao not in self._nomes_dimensoes:
+                    self._nomes_dimensoes[dimensao] = DimensaoCache(tabela, permitir_novos=False).nomes_por_id()
+                df[dimensao] = df[dimensao].map(self._nomes_dimensoes[dimensao]).astype('category')
+        return df
     
-    def agrupar_por_municipio(self, municipio_nome, tentativa=1):
-        """Agrupa vendas para um município específico - COM CONTROLE DE ESPERA"""
-        try:
-            print(f"🔄 Consultando município: {municipio_nome} (tentativa {tentativa})...")
-            
-            with get_db_cursor(dictionary=True) as cursor:
-                query = """
-                    SELECT 
-                        ANO_VENDA, 
-                        MUNICIPIO_VENDA, 
-                        PRINCIPIO_ATIVO,
-                        SUM(QTD_VENDIDA) as TOTAL_VENDIDO
-                    FROM trampo.vendas_medicamentos  
-                    WHERE MUNICIPIO_VENDA = %s
-                    GROUP BY ANO_VENDA, MUNICIPIO_VENDA, PRINCIPIO_ATIVO
-                    ORDER BY TOTAL_VENDIDO DESC
-                """
+    def agrupar_por_municipio(self, municipio_nome, pool=None, limitador=None, municipio_id=None):
+        """Agrupa vendas para um município específico
+        
+        Usa um cursor do `pool` quando informado (senão abre uma conexão) e
+        respeita o `limitador` de paralelismo. Em caso de timeout tenta de
+        novo até 3 vezes, com espera exponencial. Na fonte codificada o
+        filtro é pelo `municipio_id`. Retorna a lista de lotes do fetchmany
+        (tuplas na ordem de colunas_resultado), sem juntar tudo numa lista.
+        """
+        from meuDB import get_db_cursor
+        query = self.consulta_agrupamento(f"WHERE {self.coluna_municipio} = %s")
+        parametros = (municipio_id if self.codificada else municipio_nome,)
+        
+        chave = None
+        if self.cache is not None:
+            chave = self.cache.chave(self.tabela, self.versao_dados(), query, parametros)
+            linhas = self.cache.obter(chave)
+            if linhas is not None:
+                self.metricas.contar('acertos_cache')
+                if detalhado():
+                    print(f"🗃️  Município '{municipio_nome}': {len(linhas)} registros do cache")
+                return [linhas] if linhas else []
+        
+        for tentativa in range(1, 4):
+            try:
+                if detalhado():
+                    print(f"🔄 Consultando município: {municipio_nome} (tentativa {tentativa})...")
                 
-                # Executar consulta e AGUARDAR resultado
-                inicio = time.time()
-                cursor.execute(query, (municipio_nome,))
-                resultados = cursor.fetchall()
-                fim = time.time()
+                with (limitador.vaga() if limitador else nullcontext({})) as medicao:
+                    with (pool.cursor() if pool else get_db_cursor(dictionary=False)) as cursor:
+                        # Executar consulta e AGUARDAR resultado
+                        inicio = time.perf_counter()
+                        cursor.execute(query, parametros)
+                        self.metricas.registrar('consulta', time.perf_counter() - inicio)
+                        lotes = list(self._buscar_lotes(cursor))
+                        fim = time.perf_counter()
+                    registros = sum(len(lote) for lote in lotes)
+                    medicao['unidades'] = registros
                 
-                # Converter Decimals para float
-                resultados = self.converter_decimals_para_float(resultados)
+                if detalhado():
+                    print(f"✅ Município '{municipio_nome}': {registros} registros em {fim - inicio:.2f}s")
                 
-                tempo_consulta = fim - inicio
-                print(f"✅ Município '{municipio_nome}': {len(resultados)} registros em {tempo_consulta:.2f}s")
+                if chave is not None:
+                    self.cache.gravar(chave, self.tabela, self.versao_dados(),
+                                      [linha for lote in lotes for linha in lote])
+                return lotes
                 
-                return resultados
+            except Exception as e:
+                print(f"❌ Erro ao agrupar município {municipio_nome}: {e}")
                 
-        except Exception as e:
-            print(f"❌ Erro ao agrupar município {municipio_nome}: {e}")
-            
-            # Tentar novamente se for erro de timeout
-            if "timeout" in str(e).lower() and tentativa < 3:
-                print(f"🔄 Tentando novamente ({tentativa + 1}/3) após {self.tempo_espera}s...")
-                time.sleep(self.tempo_espera)
-                return self.agrupar_por_municipio(municipio_nome, tentativa + 1)
-            else:
-                return []
+                # Tentar novamente se for erro de timeout
+                if "timeout" in str(e).lower() and tentativa < 3:
+                    espera = self.tempo_espera * 2 ** (tentativa - 1)
+                    print(f"🔄 Tentando novamente ({tentativa + 1}/3) após {espera}s...")
+                    time.sleep(espera)
+                else:
+                    return []
+        
+        return []
     
-    def processar_todos_municipios(self, municipios_limit=None):
-        """Processa todos os municípios do RJ - COM CONTROLE DE EXECUÇÃO"""
+    def processar_todos_municipios(self, municipios_limit=None, max_paralelo=None):
+        """Processa todos os municípios do RJ com consultas concorrentes
+        
+        Até `max_paralelo` consultas ao mesmo tempo, cada uma com uma conexão
+        do pool. O limite efetivo cai quando a latência sobe (e volta a subir
+        quando o banco se recupera), no lugar da pausa fixa entre consultas.
+        """
+        max_paralelo = max_paralelo or self.max_paralelo
         municipios = self.obter_municipios_rj()
         
         if not municipios:
@@ -196,44 +367,53 @@ class AgrupadorVendasMedicamentos:
         total_registros = 0
         municipios_com_dados = 0
         municipios_sem_dados = 0
+        resultados_por_municipio = {}
         
-        print(f"\n🚀 INICIANDO PROCESSAMENTO DE {len(municipios)} MUNICÍPIOS")
+        print(f"\n🚀 INICIANDO PROCESSAMENTO DE {len(municipios)} MUNICÍPIOS ({max_paralelo} em paralelo)")
         print("=" * 60)
         
-        # Barra de progresso com controle de tempo
-        with tqdm(total=len(municipios), desc="🏙️ Processando municípios") as pbar:
-            for i, municipio in enumerate(municipios, 1):
-                nome_municipio = municipio['nome']
-                
-                print(f"\n[{i}/{len(municipios)}] Processando: {nome_municipio}")
-                
-                # Agrupar dados do município (AGUARDANDO resultado)
-                dados_municipio = self.agrupar_por_municipio(nome_municipio)
+        from tqdm import tqdm
+        from pool_conexoes import PoolCursores, LimitadorAdaptativo
+        limitador = LimitadorAdaptativo(max_paralelo, espera_base=self.tempo_espera)
+        
+        with PoolCursores(max_paralelo, dictionary=False) as pool, \
+                ThreadPoolExecutor(max_workers=max_paralelo) as executor, \
+                tqdm(total=len(municipios), desc="🏙️ Processando municípios",
+                     disable=verbosidade() == SILENCIOSO) as pbar:
+            futuros = {
+                executor.submit(self.agrupar_por_municipio, municipio['nome'], pool, limitador,
+                                municipio['id']): municipio['nome']
+                for municipio in municipios
+            }
+            
+            for futuro in as_completed(futuros):
+                nome_municipio = futuros[futuro]
+                dados_municipio = futuro.result()
                 
                 if dados_municipio:
-                    # Adicionar ao DataFrame
-                    df_municipio = pd.DataFrame(dados_municipio)
-                    self.df_final = pd.concat([self.df_final, df_municipio], ignore_index=True)
-                    
-                    total_registros += len(dados_municipio)
+                    resultados_por_municipio[nome_municipio] = dados_municipio
+                    total_registros += sum(len(lote) for lote in dados_municipio)
                     municipios_com_dados += 1
-                    print(f"✅ Adicionados {len(dados_municipio)} registros")
                 else:
                     municipios_sem_dados += 1
-                    print(f"⚠️  Nenhum dado encontrado para {nome_municipio}")
+                    if detalhado():
+                        print(f"⚠️  Nenhum dado encontrado para {nome_municipio}")
                 
                 # Atualizar barra de progresso
                 pbar.update(1)
                 pbar.set_postfix({
                     'Registros': total_registros, 
                     'ComDados': municipios_com_dados,
-                    'SemDados': municipios_sem_dados
+                    'SemDados': municipios_sem_dados,
+                    'Paralelo': limitador.limite
                 })
-                
-                # Pequena pausa entre consultas para não sobrecarregar o banco
-                if i < len(municipios):  # Não esperar após o último
-                    print(f"⏳ Aguardando {self.tempo_espera}s antes do próximo...")
-                    time.sleep(self.tempo_espera)
+        
+        # Montar o DataFrame uma única vez; a ordenação (município, maior total) é feita só aqui
+        if total_registros:
+            self.df_final = self.montar_dataframe((lote
+                                                   for municipio in municipios
+                                                   for lote in resultados_por_municipio.pop(municipio['nome'], [])),
+                                                  ordenar=True)
         
         print(f"\n✅ PROCESSAMENTO CONCLUÍDO!")
         print("=" * 50)
@@ -244,8 +424,439 @@ class AgrupadorVendasMedicamentos:
         
         return True
     
-    def salvar_json(self, caminho_arquivo=None):
-        """Salva o DataFrame em formato JSON - CORRIGIDO para Decimal"""
+    def conexao_duckdb(self):
+        """Conexão DuckDB em memória usada pela fonte parquet (criada na primeira consulta)"""
+        if self._duckdb is None:
+            try:
+                import duckdb
+            except ImportError:
+                raise ImportError("duckdb não instalado: pip install duckdb") from None
+            self._duckdb = duckdb.connect()
+        return self._duckdb
+    
+    def consultar_em_lotes(self, sql, parametros=()):
+        """Executa `sql` na fonte (MySQL ou DuckDB sobre Parquet) e produz lotes de linhas
+        
+        Tuplas na ordem do SELECT, do MySQL e do DuckDB (sem um dict por linha).
+        """
+        if self.fonte == 'parquet':
+            with self.metricas.etapa('consulta'):
+                resultado = self.conexao_duckdb().execute(sql.replace('%s', '?'), list(parametros))
+            yield from self._buscar_lotes(resultado)
+            return
+        
+        from meuDB import get_db_cursor
+        with get_db_cursor(dictionary=False) as cursor:
+            with self.metricas.etapa('consulta'):
+                cursor.execute(sql, parametros)
+            yield from self._buscar_lotes(cursor)
+    
+    def _buscar_lotes(self, cursor):
+        while True:
+            with self.metricas.etapa('fetch'):
+                lote = cursor.fetchmany(self.tamanho_fetch)
+            if not lote:
+                return
+            self.metricas.contar('linhas_lidas', len(lote))
+            yield lote
+    
+    def versao_dados(self):
+        """Token de versão dos dados da fonte (calculado uma vez por execução)"""
+        if self._versao is None:
+            if self.fonte == 'parquet':
+                self._versao = versao_arquivos(self._padrao_parquet)
+            else:
+                tabela = FONTES[self.fonte]['versao']
+                # A agregada não tem indice_global: versão pelos totais de cada mês
+                calcular = versao_agregada if tabela == TABELA_AGREGADA else versao_tabela
+                from meuDB import get_db_cursor
+                with get_db_cursor(dictionary=True) as cursor:
+                    self._versao = calcular(cursor, tabela)
+        return self._versao
+    
+    def consultar_com_cache(self, sql, parametros=()):
+        """Todas as linhas da consulta; do cache em disco se os dados não mudaram desde a última vez"""
+        if self.cache is None:
+            return [linha for lote in self.consultar_em_lotes(sql, parametros) for linha in lote]
+        
+        versao = self.versao_dados()
+        chave = self.cache.chave(self.tabela, versao, sql, parametros)
+        linhas = self.cache.obter(chave)
+        if linhas is None:
+            linhas = [linha for lote in self.consultar_em_lotes(sql, parametros) for linha in lote]
+            self.cache.gravar(chave, self.tabela, versao, linhas)
+        else:
+            self.metricas.contar('acertos_cache')
+        return linhas
+    
+    def lotes_com_cache(self, sql, parametros=()):
+        """Lotes da consulta: os do fetchmany sem cache, ou um lote só com as linhas do cache"""
+        if self.cache is None:
+            return self.consultar_em_lotes(sql, parametros)
+        return [self.consultar_com_cache(sql, parametros)]
+    
+    def obter_anos(self):
+        """Anos presentes na tabela (varredura solta do índice idx_ano_mes)"""
+        return [linha[0]
+                for lote in self.consultar_em_lotes(
+                    f"SELECT DISTINCT ANO_VENDA FROM {self.tabela} ORDER BY ANO_VENDA")
+                for linha in lote]
+    
+    def obter_ufs(self):
+        """UFs presentes na fonte estados (varredura solta do índice, que começa por UF_VENDA)"""
+        return [linha[0]
+                for lote in self.consultar_em_lotes(
+                    f"SELECT DISTINCT UF_VENDA FROM {self.tabela} ORDER BY UF_VENDA")
+                for linha in lote]
+    
+    def obter_meses(self):
+        """(ano, mês) presentes na tabela (varredura do índice idx_ano_mes)"""
+        return [tuple(linha)
+                for lote in self.consultar_em_lotes(
+                    f"SELECT DISTINCT ANO_VENDA, MES_VENDA FROM {self.tabela} ORDER BY ANO_VENDA, MES_VENDA")
+                for linha in lote]
+    
+    def consulta_agrupamento(self, filtro=""):
+        """GROUP BY (tempo + dimensões) na fonte, com um WHERE opcional
+        
+        O GROUP BY segue a ordem de idx_groupby_principal (ANO_VENDA,
+        MES_VENDA, município, princípio ativo), qualquer que seja a ordem
+        das dimensões pedidas, para o MySQL aproveitar o índice. O total sai
+        com CAST para inteiro, sem conversão de Decimal linha a linha no Python.
+        """
+        # UF_VENDA vem na frente do índice de vendas_medicamentos_uf
+        prefixo = ['UF_VENDA'] if 'UF_VENDA' in self.dimensoes else []
+        selecao = self.colunas_tempo + [self.colunas_fonte[dimensao] if self.colunas_fonte[dimensao] == dimensao
+                                        else f"{self.colunas_fonte[dimensao]} as {dimensao}"
+                                        for dimensao in self.dimensoes]
+        chaves = prefixo + self.colunas_tempo + [self.colunas_fonte[dimensao] for dimensao in DIMENSOES
+                                                 if dimensao in self.dimensoes and dimensao not in prefixo]
+        return f"""
+            SELECT 
+                {', '.join(selecao)},
+                CAST(SUM({self.coluna_quantidade}) AS {self.tipo_total}) as TOTAL_VENDIDO
+            FROM {self.tabela}  
+            {filtro}
+            GROUP BY {', '.join(chaves)}
+        """
+    
+    def consultas_particionadas(self, particao=None):
+        """Lista de (sql, parâmetros, descrição): uma consulta, ou uma por ano / por mês / por UF
+        
+        Cada partição filtra pelo prefixo (ANO_VENDA[, MES_VENDA]) do índice,
+        ou por UF_VENDA na fonte estados. O filtro de UFs vale para todas.
+        """
+        if particao not in (None,) + PARTICOES:
+            raise ValueError(f"Partição inválida: {particao} (opções: {', '.join(PARTICOES)})")
+        if particao == 'mes' and self.granularidade != 'mes':
+            raise ValueError("Partição por mês exige granularidade 'mes'")
+        if particao == 'uf' and 'UF_VENDA' not in self.colunas_fonte:
+            raise ValueError("Partição por UF só existe na fonte 'estados'")
+        
+        condicoes, base = [], ()
+        if self.ufs and particao != 'uf':
+            condicoes.append(f"UF_VENDA IN ({', '.join(['%s'] * len(self.ufs))})")
+            base = tuple(self.ufs)
+        
+        def filtro(*extras):
+            todas = condicoes + list(extras)
+            return f"WHERE {' AND '.join(todas)}" if todas else ""
+        
+        if particao == 'uf':
+            return [(self.consulta_agrupamento(filtro("UF_VENDA = %s")), (uf,), f"UF {uf}")
+                    for uf in self.ufs or self.obter_ufs()]
+        if particao == 'ano':
+            return [(self.consulta_agrupamento(filtro("ANO_VENDA = %s")), base + (ano,), f"ano {ano}")
+                    for ano in self.obter_anos()]
+        if particao == 'mes':
+            return [(self.consulta_agrupamento(filtro("ANO_VENDA = %s", "MES_VENDA = %s")), base + (ano, mes),
+                     f"{ano}/{mes:02d}")
+                    for ano, mes in self.obter_meses()]
+        return [(self.consulta_agrupamento(filtro()), base, "todos os anos")]
+    
+    def montar_dataframe(self, lotes, ordenar=False, colunas=None):
+        """DataFrame tipado (colunas_compactas) a partir de lotes de tuplas, com nomes decodificados
+        
+        Cada lote é convertido assim que chega e pode ser liberado em seguida;
+        o tempo de conversão (e da ordenação) conta como 'concatenacao'.
+        `colunas` é a ordem das tuplas (padrão: colunas_resultado).
+        """
+        colunas = colunas or self.colunas_resultado
+        montador = MontadorColunas(colunas, [coluna for coluna in self._colunas_ids if coluna in colunas])
+        segundos = 0.0
+        for lote in lotes:
+            inicio = time.perf_counter()
+            montador.adicionar(lote)
+            segundos += time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        df = self.decodificar(montador.dataframe())
+        if ordenar:
+            df = self.ordenar(df)
+        self.metricas.registrar('concatenacao', segundos + time.perf_counter() - inicio)
+        return df
+    
+    def consulta_ranking(self, grupos, item, top_k):
+        """(sql, parâmetros) do top `top_k` de `item` por `grupos`, com ROW_NUMBER() na fonte
+        
+        Só as linhas do top saem do banco; a ordenação final fica para o
+        DataFrame (na fonte codificada os IDs ainda viram nomes). Empates
+        vão pelo item (nome; ID na fonte codificada).
+        """
+        def coluna(nome):
+            return self.colunas_fonte.get(nome, nome)  # ANO_VENDA / MES_VENDA têm o mesmo nome
+        
+        colunas = list(grupos) + [item]
+        selecao = [coluna(nome) if coluna(nome) == nome else f"{coluna(nome)} AS {nome}" for nome in colunas]
+        condicoes = [f"{coluna(nome)} IS NOT NULL" for nome in colunas]
+        parametros = ()
+        if self.ufs:
+            condicoes.append(f"UF_VENDA IN ({', '.join(['%s'] * len(self.ufs))})")
+            parametros = tuple(self.ufs)
+        particao = f"PARTITION BY {', '.join(coluna(nome) for nome in grupos)} " if grupos else ""
+        sql = f"""
+            SELECT {', '.join(colunas)}, TOTAL_VENDIDO, POSICAO
+            FROM (
+                SELECT 
+                    {', '.join(selecao)},
+                    CAST(SUM({self.coluna_quantidade}) AS {self.tipo_total}) as TOTAL_VENDIDO,
+                    ROW_NUMBER() OVER ({particao}ORDER BY SUM({self.coluna_quantidade}) DESC,
+                                       {coluna(item)}) as POSICAO
+                FROM {self.tabela}
+                WHERE {' AND '.join(condicoes)}
+                GROUP BY {', '.join(coluna(nome) for nome in colunas)}
+            ) ranking
+            WHERE POSICAO <= %s
+        """
+        return sql, parametros + (int(top_k),)
+    
+    def ranking(self, top_k=3, grupos=('ANO_VENDA',), item='PRINCIPIO_ATIVO', na_fonte=False):
+        """Top `top_k` de `item` em cada combinação de `grupos` (ex.: princípios por município e ano)
+        
+        Com o df_final montado o ranking sai dele (calcular_ranking, sem
+        ordenar o DataFrame inteiro); senão, ou com `na_fonte`, sai de uma
+        consulta com ROW_NUMBER() na fonte. Retorna DataFrame com grupos,
+        item, TOTAL_VENDIDO e POSICAO, ordenado por grupos e posição.
+        """
+        grupos = list(grupos)
+        invalidas = [nome for nome in grupos + [item] if nome not in self.colunas_resultado[:-1]]
+        if invalidas or item in grupos or item in self.colunas_tempo:
+            raise ValueError(f"Ranking inválido: {item} por {grupos} "
+                             f"(colunas do agrupamento: {', '.join(self.colunas_resultado[:-1])})")
+        if not na_fonte and not self.df_final.empty:
+            return calcular_ranking(self.df_final, grupos, item, top_k)
+        
+        sql, parametros = self.consulta_ranking(grupos, item, top_k)
+        colunas = grupos + [item, 'TOTAL_VENDIDO', 'POSICAO']
+        df = self.montar_dataframe(self.lotes_com_cache(sql, parametros), colunas=colunas)
+        return df.sort_values(grupos + ['POSICAO'], ignore_index=True)
+    
+    def rankings(self, top_k=3, rankings=None):
+        """{nome: DataFrame} dos rankings (padrão: RANKINGS_PADRAO) que cabem nas dimensões do agrupamento"""
+        rankings = RANKINGS_PADRAO if rankings is None else rankings
+        return {nome: self.ranking(top_k, grupos, item)
+                for nome, (grupos, item) in rankings.items()
+                if all(coluna in self.colunas_resultado for coluna in list(grupos) + [item])}
+    
+    def ordenar(self, df):
+        """Primeira dimensão, tempo (na granularidade mensal), depois maior total"""
+        chaves = self.dimensoes[:1] + (self.colunas_tempo if self.granularidade == 'mes' else [])
+        return df.sort_values(chaves + ['TOTAL_VENDIDO'],
+                              ascending=[True] * len(chaves) + [False], ignore_index=True)
+    
+    def processar_consulta_unica(self, particionar_por_ano=False, particao=None):
+        """Agrupa todos os municípios numa única passada, sem pausas entre consultas
+        
+        Uma só consulta GROUP BY (ou uma por ano / por mês, com `particao`,
+        para usar o prefixo ANO_VENDA, MES_VENDA de idx_groupby_principal). O
+        resultado é lido com fetchmany e cada lote vai direto para as colunas
+        tipadas do DataFrame (colunas_compactas). `particionar_por_ano` equivale a particao='ano'. Com a tabela
+        particionada (particionamento.py) o padrão é uma consulta por ano, cada
+        uma lendo só as partições do ano. Na fonte estados o padrão é uma
+        consulta por UF, até `max_paralelo` ao mesmo tempo.
+        """
+        if particao is None and not particionar_por_ano:
+            if self.fonte == 'estados':
+                particao = 'uf'
+            elif self.fonte in ('detalhe', 'codificada'):
+                from particionamento import GerenciadorParticoes
+                if GerenciadorParticoes(self.tabela).particionada:
+                    particao = 'ano'
+        particao = particao or ('ano' if particionar_por_ano else None)
+        consultas = self.consultas_particionadas(particao)
+        paralelo = min(self.max_paralelo, len(consultas)) if particao == 'uf' else 1
+        
+        print(f"\n🚀 AGRUPAMENTO EM CONSULTA ÚNICA ({len(consultas)} consulta(s) em {self.tabela})")
+        print(f"📐 Granularidade: {self.granularidade} | Dimensões: {', '.join(self.dimensoes)}")
+        if paralelo > 1:
+            print(f"🔀 {paralelo} consultas simultâneas")
+        print("=" * 60)
+        
+        total_registros = 0
+        inicio_total = time.time()
+        
+        def lotes():
+            nonlocal total_registros
+            with ThreadPoolExecutor(max_workers=max(paralelo, 1)) as executor:
+                if paralelo > 1:
+                    resultados = executor.map(
+                        lambda consulta: list(self.lotes_com_cache(consulta[0], consulta[1])), consultas)
+                else:
+                    # Em sequência, cada lote do fetchmany vai direto para as colunas tipadas
+                    resultados = (self.lotes_com_cache(sql, parametros) for sql, parametros, _ in consultas)
+                inicio = time.time()
+                for (sql, parametros, descricao), lotes_consulta in zip(consultas, resultados):
+                    for lote in lotes_consulta:
+                        total_registros += len(lote)
+                        yield lote
+                    if detalhado():
+                        print(f"✅ {descricao}: {total_registros:,} registros acumulados em "
+                              f"{time.time() - inicio:.2f}s")
+                    inicio = time.time()
+        
+        try:
+            # O DataFrame é montado uma única vez, lote a lote
+            self.df_final = self.montar_dataframe(lotes(), ordenar=True)
+        except Exception as e:
+            print(f"❌ Erro no agrupamento: {e}")
+            return False
+        
+        print(f"\n✅ PROCESSAMENTO CONCLUÍDO!")
+        print("=" * 50)
+        print(f"📈 Total de registros: {len(self.df_final):,}")
+        print(f"🏙️ {self.dimensoes[0]} distintos: {self.df_final[self.dimensoes[0]].nunique()}")
+        print(f"⏱️  Tempo total: {time.time() - inicio_total:.2f}s")
+        
+        return True
+    
+    def iterar_particoes(self, particao='ano'):
+        """Produz (descrição, DataFrame) de uma partição por vez, sem acumular o resultado"""
+        for sql, parametros, descricao in self.consultas_particionadas(particao):
+            yield descricao, self.montar_dataframe(self.lotes_com_cache(sql, parametros), ordenar=True)
+    
+    def exportar_em_particoes(self, caminho_arquivo=None, particao='ano'):
+        """Grava o agrupamento em CSV partição a partição (só uma partição em memória por vez)"""
+        if not caminho_arquivo:
+            os.makedirs('dados_agrupados', exist_ok=True)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            caminho_arquivo = os.path.join('dados_agrupados', f'vendas_agrupadas_{timestamp}.csv')
+        
+        print(f"\n🚀 AGRUPAMENTO EM PARTIÇÕES POR {particao.upper()} ({self.tabela})")
+        print(f"📐 Granularidade: {self.granularidade} | Dimensões: {', '.join(self.dimensoes)}")
+        print("=" * 60)
+        
+        particoes = 0
+        total_registros = 0
+        total_vendido = 0.0
+        inicio_total = time.time()
+        try:
+            with open(caminho_arquivo, 'w', encoding='utf-8', newline='') as arquivo:
+                for descricao, df in self.iterar_particoes(particao):
+                    inicio = time.time()
+                    with self.metricas.etapa('serializacao'):
+                        df.to_csv(arquivo, index=False, header=particoes == 0)
+                    particoes += 1
+                    total_registros += len(df)
+                    total_vendido += float(df['TOTAL_VENDIDO'].sum())
+                    if detalhado():
+                        print(f"✅ {descricao}: {len(df):,} registros ({time.time() - inicio:.2f}s para gravar)")
+                if particoes == 0:
+                    arquivo.write(','.join(self.colunas_resultado) + '\n')
+        except Exception as e:
+            print(f"❌ Erro no agrupamento em partições: {e}")
+            return {"status": "error", "message": str(e)}
+        
+        print(f"\n✅ CSV salvo em: {caminho_arquivo}")
+        print(f"📈 Total de registros: {total_registros:,} em {particoes} partições")
+        print(f"⏱️  Tempo total: {time.time() - inicio_total:.2f}s")
+        return {
+            "status": "success",
+            "caminho": caminho_arquivo,
+            "particoes": particoes,
+            "total_registros": total_registros,
+            "total_vendido": total_vendido,
+        }
+    
+    def relatorio_parquet(self, top_n=3, ano_amostra=2016, tamanho_amostra=5):
+        """Mesmo relatório de calcular_relatorio, calculado pelo DuckDB direto nos arquivos Parquet"""
+        conexao = self.conexao_duckdb()
+        quantidade = self.coluna_quantidade
+        # Registros = linhas do agrupamento configurado; o resto sai direto dos arquivos
+        registros_por_ano = dict(conexao.execute(f"""
+            WITH agrupado AS ({self.consulta_agrupamento()})
+            SELECT ANO_VENDA, COUNT(*) FROM agrupado GROUP BY ANO_VENDA
+        """).fetchall())
+        if not registros_por_ano:
+            return RelatorioVendas(top_n=top_n, ano_amostra=ano_amostra)
+        
+        geral = conexao.execute(f"""
+            SELECT COUNT(DISTINCT MUNICIPIO_VENDA), COUNT(DISTINCT ANO_VENDA),
+                   COUNT(DISTINCT PRINCIPIO_ATIVO), COALESCE(SUM({quantidade}), 0)::DOUBLE
+            FROM {self.tabela}
+        """).fetchone()
+        
+        top_por_ano = {}
+        for ano, principio, total in conexao.execute(f"""
+            SELECT ANO_VENDA, PRINCIPIO_ATIVO, TOTAL
+            FROM (
+                SELECT ANO_VENDA, PRINCIPIO_ATIVO, SUM({quantidade})::DOUBLE AS TOTAL,
+                       ROW_NUMBER() OVER (PARTITION BY ANO_VENDA ORDER BY SUM({quantidade}) DESC) AS POSICAO
+                FROM {self.tabela}
+                GROUP BY ANO_VENDA, PRINCIPIO_ATIVO
+            )
+            WHERE POSICAO <= ?
+            ORDER BY ANO_VENDA, POSICAO
+        """, [top_n]).fetchall():
+            top_por_ano.setdefault(ano, []).append((principio, total))
+        
+        por_ano = [{
+            "ano": int(ano),
+            "total_vendido": total,
+            "municipios": municipios,
+            "registros": registros_por_ano.get(ano, 0),
+            "top_principios": top_por_ano.get(ano, []),
+        } for ano, total, municipios in conexao.execute(f"""
+            SELECT ANO_VENDA, SUM({quantidade})::DOUBLE, COUNT(DISTINCT MUNICIPIO_VENDA)
+            FROM {self.tabela}
+            GROUP BY ANO_VENDA
+            ORDER BY ANO_VENDA
+        """).fetchall()]
+        
+        por_municipio = conexao.execute(f"""
+            SELECT MUNICIPIO_VENDA, SUM({quantidade})::DOUBLE AS TOTAL
+            FROM {self.tabela}
+            GROUP BY MUNICIPIO_VENDA
+            ORDER BY TOTAL DESC
+        """).fetchall()
+        
+        amostra = conexao.execute(f"""
+            {self.consulta_agrupamento("WHERE ANO_VENDA = ?")}
+            ORDER BY {self.dimensoes[0]}, TOTAL_VENDIDO DESC
+            LIMIT ?
+        """, [ano_amostra, tamanho_amostra]).fetch_df()
+        
+        return RelatorioVendas(
+            total_registros=sum(registros_por_ano.values()),
+            total_vendido=geral[3],
+            municipios_unicos=geral[0],
+            anos_unicos=geral[1],
+            principios_unicos=geral[2],
+            por_ano=por_ano,
+            por_municipio=por_municipio,
+            top_n=top_n,
+            ano_amostra=ano_amostra,
+            amostra=amostra if not amostra.empty else None,
+        )
+    
+    def salvar_json(self, caminho_arquivo=None, formato='registros', comprimir=False):
+        """Salva o DataFrame em formato JSON - CORRIGIDO para Decimal
+        
+        formato 'registros': lista de objetos indentada (formato original)
+        formato 'colunar': arrays por coluna com tabelas de nomes, sem
+        indentação, escrito aos poucos. `comprimir` grava .json.gz.
+        """
+        if formato not in FORMATOS_JSON:
+            raise ValueError(f"Formato inválido: {formato} (opções: {', '.join(FORMATOS_JSON)})")
+        
         if self.df_final.empty:
             print("⚠️ DataFrame vazio - nada para salvar")
             return False
@@ -253,24 +864,41 @@ class AgrupadorVendasMedicamentos:
         if not caminho_arquivo:
             os.makedirs('dados_agrupados', exist_ok=True)
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            caminho_arquivo = os.path.join('dados_agrupados', f'vendas_agrupadas_{timestamp}.json')
+            extensao = '.json.gz' if comprimir else '.json'
+            caminho_arquivo = os.path.join('dados_agrupados', f'vendas_agrupadas_{timestamp}{extensao}')
         
         try:
-            print(f"💾 Salvando JSON...")
-            
-            # Converter DataFrame para tipos Python nativos
-            df_para_json = self.df_final.copy()
+            print(f"💾 Salvando JSON ({formato})...")
             
-            # Converter colunas numéricas para tipos nativos
-            df_para_json['ANO_VENDA'] = df_para_json['ANO_VENDA'].astype(int)
-            df_para_json['TOTAL_VENDIDO'] = df_para_json['TOTAL_VENDIDO'].astype(float)
-            
-            # Converter para dict
-            dados_json = df_para_json.to_dict('records')
+            if formato == 'colunar':
+                with self.metricas.etapa('serializacao'), abrir_saida(caminho_arquivo, comprimir) as f:
+                    escrever_json_colunar(f, self.df_final)
+                
+                print(f"✅ JSON salvo em: {caminho_arquivo}")
+                print(f"📏 Tamanho: {os.path.getsize(caminho_arquivo):,} bytes")
+                print(f"📊 Registros: {len(self.df_final):,}")
+                return caminho_arquivo
             
-            # Salvar arquivo com encoder personalizado
-            with open(caminho_arquivo, 'w', encoding='utf-8') as f:
-                json.dump(dados_json, f, ensure_ascii=False, indent=2, cls=DecimalEncoder)
+            with self.metricas.etapa('serializacao'):
+                # Converter DataFrame para tipos Python nativos
+                df_para_json = self.df_final.copy()
+                
+                # Converter colunas numéricas para tipos nativos
+                df_para_json['ANO_VENDA'] = df_para_json['ANO_VENDA'].astype(int)
+                df_para_json['TOTAL_VENDIDO'] = df_para_json['TOTAL_VENDIDO'].astype(float)
+                
+                # Totais (SUM só de nulos) e nomes nulos viram null: NaN não é JSON válido
+                for coluna in df_para_json.columns:
+                    nulos = df_para_json[coluna].isna()
+                    if nulos.any():
+                        df_para_json[coluna] = df_para_json[coluna].astype(object).mask(nulos, None)
+                
+                # Converter para dict
+                dados_json = df_para_json.to_dict('records')
+                
+                # Salvar arquivo com encoder personalizado; allow_nan=False garante que nenhum NaN escapou
+                with abrir_saida(caminho_arquivo, comprimir) as f:
+                    json.dump(dados_json, f, ensure_ascii=False, indent=2, cls=DecimalEncoder, allow_nan=False)
             
             # Verificar salvamento
             tamanho_arquivo = os.path.getsize(caminho_arquivo)
@@ -300,7 +928,8 @@ class AgrupadorVendasMedicamentos:
             print(f"💾 Salvando CSV...")
             
             # Salvar CSV
-            self.df_final.to_csv(caminho_arquivo, index=False, encoding='utf-8')
+            with self.metricas.etapa('serializacao'):
+                self.df_final.to_csv(caminho_arquivo, index=False, encoding='utf-8')
             
             # Verificar salvamento
             tamanho_arquivo = os.path.getsize(caminho_arquivo)
@@ -315,50 +944,165 @@ class AgrupadorVendasMedicamentos:
             print(f"❌ Erro ao salvar CSV: {e}")
             return False
     
-    def salvar_ambos_formatos(self):
-        """Salva em ambos JSON e CSV e retorna os caminhos"""
+    def salvar_relatorio(self, caminho_arquivo=None):
+        """Salva o relatório (estatísticas, análise por ano e totais por município) em JSON"""
+        relatorio = self.relatorio()
+        if relatorio.vazio:
+            print("⚠️ Relatório vazio - nada para salvar")
+            return False
+        
+        if not caminho_arquivo:
+            os.makedirs('dados_agrupados', exist_ok=True)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            caminho_arquivo = os.path.join('dados_agrupados', f'vendas_agrupadas_{timestamp}_relatorio.json')
+        
+        try:
+            with self.metricas.etapa('serializacao'), open(caminho_arquivo, 'w', encoding='utf-8') as f:
+                json.dump(relatorio.como_dict(), f, ensure_ascii=False, indent=2)
+            print(f"✅ Relatório salvo em: {caminho_arquivo}")
+            return caminho_arquivo
+        except Exception as e:
+            print(f"❌ Erro ao salvar relatório: {e}")
+            return False
+    
+    def salvar_rankings(self, caminho_arquivo=None, top_k=3, rankings=None):
+        """Grava os rankings pré-calculados (top-K por grupo) em JSON, para o dashboard carregar direto
+        
+        {"top_k": 3, "rankings": {"principios_por_municipio_ano": {"grupos": [...], "item": ...,
+         "lideres": [{"ANO_VENDA": 2016, "MUNICIPIO_VENDA": ..., "top": [{"nome": ..., "total_vendido": ...}]}]}}}
+        """
+        if self.df_final.empty:
+            print("⚠️ DataFrame vazio - nada para salvar")
+            return False
+        
+        if not caminho_arquivo:
+            os.makedirs('dados_agrupados', exist_ok=True)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            caminho_arquivo = os.path.join('dados_agrupados', f'vendas_agrupadas_{timestamp}_rankings.json')
+        
+        try:
+            with self.metricas.etapa('serializacao'):
+                saida = {"top_k": top_k, "data_geracao": datetime.now().isoformat(), "rankings": {}}
+                for nome, df in self.rankings(top_k, rankings).items():
+                    saida["rankings"][nome] = {"grupos": list(df.columns[:-3]), "item": df.columns[-3],
+                                               "lideres": lideres_ranking(df)}
+                with open(caminho_arquivo, 'w', encoding='utf-8') as f:
+                    json.dump(saida, f, ensure_ascii=False, indent=2, cls=DecimalEncoder)
+            print(f"✅ Rankings salvos em: {caminho_arquivo} ({', '.join(saida['rankings'])})")
+            return caminho_arquivo
+        except Exception as e:
+            print(f"❌ Erro ao salvar rankings: {e}")
+            return False
+    
+    def salvar_ambos_formatos(self, formato_json='registros', comprimir_json=False):
+        """Salva em ambos JSON e CSV e retorna os caminhos (json_path, csv_path)"""
         print("\n💾 INICIANDO SALVAMENTO DOS ARQUIVOS")
         print("=" * 40)
         
-        json_path = self.salvar_json()
+        json_path = self.salvar_json(formato=formato_json, comprimir=comprimir_json)
         print("")  # Linha em branco
         
         csv_path = self.salvar_csv()
         
         return json_path, csv_path
-    
+
     def obter_estatisticas(self):
-        """Retorna estatísticas do agrupamento"""
-        if self.df_final.empty:
-            return {"status": "vazio"}
-        
-        estatisticas = {
-            "total_registros": len(self.df_final),
-            "municipios_unicos": self.df_final['MUNICIPIO_VENDA'].nunique(),
-            "anos_unicos": self.df_final['ANO_VENDA'].nunique(),
-            "principios_unicos": self.df_final['PRINCIPIO_ATIVO'].nunique(),
-            "total_vendido": float(self.df_final['TOTAL_VENDIDO'].sum()),
-            "data_geracao": datetime.now().isoformat()
-        }
-        
-        return estatisticas
+        """Retorna estatísticas do agrupamento (calculadas pelo relatório)"""
+        return self.relatorio().estatisticas()
 
-def executar_processamento_completo():
-    """Executa o processamento completo de TODOS os municípios"""
+def executar_processamento_completo(modo='consulta_unica', particionar_por_ano=False, max_paralelo=4,
+                                    fonte='agregada', formato_json='registros', comprimir_json=False,
+                                    dimensoes=DIMENSOES_PADRAO, granularidade='ano', particao=None,
+                                    streaming=False, usar_cache=True, incremental=False, completo=False,
+                                    ufs=None, metricas_jsonl=None, metricas_prometheus=None, top_k=3):
+    """Executa o processamento completo de TODOS os municípios
+    
+    modo 'consulta_unica': um GROUP BY para todos os municípios (ou um por ano)
+    modo 'por_municipio': uma consulta por município, até `max_paralelo` ao mesmo tempo
+    fonte 'agregada' lê vendas_agregadas (ou o detalhe, se a agregada não tiver
+    todos os meses carregados); 'detalhe' varre vendas_medicamentos;
+    'codificada' varre vendas_medicamentos_cod (chaves inteiras);
+    'parquet' lê os arquivos de exportacao_parquet.py com DuckDB, sem MySQL
+    `dimensoes` e `granularidade` ('ano' ou 'mes') definem o GROUP BY; com
+    `streaming` o resultado vai direto para CSV, uma partição (`particao`) por vez
+    `usar_cache` reaproveita resultados de consultas já feitas na mesma versão dos dados
+    `incremental` mantém um CSV fixo e só recalcula os anos com carga nova desde a
+    execução anterior (`completo` força o recálculo de tudo)
+    fonte 'estados' lê vendas_medicamentos_uf (vários estados), uma consulta por UF
+    em paralelo; `ufs` limita os estados
+    `metricas_jsonl` / `metricas_prometheus`: onde gravar as métricas da execução
+    `top_k`: tamanho dos rankings gravados junto com os arquivos (0 não grava)
+    """
     print("🚀 INICIANDO PROCESSAMENTO COMPLETO - TODOS OS 92 MUNICÍPIOS")
     print("=" * 60)
-    print("⏰ Cada consulta aguardará resultado antes de continuar")
-    print("🔄 Tentativas automáticas em caso de erro")
-    print("⏳ Pausas entre consultas para não sobrecarregar o banco")
+    if modo == 'por_municipio':
+        print("⏰ Cada consulta aguardará resultado antes de continuar")
+        print("🔄 Tentativas automáticas em caso de erro")
+        print(f"🔀 Até {max_paralelo} consultas simultâneas, reduzidas se o banco ficar lento")
+    else:
+        print("⚡ Uma única passada pela tabela, resultado lido em lotes")
     print("💾 Suporte a Decimal para JSON")
     print("=" * 60)
     
     # Inicializar agrupador
-    agrupador = AgrupadorVendasMedicamentos()
+    fonte = escolher_fonte(fonte)
+    cache = CacheResultados() if usar_cache else None
+    agrupador = AgrupadorVendasMedicamentos(fonte=fonte, dimensoes=dimensoes, granularidade=granularidade,
+                                            cache=cache, ufs=ufs)
+    agrupador.max_paralelo = max_paralelo
+    print(f"📚 Fonte: {agrupador.tabela}")
+    
+    try:
+        if incremental:
+            return _executar_incremental(agrupador, formato_json, comprimir_json, completo, top_k)
+        return _executar(agrupador, modo, particionar_por_ano, max_paralelo, fonte, formato_json,
+                         comprimir_json, particao, streaming, top_k)
+    finally:
+        if cache is not None:
+            print(f"🗃️  Cache de resultados: {cache.acertos} acertos, {cache.faltas} consultas ao banco")
+            cache.fechar()
+        agrupador.metricas.rotulos.update(modo=modo, granularidade=granularidade)
+        print(f"⏱️  Etapas: {' | '.join(agrupador.metricas.resumo())}")
+        agrupador.metricas.emitir(jsonl=metricas_jsonl, prometheus=metricas_prometheus)
+
+
+def _executar_incremental(agrupador, formato_json, comprimir_json, completo, top_k):
+    resultado = AtualizadorIncremental(agrupador).executar(completo=completo)
+    if agrupador.df_final.empty:
+        print("❌ Nenhum dado foi processado!")
+        return resultado
     
-    # Processar TODOS os municípios (sem limite)
-    print("\n🏙️ INICIANDO CONSULTAS POR MUNICÍPIO")
-    sucesso = agrupador.processar_todos_municipios()  # Sem limite = todos
+    if resultado["fatias_alteradas"] != []:
+        agrupador.analisar_dados_por_ano()
+        extensao = '.json.gz' if comprimir_json else '.json'
+        agrupador.salvar_json(CAMINHO_BASE_INCREMENTAL + extensao, formato_json, comprimir_json)
+        agrupador.salvar_relatorio(CAMINHO_BASE_INCREMENTAL + '_relatorio.json')
+        if top_k:
+            agrupador.salvar_rankings(CAMINHO_BASE_INCREMENTAL + '_rankings.json', top_k)
+    return resultado
+
+
+def _executar(agrupador, modo, particionar_por_ano, max_paralelo, fonte, formato_json, comprimir_json,
+              particao, streaming, top_k):
+    if streaming:
+        resultado = agrupador.exportar_em_particoes(particao=particao or 'ano')
+        if resultado["status"] != "success":
+            print("❌ Nenhum dado foi processado!")
+        return resultado
+    
+    if fonte == 'parquet' and modo == 'por_municipio':
+        print("⚠️  Fonte parquet usa sempre a consulta única (DuckDB)")
+        modo = 'consulta_unica'
+    if fonte == 'estados' and modo == 'por_municipio':
+        print("⚠️  Fonte estados usa consultas por UF (em paralelo)")
+        modo = 'consulta_unica'
+    
+    if modo == 'por_municipio':
+        # Processar TODOS os municípios (sem limite)
+        print("\n🏙️ INICIANDO CONSULTAS POR MUNICÍPIO")
+        sucesso = agrupador.processar_todos_municipios(max_paralelo=max_paralelo)  # Sem limite = todos
+    else:
+        sucesso = agrupador.processar_consulta_unica(particionar_por_ano=particionar_por_ano, particao=particao)
     
     if sucesso and not agrupador.df_final.empty:
         print("\n✅ DADOS PROCESSADOS COM SUCESSO!")
@@ -366,10 +1110,12 @@ def executar_processamento_completo():
         # 🆕 NOVO: Análise detalhada
         agrupador.analisar_dados_por_ano()
         agrupador.mostrar_amostra_2016()
-        agrupador.obter_estatisticas()
         
         # Salvar resultados
-        json_path, csv_path = agrupador.salvar_ambos_formatos()
+        json_path, csv_path = agrupador.salvar_ambos_formatos(formato_json, comprimir_json)
+        print("")  # Linha em branco
+        relatorio_path = agrupador.salvar_relatorio()
+        rankings_path = agrupador.salvar_rankings(top_k=top_k) if top_k else None
         
         # Estatísticas finais
         stats = agrupador.obter_estatisticas()
@@ -383,6 +1129,9 @@ def executar_processamento_completo():
         print(f"📦 TOTAL VENDIDO: {stats['total_vendido']:,.0f} unidades")
         print(f"📍 JSON: {json_path}")
         print(f"📍 CSV: {csv_path}")
+        print(f"📍 Relatório: {relatorio_path}")
+        if rankings_path:
+            print(f"📍 Rankings: {rankings_path}")
         
         # Mostrar amostra dos dados
         print(f"\n🔍 AMOSTRA DOS DADOS (primeiras 3 linhas):")
@@ -394,5 +1143,52 @@ def executar_processamento_completo():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agrupa as vendas de medicamentos por ano, município e princípio ativo")
+    parser.add_argument("--modo", choices=MODOS_AGRUPAMENTO, default='consulta_unica',
+                        help="consulta_unica = um GROUP BY para tudo; por_municipio = uma consulta por município")
+    parser.add_argument("--particionar-por-ano", action="store_true",
+                        help="no modo consulta_unica, faz uma consulta por ano")
+    parser.add_argument("--fonte", choices=list(FONTES), default='agregada',
+                        help="agregada = vendas_agregadas (padrão; usa o detalhe se faltar algum mês); "
+                             "detalhe = vendas_medicamentos; "
+                             "codificada = vendas_medicamentos_cod; parquet = arquivos de exportacao_parquet.py; "
+                             "estados = vendas_medicamentos_uf (vários estados)")
+    parser.add_argument("--max-paralelo", type=int, default=4,
+                        help="no modo por_municipio (ou por UF), máximo de consultas simultâneas (padrão: 4)")
+    parser.add_argument("--formato-json", choices=FORMATOS_JSON, default='registros',
+                        help="registros = lista de objetos (padrão); colunar = arrays compactos para o dashboard")
+    parser.add_argument("--gzip", action="store_true", help="grava o JSON comprimido (.json.gz)")
+    parser.add_argument("--dimensoes", nargs="+", choices=DIMENSOES, default=list(DIMENSOES_PADRAO),
+                        help="colunas do agrupamento, além do tempo (padrão: MUNICIPIO_VENDA PRINCIPIO_ATIVO)")
+    parser.add_argument("--granularidade", choices=GRANULARIDADES, default='ano',
+                        help="ano (padrão) ou mes, para séries mensais")
+    parser.add_argument("--particao", choices=PARTICOES, default=None,
+                        help="no modo consulta_unica, uma consulta por ano, por mês (exige --granularidade mes) "
+                             "ou por UF (fonte estados)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="grava o CSV partição a partição, sem montar o DataFrame (sem JSON nem relatório)")
+    parser.add_argument("--sem-cache", action="store_true",
+                        help="ignora o cache de resultados e consulta sempre o banco")
+    parser.add_argument("--ufs", nargs="+", default=None,
+                        help="na fonte estados, agrupa só estas UFs (ex.: --ufs SP MG)")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"atualiza {CAMINHO_BASE_INCREMENTAL}.csv recalculando só os anos com carga nova")
+    parser.add_argument("--completo", action="store_true",
+                        help="com --incremental, recalcula tudo e refaz o estado")
+    parser.add_argument("--top-k", type=int, default=3,
+                        help="itens em cada ranking gravado (top princípios por município e ano...); "
+                             "0 não grava os rankings (padrão: 3)")
+    adicionar_argumentos(parser)
+    args = parser.parse_args()
+    definir_verbosidade(nivel_dos_argumentos(args.verbose, args.quiet))
+    
     # Executar processamento COMPLETO (todos os 92 municípios)
-    executar_processamento_completo()
\ No newline at end of file
+    executar_processamento_completo(modo=args.modo, particionar_por_ano=args.particionar_por_ano,
+                                    max_paralelo=args.max_paralelo, fonte=args.fonte,
+                                    formato_json=args.formato_json, comprimir_json=args.gzip,
+                                    dimensoes=args.dimensoes, granularidade=args.granularidade,
+                                    particao=args.particao, streaming=args.streaming,
+                                    usar_cache=not args.sem_cache, incremental=args.incremental,
+                                    completo=args.completo, ufs=args.ufs,
+                                    metricas_jsonl=args.metricas_jsonl,
+                                    metricas_prometheus=args.metricas_prometheus, top_k=args.top_k)
\ No newline at end of file
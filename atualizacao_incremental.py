@@ -0,0 +1,220 @@
+"""
+Atualização incremental do agrupamento: recalcula só os anos (ou meses) com carga nova
+
+O resultado fica num CSV de nome fixo, com um arquivo de estado ao lado que
+guarda a assinatura de cada (ano, mês) na última execução. A assinatura vem
+do manifesto de carga (checksum, registros e status do arquivo do mês), dos
+totais do mês na vendas_agregadas (que as cargas normal e --codificado
+alimentam) ou, na fonte parquet, dos arquivos da partição. Na execução seguinte só as
+fatias com assinatura diferente são consultadas de novo; o resto do CSV
+anterior é reaproveitado. Meses carregados sem manifesto não são vistos:
+para eles, rode uma vez com --completo.
+"""
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+import pandas as pd
+
+# Adicionar o diretório atual ao path para importar meuDB
+sys.path.append(os.path.dirname(__file__))
+
+from colunas_compactas import compactar, ler_csv
+from manifesto_carga import TABELA_MANIFESTO
+
+CAMINHO_BASE_INCREMENTAL = os.path.join('dados_agrupados', 'vendas_agrupadas_incremental')
+
+# Manifesto que registra as cargas de cada fonte (a agregada usa os próprios totais)
+MANIFESTOS = {
+    'detalhe': TABELA_MANIFESTO,
+    'codificada': TABELA_MANIFESTO + "_cod",
+}
+
+_PARTICAO_PARQUET = re.compile(r"ANO_VENDA=(\d+)[/\\]MES_VENDA=(\d+)")
+
+
+def _fatia(ano, mes):
+    return f"{int(ano)}-{int(mes):02d}"
+
+
+def assinaturas_manifesto(tabela_manifesto):
+    """{"AAAA-MM": assinatura} de cada mês registrado no manifesto de carga"""
+    from meuDB import get_db_cursor
+    with get_db_cursor(dictionary=True) as cursor:
+        cursor.execute(f"""
+            SELECT ANO_VENDA, MES_VENDA, ARQUIVO, CHECKSUM, TOTAL_REGISTROS, STATUS
+            FROM {tabela_manifesto}
+            ORDER BY ANO_VENDA, MES_VENDA, ARQUIVO
+        """)
+        assinaturas = {}
+        for entrada in cursor.fetchall():
+            fatia = _fatia(entrada['ANO_VENDA'], entrada['MES_VENDA'])
+            parte = f"{entrada['ARQUIVO']}:{entrada['CHECKSUM']}:{entrada['TOTAL_REGISTROS']}:{entrada['STATUS']}"
+            assinaturas[fatia] = f"{assinaturas[fatia]}|{parte}" if fatia in assinaturas else parte
+    return assinaturas
+
+
+def assinaturas_agregada(tabela):
+    """{"AAAA-MM": assinatura} de cada mês da vendas_agregadas (linhas, total vendido e registros)
+
+    A agregada soma as duas cargas (detalhe e --codificado) e muda também com
+    vendas_agregadas.py --reconstruir, então o manifesto de um modo só não basta.
+    """
+    from meuDB import get_db_cursor
+    with get_db_cursor(dictionary=True) as cursor:
+        cursor.execute(f"""
+            SELECT ANO_VENDA, MES_VENDA, COUNT(*) AS LINHAS,
+                   SUM(TOTAL_VENDIDO) AS TOTAL_VENDIDO, SUM(TOTAL_REGISTROS) AS TOTAL_REGISTROS
+            FROM {tabela}
+            GROUP BY ANO_VENDA, MES_VENDA
+        """)
+        return {_fatia(linha['ANO_VENDA'], linha['MES_VENDA']):
+                f"{linha['LINHAS']}:{int(linha['TOTAL_VENDIDO'])}:{int(linha['TOTAL_REGISTROS'])}"
+                for linha in cursor.fetchall()}
+
+
+def assinaturas_parquet(padrao):
+    """{"AAAA-MM": assinatura} de cada partição Parquet (nome, tamanho e mtime dos arquivos)"""
+    assinaturas = {}
+    for caminho in sorted(glob.glob(padrao, recursive=True)):
+        particao = _PARTICAO_PARQUET.search(caminho)
+        if not particao:
+            continue
+        estado = os.stat(caminho)
+        fatia = _fatia(particao.group(1), particao.group(2))
+        parte = f"{os.path.basename(caminho)}:{estado.st_size}:{estado.st_mtime_ns}"
+        assinaturas[fatia] = f"{assinaturas[fatia]}|{parte}" if fatia in assinaturas else parte
+    return assinaturas
+
+
+def fatias_alteradas(anteriores, atuais):
+    """(ano, mês) novos, removidos ou com assinatura diferente, em ordem"""
+    alteradas = {fatia for fatia in set(anteriores) | set(atuais) if anteriores.get(fatia) != atuais.get(fatia)}
+    return [tuple(int(parte) for parte in fatia.split('-')) for fatia in sorted(alteradas)]
+
+
+class AtualizadorIncremental:
+    """Mantém o CSV incremental de um AgrupadorVendasMedicamentos"""
+
+    def __init__(self, agrupador, caminho_base=CAMINHO_BASE_INCREMENTAL):
+        if agrupador.fonte not in ('parquet', 'agregada') and agrupador.fonte not in MANIFESTOS:
+            raise ValueError(f"Atualização incremental não disponível para a fonte '{agrupador.fonte}'")
+        self.agrupador = agrupador
+        self.caminho_csv = caminho_base + '.csv'
+        self.caminho_estado = caminho_base + '_estado.json'
+
+    def configuracao(self):
+        """O que precisa ser igual à execução anterior para o CSV poder ser reaproveitado"""
+        return {
+            "fonte": self.agrupador.fonte,
+            "tabela": self.agrupador.tabela,
+            "dimensoes": list(self.agrupador.dimensoes),
+            "granularidade": self.agrupador.granularidade,
+        }
+
+    def assinaturas(self):
+        """Assinatura atual de cada (ano, mês) da fonte"""
+        if self.agrupador.fonte == 'parquet':
+            return assinaturas_parquet(self.agrupador._padrao_parquet)
+        if self.agrupador.fonte == 'agregada':
+            return assinaturas_agregada(self.agrupador.tabela)
+        return assinaturas_manifesto(MANIFESTOS[self.agrupador.fonte])
+
+    def ler_estado(self):
+        """Estado da última execução, ou None se não houver (ou não servir para esta configuração)"""
+        if not (os.path.exists(self.caminho_estado) and os.path.exists(self.caminho_csv)):
+            return None
+        with open(self.caminho_estado, encoding='utf-8') as arquivo:
+            estado = json.load(arquivo)
+        return estado if estado.get("configuracao") == self.configuracao() else None
+
+    def _gravar_atomico(self, caminho, escrever):
+        temporario = caminho + '.tmp'
+        try:
+            escrever(temporario)
+            os.replace(temporario, caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)  # o arquivo anterior continua valendo
+            raise
+
+    def _consultar(self, consultas):
+        def lotes():
+            for sql, parametros, descricao in consultas:
+                inicio = time.time()
+                linhas = self.agrupador.consultar_com_cache(sql, parametros)
+                print(f"✅ {descricao}: {len(linhas):,} registros em {time.time() - inicio:.2f}s")
+                yield linhas
+        return self.agrupador.montar_dataframe(lotes())
+
+    def executar(self, completo=False):
+        """Atualiza o CSV incremental e o df_final do agrupador
+
+        Na granularidade anual recalcula os anos inteiros das fatias
+        alteradas; na mensal, só os meses alterados.
+        """
+        agrupador = self.agrupador
+        inicio_total = time.time()
+        os.makedirs(os.path.dirname(self.caminho_csv) or '.', exist_ok=True)
+
+        atuais = self.assinaturas()
+        estado = None if completo else self.ler_estado()
+
+        print(f"\n🔁 ATUALIZAÇÃO INCREMENTAL ({agrupador.tabela})")
+        print("=" * 60)
+
+        if estado is None:
+            print("🆕 Sem execução anterior compatível: agrupamento completo")
+            alteradas = None
+            df = self._consultar(agrupador.consultas_particionadas('ano'))
+        else:
+            alteradas = fatias_alteradas(estado["fatias"], atuais)
+            anterior = ler_csv(self.caminho_csv)
+            if not alteradas:
+                print("✅ Nenhum mês novo ou alterado desde a última execução")
+                agrupador.df_final = anterior
+                return {"status": "success", "caminho": self.caminho_csv, "fatias_alteradas": [],
+                        "total_registros": len(anterior), "tempo_total_s": round(time.time() - inicio_total, 3)}
+
+            print(f"📅 Meses alterados: {', '.join(f'{ano}/{mes:02d}' for ano, mes in alteradas)}")
+            if agrupador.granularidade == 'mes':
+                manter = ~pd.MultiIndex.from_frame(anterior[['ANO_VENDA', 'MES_VENDA']]).isin(alteradas)
+                consultas = [(agrupador.consulta_agrupamento("WHERE ANO_VENDA = %s AND MES_VENDA = %s"),
+                              (ano, mes), f"{ano}/{mes:02d}") for ano, mes in alteradas]
+            else:
+                anos = sorted({ano for ano, _ in alteradas})
+                manter = ~anterior['ANO_VENDA'].isin(anos)
+                consultas = [(agrupador.consulta_agrupamento("WHERE ANO_VENDA = %s"), (ano,), f"ano {ano}")
+                             for ano in anos]
+            print(f"♻️  Reaproveitando {int(manter.sum()):,} de {len(anterior):,} registros do CSV anterior")
+            novos = self._consultar(consultas)
+            # Categorias diferentes nos dois lados viram object no concat: compactar de novo
+            df = compactar(pd.concat([anterior[manter], novos], ignore_index=True)) if len(novos) \
+                else anterior[manter]
+
+        agrupador.df_final = agrupador.ordenar(df)
+
+        # CSV antes do estado: se cair no meio, a próxima execução refaz as mesmas fatias
+        self._gravar_atomico(self.caminho_csv,
+                             lambda caminho: agrupador.df_final.to_csv(caminho, index=False, encoding='utf-8'))
+
+        def escrever_estado(caminho):
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                json.dump({"configuracao": self.configuracao(), "fatias": atuais}, arquivo,
+                          ensure_ascii=False, indent=2)
+        self._gravar_atomico(self.caminho_estado, escrever_estado)
+
+        tempo_total = time.time() - inicio_total
+        print(f"✅ CSV incremental salvo em: {self.caminho_csv}")
+        print(f"📈 Total de registros: {len(agrupador.df_final):,}")
+        print(f"⏱️  Tempo total: {tempo_total:.2f}s")
+        return {
+            "status": "success",
+            "caminho": self.caminho_csv,
+            "fatias_alteradas": alteradas,
+            "total_registros": len(agrupador.df_final),
+            "tempo_total_s": round(tempo_total, 3),
+        }
@@ -0,0 +1,241 @@
+"""
+Substituto local do meuDB em SQLite, para rodar carga e agrupamento sem MySQL (benchmark)
+
+Expõe o mesmo `get_db_cursor(dictionary=...)` do meuDB: cada chamada abre
+uma conexão, faz commit na saída e rollback em caso de erro. O arquivo do
+banco é anexado como `trampo`, então os nomes trampo.tabela dos módulos
+funcionam sem mudança. As tabelas já existem (criadas em SQLite por
+`criar_esquema`); os CREATE TABLE IF NOT EXISTS dos módulos viram no-op.
+
+Só o pedaço do dialeto MySQL usado na carga (backend 'insert') e no
+agrupamento é traduzido: marcadores %s, ON DUPLICATE KEY UPDATE e
+INSERT IGNORE. LOAD DATA, particionamento e ALTER TABLE não existem aqui.
+
+Uso:
+    import banco_sqlite
+    banco_sqlite.configurar('bench.sqlite')
+    banco_sqlite.instalar_como_meudb()   # antes de importar os módulos do projeto
+"""
+import os
+import re
+import sqlite3
+import sys
+import types
+from contextlib import contextmanager
+
+CAMINHO_BANCO_PADRAO = 'benchmark_vendas.sqlite'
+_caminho_banco = CAMINHO_BANCO_PADRAO
+
+# Tabelas do projeto em SQLite (mesmas colunas e índices do MySQL)
+DDL_SQLITE = [
+    """
+    CREATE TABLE IF NOT EXISTS trampo.vendas_medicamentos (
+        indice_global INTEGER PRIMARY KEY AUTOINCREMENT,
+        ANO_VENDA INTEGER, MES_VENDA INTEGER, PRINCIPIO_ATIVO TEXT, MUNICIPIO_VENDA TEXT,
+        QTD_VENDIDA INTEGER, CONSELHO_PRESCRITOR TEXT, UF_CONSELHO_PRESCRITOR TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS trampo.idx_groupby_principal ON vendas_medicamentos "
+    "(ANO_VENDA, MES_VENDA, MUNICIPIO_VENDA, PRINCIPIO_ATIVO)",
+    "CREATE INDEX IF NOT EXISTS trampo.idx_municipio ON vendas_medicamentos (MUNICIPIO_VENDA)",
+    "CREATE INDEX IF NOT EXISTS trampo.idx_principio ON vendas_medicamentos (PRINCIPIO_ATIVO)",
+    """
+    CREATE TABLE IF NOT EXISTS trampo.vendas_agregadas (
+        ANO_VENDA INTEGER NOT NULL, MES_VENDA INTEGER NOT NULL,
+        MUNICIPIO_VENDA TEXT NOT NULL, PRINCIPIO_ATIVO TEXT NOT NULL,
+        TOTAL_VENDIDO INTEGER NOT NULL DEFAULT 0, TOTAL_REGISTROS INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (ANO_VENDA, MES_VENDA, MUNICIPIO_VENDA, PRINCIPIO_ATIVO)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trampo.manifesto_carga (
+        ARQUIVO TEXT PRIMARY KEY, ANO_VENDA INTEGER NOT NULL, MES_VENDA INTEGER NOT NULL,
+        CHECKSUM TEXT NOT NULL, TAMANHO_BYTES INTEGER NOT NULL, MTIME_NS INTEGER NOT NULL,
+        REGISTROS_GRAVADOS INTEGER NOT NULL DEFAULT 0, TOTAL_REGISTROS INTEGER DEFAULT NULL,
+        STATUS TEXT NOT NULL, ATUALIZADO_EM TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trampo.manifesto_carga_cod (
+        ARQUIVO TEXT PRIMARY KEY, ANO_VENDA INTEGER NOT NULL, MES_VENDA INTEGER NOT NULL,
+        CHECKSUM TEXT NOT NULL, TAMANHO_BYTES INTEGER NOT NULL, MTIME_NS INTEGER NOT NULL,
+        REGISTROS_GRAVADOS INTEGER NOT NULL DEFAULT 0, TOTAL_REGISTROS INTEGER DEFAULT NULL,
+        STATUS TEXT NOT NULL, ATUALIZADO_EM TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS trampo.municipios_rj (ID INTEGER PRIMARY KEY, NOME TEXT NOT NULL)",
+    """
+    CREATE TABLE IF NOT EXISTS trampo.dim_principio_ativo (
+        ID INTEGER PRIMARY KEY AUTOINCREMENT, NOME TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trampo.dim_conselho_prescritor (
+        ID INTEGER PRIMARY KEY AUTOINCREMENT, NOME TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trampo.vendas_medicamentos_cod (
+        indice_global INTEGER PRIMARY KEY AUTOINCREMENT,
+        ANO_VENDA INTEGER NOT NULL, MES_VENDA INTEGER NOT NULL, ID_PRINCIPIO_ATIVO INTEGER NOT NULL,
+        ID_MUNICIPIO INTEGER NOT NULL, QTD_VENDIDA INTEGER NOT NULL, ID_CONSELHO_PRESCRITOR INTEGER NOT NULL,
+        UF_CONSELHO_PRESCRITOR TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS trampo.idx_groupby_principal_cod ON vendas_medicamentos_cod "
+    "(ANO_VENDA, MES_VENDA, ID_MUNICIPIO, ID_PRINCIPIO_ATIVO)",
+]
+
+# information_schema mínimo: nenhuma tabela é particionada; TABLES lista as tabelas do arquivo
+DDL_INFORMATION_SCHEMA = [
+    """
+    CREATE TABLE information_schema.PARTITIONS (
+        TABLE_SCHEMA TEXT, TABLE_NAME TEXT, PARTITION_NAME TEXT, PARTITION_EXPRESSION TEXT,
+        PARTITION_DESCRIPTION TEXT, TABLE_ROWS INTEGER, PARTITION_ORDINAL_POSITION INTEGER
+    )
+    """,
+    "CREATE TABLE information_schema.TABLES AS "
+    "SELECT 'trampo' AS TABLE_SCHEMA, name AS TABLE_NAME FROM trampo.sqlite_master WHERE type = 'table'",
+]
+
+_CREATE_TABLE = re.compile(r"^\s*CREATE\s+TABLE\s+IF\s+NOT\s+EXISTS\s+([\w.]+)", re.IGNORECASE)
+_ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_COLUNA = re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE)
+_INSERT_IGNORE = re.compile(r"^\s*INSERT\s+IGNORE\b", re.IGNORECASE)
+
+_traducoes = {}
+
+
+def configurar(caminho=CAMINHO_BANCO_PADRAO):
+    """Define o arquivo do banco e cria as tabelas que faltarem"""
+    global _caminho_banco
+    _caminho_banco = caminho
+    criar_esquema()
+
+
+def criar_esquema():
+    """Cria as tabelas do projeto no arquivo SQLite (se não existirem)"""
+    with _conexao() as conexao:
+        conexao.execute("PRAGMA trampo.journal_mode = WAL")
+        for ddl in DDL_SQLITE:
+            conexao.execute(ddl)
+        conexao.commit()
+
+
+def traduzir(sql):
+    """SQL do MySQL -> SQLite (None para DDL de tabela que já existe aqui)"""
+    traduzido = _traducoes.get(sql)
+    if traduzido is not None or sql in _traducoes:
+        return traduzido
+
+    traduzido = sql.replace('%s', '?')
+    if _CREATE_TABLE.match(traduzido):
+        traduzido = None  # as tabelas vêm de DDL_SQLITE
+    else:
+        traduzido = _INSERT_IGNORE.sub("INSERT OR IGNORE", traduzido)
+        duplicado = _ON_DUPLICATE.search(traduzido)
+        if duplicado:
+            atualizacao = _VALUES_COLUNA.sub(r"excluded.\1", traduzido[duplicado.end():])
+            traduzido = f"{traduzido[:duplicado.start()]}ON CONFLICT DO UPDATE SET{atualizacao}"
+    _traducoes[sql] = traduzido
+    return traduzido
+
+
+def _linha_dict(cursor, linha):
+    return dict(zip([coluna[0] for coluna in cursor.description], linha))
+
+
+@contextmanager
+def _conexao():
+    conexao = sqlite3.connect(':memory:', timeout=60)
+    try:
+        conexao.execute("ATTACH DATABASE ? AS trampo", (_caminho_banco,))
+        conexao.execute("ATTACH DATABASE ':memory:' AS information_schema")
+        for ddl in DDL_INFORMATION_SCHEMA:
+            conexao.execute(ddl)
+        conexao.execute("PRAGMA trampo.synchronous = NORMAL")
+        yield conexao
+    finally:
+        conexao.close()
+
+
+class CursorSqlite:
+    """Cursor com a interface usada pelo projeto (execute, executemany, fetch*, rowcount)"""
+
+    def __init__(self, conexao, dictionary=True):
+        self._cursor = conexao.cursor()
+        if dictionary:
+            self._cursor.row_factory = _linha_dict
+        self.rowcount = 0
+
+    def execute(self, sql, parametros=()):
+        traduzido = traduzir(sql)
+        if traduzido is None:
+            self.rowcount = 0
+            return
+        self._cursor.execute(traduzido, tuple(parametros or ()))
+        self.rowcount = self._cursor.rowcount
+
+    def executemany(self, sql, sequencia):
+        traduzido = traduzir(sql)
+        if traduzido is None:
+            return
+        self._cursor.executemany(traduzido, sequencia)
+        self.rowcount = self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, tamanho=1):
+        return self._cursor.fetchmany(tamanho)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+
+@contextmanager
+def get_db_cursor(dictionary=True):
+    """Cursor numa conexão nova; commit na saída, rollback se houver exceção"""
+    with _conexao() as conexao:
+        try:
+            yield CursorSqlite(conexao, dictionary)
+            conexao.commit()
+        except Exception:
+            conexao.rollback()
+            raise
+
+
+class EtlVendaMedicamento:
+    """O que a carga usa de etl_vendas_medicamentos: o conjunto de municípios válidos"""
+
+    def criar_set_municipios_rj(self):
+        with get_db_cursor(dictionary=True) as cursor:
+            cursor.execute("SELECT NOME FROM trampo.municipios_rj")
+            return {linha['NOME'].strip().upper() for linha in cursor.fetchall()}
+
+
+def instalar_como_meudb():
+    """Registra este módulo como meuDB (e o ETL de municípios) para os imports do projeto
+
+    Precisa rodar antes de qualquer import de módulo do projeto.
+    """
+    sys.modules['meuDB'] = sys.modules[__name__]
+    etl = types.ModuleType('etl_vendas_medicamentos')
+    etl.EtlVendaMedicamento = EtlVendaMedicamento
+    sys.modules['etl_vendas_medicamentos'] = etl
+
+
+def remover_banco(caminho=None):
+    """Apaga o arquivo do banco (e os arquivos do WAL)"""
+    caminho = caminho or _caminho_banco
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
@@ -0,0 +1,321 @@
+"""
+Benchmark da carga e do agrupamento com dados sintéticos e um banco SQLite local
+
+Gera os arquivos mensais (gerador_sintetico.py), carrega cada um como o
+InserirJaneiro2016 faz (manifesto, normalização, INSERTs em lote e tabela
+agregada) e agrupa com o AgrupadorVendasMedicamentos, tudo contra o
+banco_sqlite no lugar do meuDB. Cada etapa registra tempo, linhas por
+segundo e o pico de memória (RSS) do processo ao final dela; o resultado
+vai para um JSON que pode ser comparado com o de outra versão do código.
+
+O SQLite não tem o desempenho do MySQL: os números servem para comparar
+versões do código entre si, na mesma máquina e com os mesmos parâmetros.
+
+Uso:
+    python benchmark_vendas.py --linhas 500000 --meses 3 --saida benchmark_antes.json
+    python benchmark_vendas.py --linhas 500000 --meses 3 --saida benchmark_depois.json --comparar benchmark_antes.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import pandas as pd
+
+# Adicionar o diretório atual ao path para importar os módulos do projeto
+sys.path.append(os.path.dirname(__file__))
+
+import banco_sqlite
+
+# O banco local precisa estar no lugar do meuDB antes de qualquer import do projeto
+banco_sqlite.instalar_como_meudb()
+
+from agrupamento_vendas_medicamentos import AgrupadorVendasMedicamentos, DIMENSOES_PADRAO, GRANULARIDADES
+from gerador_sintetico import (DELIMITADORES_GERADOR, MUNICIPIOS_RJ, gerar_arquivo, gerar_municipios_rj,
+                               meses_a_partir)
+from inserir_janeiro_2016 import InserirJaneiro2016
+from insercao_em_lote import TAMANHO_LOTE_PADRAO
+from leitura_csv import configurar_cache_formatos
+from metricas import Metricas
+
+VERSAO_FORMATO = 1
+FONTES_BENCHMARK = ('detalhe', 'agregada', 'codificada')
+
+
+def pico_rss_mb():
+    """Pico de memória residente do processo até agora, em MB (None se não houver como medir)"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em bytes no macOS e em KB no Linux
+    return round(pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024, 1)
+
+
+def versao_codigo():
+    """Commit atual (git describe), com -dirty se houver alterações não commitadas"""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Cronometro:
+    """Mede as etapas de uma execução: tempo, linhas processadas e pico de RSS ao final"""
+
+    def __init__(self, verboso=False):
+        self.verboso = verboso
+        self.etapas = {}
+
+    def medir(self, nome, funcao, *args, **kwargs):
+        """Executa `funcao` e registra a etapa; a função retorna (resultado, linhas processadas)"""
+        with open(os.devnull, 'w', encoding='utf-8') as descarte:
+            inicio = time.perf_counter()
+            if self.verboso:
+                resultado, linhas = funcao(*args, **kwargs)
+            else:
+                with redirect_stdout(descarte):
+                    resultado, linhas = funcao(*args, **kwargs)
+            tempo = time.perf_counter() - inicio
+        self.etapas[nome] = {
+            "tempo_s": round(tempo, 4),
+            "linhas": linhas,
+            "linhas_por_segundo": round(linhas / tempo, 1) if tempo > 0 else None,
+            "pico_rss_mb": pico_rss_mb(),
+        }
+        print(f"⏱️  {nome:<28} {tempo:>9.3f}s  {linhas:>12,} linhas  "
+              f"{self.etapas[nome]['linhas_por_segundo'] or 0:>12,.0f} linhas/s")
+        return resultado
+
+
+def carregar_arquivos(gerados, tamanho_bloco, tamanho_lote, codificado, metricas):
+    """Carrega os arquivos gerados como o InserirJaneiro2016 (um mês por vez)"""
+    registros = 0
+    for gerado in gerados:
+        inseridor = InserirJaneiro2016(tamanho_bloco=tamanho_bloco, tamanho_lote=tamanho_lote,
+                                       codificado=codificado, metricas=metricas)
+        inseridor.ano, inseridor.mes = gerado['ano'], gerado['mes']
+        inseridor.arquivo, inseridor.caminho_arquivo = gerado['arquivo'], gerado['caminho']
+        resultado = inseridor.executar()
+        if resultado.get("status") != "success" or (gerado['linhas_rj'] and not resultado['registros_inseridos']):
+            raise RuntimeError(f"Carga de {gerado['arquivo']} falhou: {resultado.get('message')} "
+                               f"(rode com --verboso para ver a saída da carga)")
+        registros += resultado['registros_inseridos']
+    return registros, sum(gerado['linhas'] for gerado in gerados)
+
+
+def contar_linhas(tabela):
+    """Linhas de uma tabela do banco local (fora do tempo medido)"""
+    with banco_sqlite.get_db_cursor(dictionary=False) as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {tabela}")
+        return cursor.fetchone()[0]
+
+
+def agrupar(agrupador, linhas_fonte):
+    if not agrupador.processar_consulta_unica():
+        raise RuntimeError(f"Agrupamento da fonte {agrupador.fonte} falhou (rode com --verboso)")
+    return agrupador.df_final, linhas_fonte
+
+
+def exportar(agrupador, diretorio):
+    caminho_csv = agrupador.salvar_csv(os.path.join(diretorio, f"agrupado_{agrupador.fonte}.csv"))
+    caminho_json = agrupador.salvar_json(os.path.join(diretorio, f"agrupado_{agrupador.fonte}.json"))
+    if not (caminho_csv and caminho_json):
+        raise RuntimeError(f"Exportação da fonte {agrupador.fonte} falhou (rode com --verboso)")
+    return (caminho_csv, caminho_json), len(agrupador.df_final)
+
+
+def executar_rodada(args, gerados, diretorio):
+    """Uma execução completa num banco novo: carga e, para cada fonte, agrupamento, relatório e exportação"""
+    caminho_banco = os.path.join(diretorio, 'benchmark.sqlite')
+    banco_sqlite.remover_banco(caminho_banco)
+    banco_sqlite.configurar(caminho_banco)
+    with banco_sqlite.get_db_cursor() as cursor:
+        cursor.executemany("INSERT INTO trampo.municipios_rj (ID, NOME) VALUES (%s, %s)",
+                           list(enumerate(MUNICIPIOS_RJ, 1)))
+
+    cronometro = Cronometro(args.verboso)
+    metricas = Metricas('carga')
+    cronometro.medir("carga", carregar_arquivos, gerados, args.tamanho_bloco, args.tamanho_lote, args.codificado,
+                     metricas)
+    cronometro.etapas["carga"]["subetapas"] = metricas.como_dict()["etapas"]
+
+    for fonte in args.fontes:
+        agrupador = AgrupadorVendasMedicamentos(fonte=fonte, dimensoes=args.dimensoes,
+                                                granularidade=args.granularidade)
+        linhas_fonte = contar_linhas(agrupador.tabela)
+        cronometro.medir(f"agrupamento_{fonte}", agrupar, agrupador, linhas_fonte)
+        cronometro.medir(f"relatorio_{fonte}",
+                         lambda: (agrupador.relatorio(), len(agrupador.df_final)))
+        cronometro.medir(f"exportacao_{fonte}", exportar, agrupador, diretorio)
+        cronometro.medir(f"ranking_{fonte}",
+                         lambda: (agrupador.salvar_rankings(os.path.join(diretorio, f"rankings_{fonte}.json")),
+                                  len(agrupador.df_final)))
+        cronometro.etapas[f"agrupamento_{fonte}"]["subetapas"] = agrupador.metricas.como_dict()["etapas"]
+    return cronometro.etapas
+
+
+def consolidar(rodadas):
+    """Etapas das rodadas -> mediana do tempo (e da vazão), mínimo e tempos de cada rodada"""
+    etapas = {}
+    for nome in rodadas[0]:
+        medidas = [rodada[nome] for rodada in rodadas]
+        tempos = [medida['tempo_s'] for medida in medidas]
+        tempo = statistics.median(tempos)
+        linhas = medidas[0]['linhas']
+        etapas[nome] = {
+            "tempo_s": round(tempo, 4),
+            "tempo_min_s": min(tempos),
+            "tempos_s": tempos,
+            "linhas": linhas,
+            "linhas_por_segundo": round(linhas / tempo, 1) if tempo > 0 else None,
+            "pico_rss_mb": max(medida['pico_rss_mb'] or 0 for medida in medidas) or None,
+        }
+        if "subetapas" in medidas[-1]:
+            # Tempos internos (metricas.py) da última rodada
+            etapas[nome]["subetapas"] = medidas[-1]["subetapas"]
+    return etapas
+
+
+def comparar(anterior, atual):
+    """{etapa: {tempo_anterior_s, tempo_atual_s, variacao_pct}} das etapas presentes nos dois resultados"""
+    comparacao = {}
+    for nome, medida in atual["etapas"].items():
+        antes = anterior.get("etapas", {}).get(nome)
+        if not antes or not antes["tempo_s"]:
+            continue
+        comparacao[nome] = {
+            "tempo_anterior_s": antes["tempo_s"],
+            "tempo_atual_s": medida["tempo_s"],
+            "variacao_pct": round((medida["tempo_s"] / antes["tempo_s"] - 1) * 100, 1),
+            "pico_rss_anterior_mb": antes.get("pico_rss_mb"),
+            "pico_rss_atual_mb": medida.get("pico_rss_mb"),
+        }
+    return comparacao
+
+
+def imprimir_comparacao(comparacao, versao_anterior):
+    print(f"\n📊 COMPARAÇÃO COM {versao_anterior or 'resultado anterior'}")
+    print("=" * 60)
+    for nome, dados in comparacao.items():
+        simbolo = "🔺" if dados['variacao_pct'] > 0 else "🔻"
+        print(f"   {nome:<28} {dados['tempo_anterior_s']:>9.3f}s -> {dados['tempo_atual_s']:>9.3f}s  "
+              f"{simbolo} {dados['variacao_pct']:+.1f}%")
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Benchmark da carga e do agrupamento com dados sintéticos")
+    parser.add_argument("--linhas", type=int, default=200_000, help="linhas por arquivo mensal (padrão: 200000)")
+    parser.add_argument("--proporcao-rj", type=float, default=0.1, help="fração de linhas do RJ (padrão: 0.1)")
+    parser.add_argument("--meses", type=int, default=1, help="arquivos mensais a partir de 01/2016 (padrão: 1)")
+    parser.add_argument("--delimitador", choices=DELIMITADORES_GERADOR, default='ponto-e-virgula')
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--tamanho-bloco", type=int, default=200_000, help="linhas lidas do CSV por bloco")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE_PADRAO, help="registros por INSERT/commit")
+    parser.add_argument("--codificado", action="store_true", help="carga em vendas_medicamentos_cod")
+    parser.add_argument("--fontes", nargs='+', choices=FONTES_BENCHMARK, default=None,
+                        help="fontes agrupadas (padrão: detalhe e agregada; codificada e agregada com --codificado)")
+    parser.add_argument("--dimensoes", nargs='+', default=list(DIMENSOES_PADRAO))
+    parser.add_argument("--granularidade", choices=GRANULARIDADES, default='ano')
+    parser.add_argument("--repeticoes", type=int, default=1, help="rodadas completas; o JSON traz a mediana")
+    parser.add_argument("--diretorio", default=None, help="diretório de trabalho (padrão: temporário, apagado no fim)")
+    parser.add_argument("--saida", default=None, help="JSON do resultado (padrão: benchmark_vendas_<data>.json)")
+    parser.add_argument("--comparar", metavar="JSON", default=None, help="resultado anterior para comparar")
+    parser.add_argument("--limite-regressao", type=float, default=None, metavar="PCT",
+                        help="com --comparar, sai com código 1 se alguma etapa ficar PCT%% mais lenta")
+    parser.add_argument("--verboso", action="store_true", help="mostra a saída da carga e do agrupamento")
+    args = parser.parse_args()
+
+    if args.fontes is None:
+        args.fontes = ['codificada', 'agregada'] if args.codificado else ['detalhe', 'agregada']
+    if args.codificado and 'detalhe' in args.fontes:
+        parser.error("com --codificado a carga não grava vendas_medicamentos; use --fontes codificada agregada")
+    if not args.codificado and 'codificada' in args.fontes:
+        parser.error("a fonte codificada exige --codificado")
+
+    diretorio = args.diretorio or tempfile.mkdtemp(prefix='benchmark_vendas_')
+    os.makedirs(diretorio, exist_ok=True)
+    # Os arquivos gerados não entram no cache de formatos do repositório (uma entrada por diretório temporário)
+    configurar_cache_formatos(os.path.join(diretorio, '.cache_formatos_csv.json'))
+    saida = args.saida or f"benchmark_vendas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+
+    print("🏁 BENCHMARK DE CARGA E AGRUPAMENTO")
+    print("=" * 60)
+    print(f"📁 Diretório de trabalho: {diretorio}")
+
+    try:
+        inicio = time.perf_counter()
+        sep = DELIMITADORES_GERADOR[args.delimitador]
+        gerados = [gerar_arquivo(diretorio, ano, mes, args.linhas, args.proporcao_rj, sep, args.semente)
+                   for ano, mes in meses_a_partir(2016, 1, args.meses)]
+        gerar_municipios_rj(os.path.join(diretorio, 'municipios_rj.csv'))
+        geracao = {
+            "tempo_s": round(time.perf_counter() - inicio, 4),
+            "arquivos": len(gerados),
+            "linhas": sum(gerado['linhas'] for gerado in gerados),
+            "linhas_rj": sum(gerado['linhas_rj'] for gerado in gerados),
+            "bytes": sum(gerado['bytes'] for gerado in gerados),
+        }
+        print(f"🧪 {geracao['arquivos']} arquivo(s), {geracao['linhas']:,} linhas "
+              f"({geracao['linhas_rj']:,} RJ) gerados em {geracao['tempo_s']:.1f}s")
+
+        rodadas = []
+        for rodada in range(1, args.repeticoes + 1):
+            print(f"\n🔁 Rodada {rodada}/{args.repeticoes}")
+            rodadas.append(executar_rodada(args, gerados, diretorio))
+    finally:
+        if not args.diretorio:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    resultado = {
+        "formato": VERSAO_FORMATO,
+        "data": datetime.now().isoformat(),
+        "versao": versao_codigo(),
+        "ambiente": {"python": platform.python_version(), "pandas": pd.__version__,
+                     "sqlite": banco_sqlite.sqlite3.sqlite_version, "plataforma": platform.platform()},
+        "parametros": {chave: valor for chave, valor in vars(args).items()
+                       if chave not in ('diretorio', 'saida', 'comparar', 'limite_regressao', 'verboso')},
+        "geracao": geracao,
+        "etapas": consolidar(rodadas),
+        "pico_rss_mb": pico_rss_mb(),
+    }
+
+    codigo_saida = 0
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            anterior = json.load(arquivo)
+        if anterior.get("parametros") != resultado["parametros"]:
+            print("\n⚠️  Parâmetros diferentes dos do resultado anterior: a comparação não é direta")
+        resultado["comparacao"] = comparar(anterior, resultado)
+        imprimir_comparacao(resultado["comparacao"], anterior.get("versao"))
+        if args.limite_regressao is not None:
+            piores = [nome for nome, dados in resultado["comparacao"].items()
+                      if dados["variacao_pct"] > args.limite_regressao]
+            if piores:
+                print(f"❌ Regressão acima de {args.limite_regressao}% em: {', '.join(piores)}")
+                codigo_saida = 1
+
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f"\n✅ Resultado salvo em: {saida}")
+    print(f"🧠 Pico de memória: {resultado['pico_rss_mb']} MB")
+    sys.exit(codigo_saida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Cache em disco (SQLite) dos resultados das consultas de agrupamento
+
+A chave combina a consulta, os parâmetros e a versão dos dados (maior
+indice_global + conjunto de (ano, mês) carregados; na vendas_agregadas,
+os totais de cada mês). Quando um mês novo é
+carregado a versão muda, as entradas antigas deixam de servir e são
+apagadas. O tamanho total é limitado, descartando as menos usadas (LRU).
+
+Uso:
+    python cache_resultados.py --resumo
+    python cache_resultados.py --limpar
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+CAMINHO_CACHE_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache_resultados.sqlite')
+TAMANHO_MAXIMO_MB = 512
+# Formato das linhas guardadas; mudar o formato invalida as entradas antigas
+FORMATO_LINHAS = 'tuplas'
+
+DDL_CACHE = """
+    CREATE TABLE IF NOT EXISTS resultados (
+        CHAVE TEXT PRIMARY KEY,
+        FONTE TEXT NOT NULL,
+        VERSAO TEXT NOT NULL,
+        TAMANHO_BYTES INTEGER NOT NULL,
+        ULTIMO_ACESSO REAL NOT NULL,
+        DADOS BLOB NOT NULL
+    )
+"""
+
+
+def versao_tabela(cursor, tabela):
+    """Token de versão de uma tabela de vendas: maior indice_global + (ano, mês) presentes
+
+    Recarregar um mês gera índices novos (AUTO_INCREMENT) e apagar um mês
+    muda o conjunto de fatias, então as duas coisas mudam o token.
+    """
+    cursor.execute(f"SELECT MAX(indice_global) AS MAXIMO FROM {tabela}")
+    linha = cursor.fetchone()
+    maximo = linha['MAXIMO'] if isinstance(linha, dict) else linha[0]
+    cursor.execute(f"SELECT DISTINCT ANO_VENDA, MES_VENDA FROM {tabela} ORDER BY ANO_VENDA, MES_VENDA")
+    fatias = [list(linha.values()) if isinstance(linha, dict) else list(linha) for linha in cursor.fetchall()]
+    return _resumo({"tabela": tabela, "maximo": maximo, "fatias": fatias})
+
+
+def versao_agregada(cursor, tabela):
+    """Token de versão da vendas_agregadas: linhas, total vendido e registros de cada (ano, mês)
+
+    A agregada não tem indice_global e é reescrita pela ingestão (normal ou
+    --codificado) e por vendas_agregadas.py --reconstruir; qualquer mudança no
+    conteúdo muda algum desses totais. Custa uma leitura da agregada, bem
+    menor que o detalhe.
+    """
+    cursor.execute(f"""
+        SELECT ANO_VENDA, MES_VENDA, COUNT(*), SUM(TOTAL_VENDIDO), SUM(TOTAL_REGISTROS)
+        FROM {tabela}
+        GROUP BY ANO_VENDA, MES_VENDA
+        ORDER BY ANO_VENDA, MES_VENDA
+    """)
+    fatias = [list(linha.values()) if isinstance(linha, dict) else list(linha) for linha in cursor.fetchall()]
+    return _resumo({"tabela": tabela, "fatias": fatias})
+
+
+def versao_arquivos(padrao):
+    """Token de versão de um conjunto de arquivos (caminho, tamanho e mtime de cada um)"""
+    estados = []
+    for caminho in sorted(glob.glob(padrao, recursive=True)):
+        estado = os.stat(caminho)
+        estados.append([caminho, estado.st_size, estado.st_mtime_ns])
+    return _resumo({"arquivos": estados})
+
+
+def _resumo(valor):
+    return hashlib.sha256(json.dumps(valor, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class CacheResultados:
+    """Cache persistente de resultados (listas de linhas), seguro entre threads"""
+
+    def __init__(self, caminho=CAMINHO_CACHE_RESULTADOS, tamanho_maximo_mb=TAMANHO_MAXIMO_MB):
+        self.caminho = caminho
+        self.tamanho_maximo = int(tamanho_maximo_mb * 1024 * 1024)
+        self.acertos = 0
+        self.faltas = 0
+        self._trava = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        self._conexao.execute(DDL_CACHE)
+        self._conexao.commit()
+
+    @staticmethod
+    def chave(fonte, versao, consulta, parametros=()):
+        """Chave de uma consulta numa versão dos dados"""
+        return _resumo({"formato": FORMATO_LINHAS, "fonte": fonte, "versao": versao,
+                        "consulta": " ".join(consulta.split()),
+                        "parametros": list(parametros)})
+
+    def obter(self, chave):
+        """Linhas guardadas para `chave`, ou None"""
+        with self._trava:
+            linha = self._conexao.execute("SELECT DADOS FROM resultados WHERE CHAVE = ?", (chave,)).fetchone()
+            if linha is None:
+                self.faltas += 1
+                return None
+            self._conexao.execute("UPDATE resultados SET ULTIMO_ACESSO = ? WHERE CHAVE = ?", (time.time(), chave))
+            self._conexao.commit()
+            self.acertos += 1
+        return pickle.loads(zlib.decompress(linha[0]))
+
+    def gravar(self, chave, fonte, versao, linhas):
+        """Guarda `linhas`, apaga versões antigas da mesma fonte e aplica o limite de tamanho"""
+        dados = zlib.compress(pickle.dumps(list(linhas), protocol=pickle.HIGHEST_PROTOCOL))
+        if len(dados) > self.tamanho_maximo:
+            return False
+        with self._trava:
+            self._conexao.execute("DELETE FROM resultados WHERE FONTE = ? AND VERSAO <> ?", (fonte, versao))
+            self._conexao.execute("""
+                INSERT OR REPLACE INTO resultados (CHAVE, FONTE, VERSAO, TAMANHO_BYTES, ULTIMO_ACESSO, DADOS)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (chave, fonte, versao, len(dados), time.time(), dados))
+            self._descartar_excesso()
+            self._conexao.commit()
+        return True
+
+    def _descartar_excesso(self):
+        total = self._conexao.execute("SELECT COALESCE(SUM(TAMANHO_BYTES), 0) FROM resultados").fetchone()[0]
+        if total <= self.tamanho_maximo:
+            return
+        for chave, tamanho in self._conexao.execute(
+                "SELECT CHAVE, TAMANHO_BYTES FROM resultados ORDER BY ULTIMO_ACESSO").fetchall():
+            self._conexao.execute("DELETE FROM resultados WHERE CHAVE = ?", (chave,))
+            total -= tamanho
+            if total <= self.tamanho_maximo:
+                break
+
+    def limpar(self):
+        """Apaga todas as entradas"""
+        with self._trava:
+            self._conexao.execute("DELETE FROM resultados")
+            self._conexao.commit()
+            self._conexao.execute("VACUUM")
+
+    def resumo(self):
+        """Entradas e bytes por fonte"""
+        with self._trava:
+            linhas = self._conexao.execute("""
+                SELECT FONTE, COUNT(*), COALESCE(SUM(TAMANHO_BYTES), 0)
+                FROM resultados GROUP BY FONTE ORDER BY FONTE
+            """).fetchall()
+        return {fonte: {"entradas": entradas, "bytes": tamanho} for fonte, entradas, tamanho in linhas}
+
+    def fechar(self):
+        with self._trava:
+            self._conexao.close()
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Manutenção do cache de resultados do agrupamento")
+    parser.add_argument("--caminho", default=CAMINHO_CACHE_RESULTADOS, help="arquivo SQLite do cache")
+    parser.add_argument("--resumo", action="store_true", help="mostra entradas e tamanho por fonte")
+    parser.add_argument("--limpar", action="store_true", help="apaga todas as entradas")
+    args = parser.parse_args()
+
+    cache = CacheResultados(args.caminho)
+    if args.limpar:
+        cache.limpar()
+        print("🗑️  Cache de resultados limpo")
+    if args.resumo or not args.limpar:
+        resumo = cache.resumo()
+        if not resumo:
+            print("📭 Cache vazio")
+        for fonte, dados in resumo.items():
+            print(f"📦 {fonte}: {dados['entradas']:,} entradas, {dados['bytes'] / (1024 * 1024):.1f} MB")
+    cache.fechar()
+
+
+if __name__ == "__main__":
+    main()
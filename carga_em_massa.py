@@ -0,0 +1,246 @@
+"""
+Carga em massa com LOAD DATA LOCAL INFILE a partir de um TSV temporário
+
+Requisitos no MySQL:
+    - servidor com `local_infile=ON`
+    - conexão do meuDB aberta com `allow_local_infile=True`
+"""
+import os
+import sys
+import tempfile
+import time
+
+# Adicionar o diretório atual ao path para importar meuDB
+sys.path.append(os.path.dirname(__file__))
+
+from meuDB import get_db_cursor
+from normalizacao_vendas import COLUNAS_VENDAS
+from vendas_agregadas import acumular, gravar_acumulado
+
+TABELA_VENDAS = "trampo.vendas_medicamentos"
+
+# Índices secundários que podem ser removidos e recriados em volta da carga
+INDICES_SECUNDARIOS = {
+    'idx_groupby_principal': '(ANO_VENDA, MES_VENDA, MUNICIPIO_VENDA, PRINCIPIO_ATIVO)',
+    'idx_municipio': '(MUNICIPIO_VENDA)',
+    'idx_principio': '(PRINCIPIO_ATIVO)',
+}
+
+
+def _escapar_tsv(valor):
+    """Escapa um valor no formato padrão do LOAD DATA (ESCAPED BY '\\\\')"""
+    if valor is None:
+        return '\\N'
+    texto = str(valor)
+    return (texto.replace('\\', '\\\\')
+                 .replace('\t', '\\t')
+                 .replace('\n', '\\n')
+                 .replace('\r', '\\r'))
+
+
+class CarregadorEmMassa:
+    """Grava registros num TSV temporário e carrega com LOAD DATA LOCAL INFILE
+
+    Mesma interface do InseridorEmLote (`adicionar`, `registros_inseridos`,
+    `erros`, `obter_estatisticas`), para que os scripts de inserção possam
+    escolher o backend pela linha de comando.
+    """
+
+    def __init__(self, tabela=TABELA_VENDAS, colunas=COLUNAS_VENDAS, indices=INDICES_SECUNDARIOS,
+                 recriar_indices=False, diretorio_temporario=None, manter_agregada=False,
+                 codificador=None, metricas=None):
+        self.tabela = tabela
+        # metricas.Metricas opcional: 'serializacao' (TSV), 'insercao' (LOAD DATA) e 'commit'
+        self.metricas = metricas
+        self.indices = indices
+        # Transforma os registros antes de escrever no TSV (ex.: dimensoes.CodificadorVendas)
+        self.codificador = codificador
+        # Totais para vendas_agregadas, gravados no commit do LOAD DATA
+        self.manter_agregada = manter_agregada
+        self.acumulado = {}
+        self.colunas = colunas
+        self.recriar_indices = recriar_indices
+        self.diretorio_temporario = diretorio_temporario
+        self.arquivo = None
+        self.caminho_arquivo = None
+        self.comandos_pos_carga = []  # (sql, parametros) executados no commit do LOAD DATA
+        self.registros_escritos = 0
+        self.registros_inseridos = 0
+        self.erros = []
+        self.tempo_escrita = 0.0
+        self.tempo_carga = 0.0
+        self.tempo_indices = 0.0
+        self.inicio = None
+
+    def __enter__(self):
+        self.inicio = time.time()
+        fd, self.caminho_arquivo = tempfile.mkstemp(prefix='vendas_', suffix='.tsv',
+                                                    dir=self.diretorio_temporario)
+        self.arquivo = os.fdopen(fd, 'w', encoding='utf-8', newline='\n')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.arquivo.close()
+            # Só carrega se o laço de chamada terminou sem erro
+            if exc_type is None:
+                self.carregar()
+        finally:
+            if self.caminho_arquivo and os.path.exists(self.caminho_arquivo):
+                os.remove(self.caminho_arquivo)
+        return False
+
+    def adicionar(self, registro):
+        """Escreve um registro (tupla na ordem de `colunas`) no TSV"""
+        self.adicionar_varios([registro])
+
+    def adicionar_varios(self, registros):
+        """Escreve vários registros de uma vez"""
+        inicio = time.time()
+        if self.codificador is not None:
+            originais = []
+            for registro, linha in zip(registros, self.codificador(registros)):
+                if linha is None:
+                    self.erros.append(f"❌ Registro não codificado: {registro}")
+                    continue
+                originais.append(registro)
+                self.arquivo.write('\t'.join(_escapar_tsv(valor) for valor in linha))
+                self.arquivo.write('\n')
+            registros = originais
+        else:
+            for registro in registros:
+                self.arquivo.write('\t'.join(_escapar_tsv(valor) for valor in registro))
+                self.arquivo.write('\n')
+        self.registros_escritos += len(registros)
+        if self.manter_agregada:
+            acumular(self.acumulado, registros)
+        self.tempo_escrita += time.time() - inicio
+        if self.metricas is not None:
+            self.metricas.registrar('serializacao', time.time() - inicio)
+
+    def gravar_lote(self, registros, comandos_extras=()):
+        """Escreve `registros` no TSV e agenda `comandos_extras` para o commit do LOAD DATA
+
+        Mesma assinatura do InseridorEmLote.gravar_lote; aqui tudo é gravado
+        numa única transação no final.
+        """
+        self.adicionar_varios(registros)
+        self.comandos_pos_carga.extend(comandos_extras)
+        return len(registros)
+
+    def obter_indices_existentes(self):
+        """Retorna os índices secundários que existem hoje na tabela"""
+        schema, tabela = self.tabela.split('.')
+        with get_db_cursor(dictionary=True) as cursor:
+            cursor.execute("""
+                SELECT DISTINCT INDEX_NAME
+                FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+            """, (schema, tabela))
+            existentes = {linha['INDEX_NAME'] for linha in cursor.fetchall()}
+        return [nome for nome in self.indices if nome in existentes]
+
+    def remover_indices(self):
+        """Remove os índices secundários antes da carga"""
+        indices = self.obter_indices_existentes()
+        if not indices:
+            return []
+
+        print(f"🗑️  Removendo índices: {', '.join(indices)}")
+        with get_db_cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {self.tabela} "
+                           + ", ".join(f"DROP INDEX {nome}" for nome in indices))
+        return indices
+
+    def criar_indices(self):
+        """Recria (num único ALTER TABLE) os índices secundários que faltam"""
+        existentes = set(self.obter_indices_existentes())
+        faltando = [nome for nome in self.indices if nome not in existentes]
+        if not faltando:
+            return []
+
+        print(f"🔧 Recriando índices: {', '.join(faltando)}")
+        with get_db_cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {self.tabela} "
+                           + ", ".join(f"ADD INDEX {nome} {self.indices[nome]}"
+                                       for nome in faltando))
+        return faltando
+
+    def carregar(self):
+        """Executa o LOAD DATA LOCAL INFILE do TSV gerado"""
+        if self.registros_escritos == 0:
+            print("⚠️ Nenhum registro para carregar")
+            if self.comandos_pos_carga:
+                with get_db_cursor() as cursor:
+                    for sql, parametros in self.comandos_pos_carga:
+                        cursor.execute(sql, parametros)
+            return 0
+
+        tamanho_mb = os.path.getsize(self.caminho_arquivo) / (1024 * 1024)
+        print(f"🚚 Carregando {self.registros_escritos:,} registros ({tamanho_mb:.2f} MB) "
+              f"com LOAD DATA LOCAL INFILE...")
+
+        if self.recriar_indices:
+            inicio = time.time()
+            self.remover_indices()
+            self.tempo_indices += time.time() - inicio
+
+        try:
+            inicio = time.time()
+            load_query = f"""
+                LOAD DATA LOCAL INFILE %s
+                INTO TABLE {self.tabela}
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+                LINES TERMINATED BY '\\n'
+                ({', '.join(self.colunas)})
+            """
+            with get_db_cursor() as cursor:
+                # MySQL aceita '/' como separador de caminho também no Windows
+                cursor.execute(load_query, (self.caminho_arquivo.replace('\\', '/'),))
+                self.registros_inseridos = cursor.rowcount
+                if self.manter_agregada:
+                    gravar_acumulado(cursor, self.acumulado)
+                for sql, parametros in self.comandos_pos_carga:
+                    cursor.execute(sql, parametros)
+                inicio_commit = time.time()  # o commit acontece na saída do with
+            self.tempo_carga = time.time() - inicio
+            if self.metricas is not None:
+                self.metricas.registrar('insercao', inicio_commit - inicio)
+                self.metricas.registrar('commit', time.time() - inicio_commit)
+                self.metricas.contar('registros_gravados', self.registros_inseridos)
+        finally:
+            if self.recriar_indices:
+                inicio = time.time()
+                self.criar_indices()
+                self.tempo_indices += time.time() - inicio
+
+        descartados = self.registros_escritos - self.registros_inseridos
+        if descartados > 0:
+            self.erros.append(f"❌ {descartados:,} registros descartados pelo LOAD DATA")
+            if self.manter_agregada:
+                print("⚠️  vendas_agregadas pode divergir: rode python vendas_agregadas.py --verificar")
+
+        print(f"✅ Carga concluída: {self.registros_inseridos:,} registros em {self.tempo_carga:.2f}s")
+        return self.registros_inseridos
+
+    def vazao(self):
+        """Registros carregados por segundo (escrita do TSV + LOAD DATA + índices)"""
+        tempo = self.tempo_escrita + self.tempo_carga + self.tempo_indices
+        if tempo <= 0:
+            return 0.0
+        return self.registros_inseridos / tempo
+
+    def obter_estatisticas(self):
+        """Retorna as estatísticas da carga"""
+        tempo_total = time.time() - self.inicio if self.inicio else 0.0
+        return {
+            "registros_inseridos": self.registros_inseridos,
+            "registros_escritos": self.registros_escritos,
+            "erros": len(self.erros),
+            "tempo_escrita_s": round(self.tempo_escrita, 3),
+            "tempo_carga_s": round(self.tempo_carga, 3),
+            "tempo_indices_s": round(self.tempo_indices, 3),
+            "tempo_total_s": round(tempo_total, 3),
+            "registros_por_segundo": round(self.vazao(), 1),
+        }
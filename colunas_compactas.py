@@ -0,0 +1,106 @@
+"""
+Resultado do agrupamento em colunas tipadas, montado direto dos lotes do cursor
+
+O agrupamento lê milhões de linhas (tuplas na ordem do SELECT). Em vez de
+um DataFrame de objetos, com um str por linha em cada coluna de texto e
+ano/total como object ou Decimal, cada lote vira arrays tipados:
+ANO_VENDA int16, MES_VENDA int8, TOTAL_VENDIDO float64 e as colunas de
+texto como categorias (códigos int32 + uma tabela de nomes em ordem
+alfabética). As strings de cada lote são liberadas logo depois de
+codificadas, então só os nomes distintos ficam em memória.
+
+Uso:
+    montador = MontadorColunas(['ANO_VENDA', 'MUNICIPIO_VENDA', 'PRINCIPIO_ATIVO', 'TOTAL_VENDIDO'])
+    for lote in lotes:
+        montador.adicionar(lote)
+    df = montador.dataframe()
+"""
+import numpy as np
+import pandas as pd
+
+# Tipo das colunas numéricas do resultado; as demais são categorias
+TIPOS_COLUNAS = {
+    'ANO_VENDA': 'int16',
+    'MES_VENDA': 'int8',
+    'TOTAL_VENDIDO': 'float64',  # float: SUM só de nulos vira NaN
+    'POSICAO': 'int32',  # posição nos rankings
+}
+
+
+def categorias_ordenadas(codigos, nomes):
+    """pd.Categorical com as categorias em ordem alfabética (sort_values segue a ordem dos nomes)"""
+    nomes = np.array(nomes, dtype=object)
+    ordem = np.argsort(nomes, kind='stable')
+    if len(ordem):
+        posicao = np.empty(len(ordem), dtype=np.int32)
+        posicao[ordem] = np.arange(len(ordem), dtype=np.int32)
+        codigos = np.where(codigos >= 0, posicao[codigos], -1)
+    return pd.Categorical.from_codes(codigos, categories=nomes[ordem])
+
+
+def compactar(df):
+    """Converte um DataFrame do resultado (lido de CSV, concatenado...) para os tipos do MontadorColunas"""
+    for coluna in df.columns:
+        tipo = TIPOS_COLUNAS.get(coluna, 'category')
+        if df[coluna].dtype != tipo:
+            df[coluna] = df[coluna].astype(tipo)
+    return df
+
+
+def ler_csv(caminho):
+    """Lê um CSV do resultado (salvar_csv, modo incremental) já nos tipos compactos
+
+    Só TOTAL_VENDIDO vazio vira NaN; nomes como "NA" ou "NULL" continuam texto.
+    """
+    return compactar(pd.read_csv(caminho, encoding='utf-8', keep_default_na=False,
+                                 na_values={'TOTAL_VENDIDO': ['']}))
+
+
+class MontadorColunas:
+    """Acumula lotes de linhas (tuplas na ordem de `colunas`) em arrays tipados
+
+    As colunas de `inteiras` (IDs da fonte codificada, decodificados depois)
+    ficam em int64 em vez de categoria. Não é seguro entre threads: quem
+    consulta em paralelo entrega os lotes em ordem a um único montador.
+    """
+
+    def __init__(self, colunas, inteiras=()):
+        self.colunas = list(colunas)
+        self.tipos = {coluna: TIPOS_COLUNAS.get(coluna, 'int64' if coluna in inteiras else 'category')
+                      for coluna in self.colunas}
+        self.linhas = 0
+        self._partes = {coluna: [] for coluna in self.colunas}  # um array por lote
+        self._nomes = {coluna: {} for coluna, tipo in self.tipos.items() if tipo == 'category'}  # nome -> código
+
+    def adicionar(self, lote):
+        """Converte um lote (lista de tuplas) coluna a coluna"""
+        if not len(lote):
+            return
+        for coluna, valores in zip(self.colunas, zip(*lote)):
+            if coluna in self._nomes:
+                self._partes[coluna].append(self._codificar(coluna, valores))
+            else:
+                self._partes[coluna].append(np.asarray(valores, dtype=self.tipos[coluna]))
+        self.linhas += len(lote)
+
+    def _codificar(self, coluna, valores):
+        # factorize no lote (vetorizado) e só os nomes distintos passam pelo dict global
+        codigos, unicos = pd.factorize(np.asarray(valores, dtype=object))
+        if not len(unicos):
+            return np.full(len(codigos), -1, dtype=np.int32)  # lote só com nulos
+        nomes = self._nomes[coluna]
+        globais = np.fromiter((nomes.setdefault(nome, len(nomes)) for nome in unicos),
+                              dtype=np.int32, count=len(unicos))
+        return np.where(codigos >= 0, globais[codigos], -1).astype(np.int32)
+
+    def dataframe(self):
+        """DataFrame com todas as linhas adicionadas (vazio, mas tipado, se não houve nenhuma)"""
+        dados = {}
+        for coluna in self.colunas:
+            partes = self._partes[coluna]
+            if coluna in self._nomes:
+                codigos = np.concatenate(partes) if partes else np.empty(0, dtype=np.int32)
+                dados[coluna] = categorias_ordenadas(codigos, list(self._nomes[coluna]))
+            else:
+                dados[coluna] = np.concatenate(partes) if partes else np.empty(0, dtype=self.tipos[coluna])
+        return pd.DataFrame(dados, columns=self.colunas)
@@ -0,0 +1,159 @@
+"""
+Tabelas de dimensão e codificação por dicionário de municípios, princípios ativos e conselhos
+
+No modo codificado a tabela de fatos (vendas_medicamentos_cod) guarda só
+chaves inteiras pequenas; os nomes ficam nas dimensões e só voltam a aparecer
+na saída do agrupamento. O meuDB só é importado nas funções que usam o banco,
+então as constantes servem também à fonte parquet, que roda sem MySQL.
+"""
+import os
+import sys
+import threading
+
+# Adicionar o diretório atual ao path para importar meuDB
+sys.path.append(os.path.dirname(__file__))
+
+TABELA_VENDAS_CODIFICADA = "trampo.vendas_medicamentos_cod"
+TABELA_MUNICIPIOS = "trampo.municipios_rj"
+TABELA_PRINCIPIOS = "trampo.dim_principio_ativo"
+TABELA_CONSELHOS = "trampo.dim_conselho_prescritor"
+
+COLUNAS_VENDAS_CODIFICADA = (
+    'ANO_VENDA',
+    'MES_VENDA',
+    'ID_PRINCIPIO_ATIVO',
+    'ID_MUNICIPIO',
+    'QTD_VENDIDA',
+    'ID_CONSELHO_PRESCRITOR',
+    'UF_CONSELHO_PRESCRITOR',
+)
+
+INSERT_VENDAS_CODIFICADA = f"""
+    INSERT INTO {TABELA_VENDAS_CODIFICADA}
+    ({', '.join(COLUNAS_VENDAS_CODIFICADA)})
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+INDICES_VENDAS_CODIFICADA = {
+    'idx_groupby_principal': '(ANO_VENDA, MES_VENDA, ID_MUNICIPIO, ID_PRINCIPIO_ATIVO)',
+    'idx_municipio': '(ID_MUNICIPIO)',
+    'idx_principio': '(ID_PRINCIPIO_ATIVO)',
+}
+
+DDL_DIMENSOES = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {TABELA_PRINCIPIOS} (
+        ID mediumint unsigned NOT NULL AUTO_INCREMENT,
+        NOME varchar(255) COLLATE utf8mb4_bin NOT NULL,
+        PRIMARY KEY (ID),
+        UNIQUE KEY uk_nome (NOME)
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {TABELA_CONSELHOS} (
+        ID smallint unsigned NOT NULL AUTO_INCREMENT,
+        NOME varchar(50) COLLATE utf8mb4_bin NOT NULL,
+        PRIMARY KEY (ID),
+        UNIQUE KEY uk_nome (NOME)
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {TABELA_VENDAS_CODIFICADA} (
+        indice_global bigint NOT NULL AUTO_INCREMENT,
+        ANO_VENDA smallint NOT NULL,
+        MES_VENDA tinyint NOT NULL,
+        ID_PRINCIPIO_ATIVO mediumint unsigned NOT NULL,
+        ID_MUNICIPIO smallint unsigned NOT NULL,
+        QTD_VENDIDA int NOT NULL,
+        ID_CONSELHO_PRESCRITOR smallint unsigned NOT NULL,
+        UF_CONSELHO_PRESCRITOR char(2) NOT NULL,
+        PRIMARY KEY (indice_global),
+        KEY idx_groupby_principal {INDICES_VENDAS_CODIFICADA['idx_groupby_principal']},
+        KEY idx_municipio {INDICES_VENDAS_CODIFICADA['idx_municipio']},
+        KEY idx_principio {INDICES_VENDAS_CODIFICADA['idx_principio']}
+    )
+    """,
+]
+
+
+def criar_tabelas_codificadas():
+    """Cria as dimensões e a tabela de fatos codificada, se não existirem"""
+    from meuDB import get_db_cursor
+    with get_db_cursor() as cursor:
+        for ddl in DDL_DIMENSOES:
+            cursor.execute(ddl)
+
+
+class DimensaoCache:
+    """Cache em memória nome -> ID de uma tabela de dimensão (ID, NOME)
+
+    Com `permitir_novos`, nomes desconhecidos são inseridos na dimensão
+    (INSERT IGNORE + releitura, seguro com vários escritores); senão,
+    codificam como None.
+    """
+
+    def __init__(self, tabela, permitir_novos=True):
+        self.tabela = tabela
+        self.permitir_novos = permitir_novos
+        self.ids = {}
+        self._trava = threading.Lock()
+        self.carregar()
+
+    def carregar(self):
+        """Lê a dimensão inteira para o cache"""
+        from meuDB import get_db_cursor
+        with get_db_cursor(dictionary=True) as cursor:
+            cursor.execute(f"SELECT ID, NOME FROM {self.tabela}")
+            ids = {linha['NOME']: linha['ID'] for linha in cursor.fetchall()}
+        with self._trava:
+            self.ids = ids
+
+    def nomes_por_id(self):
+        """Dicionário inverso ID -> nome"""
+        with self._trava:
+            return {id_: nome for nome, id_ in self.ids.items()}
+
+    def codificar(self, nomes):
+        """Retorna a lista de IDs para `nomes` (None para os que não puderem ser codificados)"""
+        with self._trava:
+            faltando = {nome for nome in nomes if nome not in self.ids}
+            if faltando and self.permitir_novos:
+                self._inserir(sorted(faltando))
+            return [self.ids.get(nome) for nome in nomes]
+
+    def _inserir(self, nomes):
+        from meuDB import get_db_cursor
+        with get_db_cursor(dictionary=True) as cursor:
+            cursor.executemany(f"INSERT IGNORE INTO {self.tabela} (NOME) VALUES (%s)",
+                               [(nome,) for nome in nomes])
+            marcadores = ', '.join(['%s'] * len(nomes))
+            cursor.execute(f"SELECT ID, NOME FROM {self.tabela} WHERE NOME IN ({marcadores})", nomes)
+            for linha in cursor.fetchall():
+                self.ids[linha['NOME']] = linha['ID']
+
+
+class CodificadorVendas:
+    """Converte registros de venda (COLUNAS_VENDAS) em registros codificados (COLUNAS_VENDAS_CODIFICADA)
+
+    Municípios vêm de trampo.municipios_rj (somente leitura); princípios
+    ativos e conselhos ganham IDs novos conforme aparecem.
+    """
+
+    def __init__(self):
+        self.municipios = DimensaoCache(TABELA_MUNICIPIOS, permitir_novos=False)
+        self.principios = DimensaoCache(TABELA_PRINCIPIOS)
+        self.conselhos = DimensaoCache(TABELA_CONSELHOS)
+
+    def __call__(self, registros):
+        """Lista alinhada com `registros`; None onde o município não está na dimensão"""
+        if not registros:
+            return []
+        anos, meses, principios, municipios, qtds, conselhos, ufs = zip(*registros)
+        ids_principio = self.principios.codificar(principios)
+        ids_municipio = self.municipios.codificar(municipios)
+        ids_conselho = self.conselhos.codificar(conselhos)
+
+        codificados = []
+        for linha in zip(anos, meses, ids_principio, ids_municipio, qtds, ids_conselho, ufs):
+            codificados.append(None if None in linha else linha)
+        return codificados
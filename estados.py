@@ -0,0 +1,162 @@
+"""
+Vendas de vários estados: tabela com UF_VENDA e municípios válidos por UF
+
+A tabela do RJ (vendas_medicamentos) não muda, então as consultas do RJ
+continuam iguais. As outras UFs vão para vendas_medicamentos_uf, que tem
+UF_VENDA char(2) na frente do índice do GROUP BY: uma consulta por estado
+lê só o trecho do índice daquele estado, e os estados podem ser agrupados
+em paralelo.
+
+Uso:
+    python estados.py --criar
+    python estados.py --importar-municipios municipios_brasil.csv   # colunas UF, MUNICIPIO_VENDA
+"""
+import argparse
+import hashlib
+import os
+import sys
+
+import pandas as pd
+
+# Adicionar o diretório atual ao path para importar meuDB
+sys.path.append(os.path.dirname(__file__))
+
+from normalizacao_vendas import COLUNAS_VENDAS_UF, TAMANHOS_COLUNAS
+from leitura_csv import detectar_formato
+from manifesto_carga import TABELA_MANIFESTO
+
+TABELA_VENDAS_UF = "trampo.vendas_medicamentos_uf"
+TABELA_MUNICIPIOS_UF = "trampo.municipios_uf"
+TABELA_MUNICIPIOS_RJ = "trampo.municipios_rj"
+
+UFS = ('AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB',
+       'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO')
+
+INSERT_VENDAS_UF = f"""
+    INSERT INTO {TABELA_VENDAS_UF}
+    ({', '.join(COLUNAS_VENDAS_UF)})
+    VALUES ({', '.join(['%s'] * len(COLUNAS_VENDAS_UF))})
+"""
+
+INDICES_VENDAS_UF = {
+    'idx_groupby_principal': '(UF_VENDA, ANO_VENDA, MES_VENDA, MUNICIPIO_VENDA, PRINCIPIO_ATIVO)',
+    'idx_municipio': '(MUNICIPIO_VENDA)',
+    'idx_principio': '(PRINCIPIO_ATIVO)',
+}
+
+DDL_ESTADOS = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {TABELA_VENDAS_UF} (
+        indice_global bigint NOT NULL AUTO_INCREMENT,
+        UF_VENDA char(2) NOT NULL,
+        ANO_VENDA int NOT NULL,
+        MES_VENDA int NOT NULL,
+        PRINCIPIO_ATIVO varchar({TAMANHOS_COLUNAS['PRINCIPIO_ATIVO']}) DEFAULT NULL,
+        MUNICIPIO_VENDA varchar({TAMANHOS_COLUNAS['MUNICIPIO_VENDA']}) DEFAULT NULL,
+        QTD_VENDIDA int DEFAULT NULL,
+        CONSELHO_PRESCRITOR varchar({TAMANHOS_COLUNAS['CONSELHO_PRESCRITOR']}) DEFAULT NULL,
+        UF_CONSELHO_PRESCRITOR varchar({TAMANHOS_COLUNAS['UF_CONSELHO_PRESCRITOR']}) DEFAULT NULL,
+        PRIMARY KEY (indice_global),
+        KEY idx_groupby_principal {INDICES_VENDAS_UF['idx_groupby_principal']},
+        KEY idx_municipio {INDICES_VENDAS_UF['idx_municipio']},
+        KEY idx_principio {INDICES_VENDAS_UF['idx_principio']}
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {TABELA_MUNICIPIOS_UF} (
+        UF char(2) NOT NULL,
+        NOME varchar({TAMANHOS_COLUNAS['MUNICIPIO_VENDA']}) NOT NULL,
+        PRIMARY KEY (UF, NOME)
+    )
+    """,
+]
+
+
+def normalizar_ufs(ufs):
+    """Lista de UFs em maiúsculas, sem repetição, validadas contra UFS"""
+    if isinstance(ufs, str):
+        ufs = [ufs]
+    normalizadas = list(dict.fromkeys(uf.strip().upper() for uf in ufs))
+    invalidas = [uf for uf in normalizadas if uf not in UFS]
+    if invalidas or not normalizadas:
+        raise ValueError(f"UFs inválidas: {invalidas} (opções: {', '.join(UFS)})")
+    return normalizadas
+
+
+def tabela_manifesto(ufs):
+    """Manifesto de carga de um conjunto de UFs (cada conjunto carregado tem o seu)"""
+    ufs = sorted(normalizar_ufs(ufs))
+    if ufs == sorted(UFS):
+        sufixo = "brasil"
+    elif len(ufs) <= 8:
+        sufixo = "_".join(ufs).lower()
+    else:
+        sufixo = hashlib.sha1("_".join(ufs).encode('ascii')).hexdigest()[:12]
+    return f"{TABELA_MANIFESTO}_uf_{sufixo}"
+
+
+def criar_tabelas_estados():
+    """Cria a tabela de vendas por UF e a de municípios por UF, se não existirem"""
+    from meuDB import get_db_cursor
+    with get_db_cursor() as cursor:
+        for ddl in DDL_ESTADOS:
+            cursor.execute(ddl)
+
+
+def municipios_por_uf(ufs):
+    """{uf: frozenset de nomes} com os municípios válidos de cada UF
+
+    Lidos de municipios_uf; o RJ, se não estiver lá, vem de municipios_rj.
+    UFs sem nenhum município cadastrado geram erro (todas as linhas seriam
+    rejeitadas).
+    """
+    from meuDB import get_db_cursor
+    ufs = normalizar_ufs(ufs)
+    conjuntos = {uf: set() for uf in ufs}
+    marcadores = ', '.join(['%s'] * len(ufs))
+    with get_db_cursor(dictionary=True) as cursor:
+        cursor.execute(f"SELECT UF, NOME FROM {TABELA_MUNICIPIOS_UF} WHERE UF IN ({marcadores})", ufs)
+        for linha in cursor.fetchall():
+            conjuntos[linha['UF']].add(linha['NOME'].strip().upper())
+        if 'RJ' in conjuntos and not conjuntos['RJ']:
+            cursor.execute(f"SELECT NOME FROM {TABELA_MUNICIPIOS_RJ}")
+            conjuntos['RJ'] = {linha['NOME'].strip().upper() for linha in cursor.fetchall()}
+
+    sem_municipios = [uf for uf, nomes in conjuntos.items() if not nomes]
+    if sem_municipios:
+        raise ValueError(f"Sem municípios cadastrados para {', '.join(sem_municipios)} "
+                         f"(use: python estados.py --importar-municipios arquivo.csv)")
+    return {uf: frozenset(nomes) for uf, nomes in conjuntos.items()}
+
+
+def importar_municipios(caminho_csv):
+    """Carrega municipios_uf a partir de um CSV com as colunas UF e MUNICIPIO_VENDA"""
+    from meuDB import get_db_cursor
+    config = detectar_formato(caminho_csv) or {'sep': ';', 'encoding': 'latin-1'}
+    df = pd.read_csv(caminho_csv, sep=config['sep'], encoding=config['encoding'],
+                     usecols=['UF', 'MUNICIPIO_VENDA'], dtype=str).dropna()
+    linhas = sorted({(uf.strip().upper(), nome.strip().upper()[:TAMANHOS_COLUNAS['MUNICIPIO_VENDA']])
+                     for uf, nome in zip(df['UF'], df['MUNICIPIO_VENDA'])})
+    with get_db_cursor() as cursor:
+        cursor.executemany(f"INSERT IGNORE INTO {TABELA_MUNICIPIOS_UF} (UF, NOME) VALUES (%s, %s)", linhas)
+    print(f"✅ {len(linhas):,} municípios de {len({uf for uf, _ in linhas})} UFs em {TABELA_MUNICIPIOS_UF}")
+    return len(linhas)
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Tabelas de vendas e municípios por UF")
+    parser.add_argument("--criar", action="store_true", help="cria as tabelas se não existirem")
+    parser.add_argument("--importar-municipios", metavar="CSV", default=None,
+                        help="carrega municipios_uf de um CSV com as colunas UF e MUNICIPIO_VENDA")
+    args = parser.parse_args()
+
+    if args.criar or args.importar_municipios:
+        criar_tabelas_estados()
+        print(f"✅ Tabelas {TABELA_VENDAS_UF} e {TABELA_MUNICIPIOS_UF} prontas")
+    if args.importar_municipios:
+        importar_municipios(args.importar_municipios)
+
+
+if __name__ == "__main__":
+    main()
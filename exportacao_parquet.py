@@ -0,0 +1,243 @@
+"""
+Exporta o detalhe RJ e a tabela agregada para Parquet particionado por ANO_VENDA/MES_VENDA
+
+Os arquivos seguem o layout hive (ANO_VENDA=2016/MES_VENDA=1/parte.parquet),
+com as colunas de texto codificadas por dicionário. Com eles o agrupamento
+roda num notebook, sem o MySQL (`--fonte parquet`, via DuckDB).
+
+Uso:
+    python exportacao_parquet.py                       # detalhe e agregada, todos os meses
+    python exportacao_parquet.py --conjuntos agregada --ano 2016
+    python exportacao_parquet.py --origem-detalhe codificada
+
+Requer pyarrow (e duckdb para consultar os arquivos). O meuDB só é importado
+na exportação, então quem só consulta os arquivos não precisa dele.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+# Adicionar o diretório atual ao path para importar meuDB
+sys.path.append(os.path.dirname(__file__))
+
+DIRETORIO_PARQUET = "dados_parquet"
+CONJUNTOS = ('detalhe', 'agregada')
+ORIGENS_DETALHE = ('detalhe', 'codificada')
+TAMANHO_FETCH = 100_000
+
+# Colunas gravadas em cada conjunto (ANO_VENDA/MES_VENDA ficam no caminho da partição)
+COLUNAS_TEXTO = {
+    'detalhe': ('PRINCIPIO_ATIVO', 'MUNICIPIO_VENDA', 'CONSELHO_PRESCRITOR', 'UF_CONSELHO_PRESCRITOR'),
+    'agregada': ('MUNICIPIO_VENDA', 'PRINCIPIO_ATIVO'),
+}
+COLUNAS_INTEIRAS = {
+    'detalhe': ('QTD_VENDIDA',),
+    'agregada': ('TOTAL_VENDIDO', 'TOTAL_REGISTROS'),
+}
+
+CONSULTAS = {
+    'detalhe': """
+        SELECT PRINCIPIO_ATIVO, MUNICIPIO_VENDA, QTD_VENDIDA, CONSELHO_PRESCRITOR, UF_CONSELHO_PRESCRITOR
+        FROM trampo.vendas_medicamentos
+        WHERE ANO_VENDA = %s AND MES_VENDA = %s
+    """,
+    # tabelas de dimensoes.py, preenchidas em _consulta
+    'codificada': """
+        SELECT p.NOME AS PRINCIPIO_ATIVO, m.NOME AS MUNICIPIO_VENDA, v.QTD_VENDIDA,
+               c.NOME AS CONSELHO_PRESCRITOR, v.UF_CONSELHO_PRESCRITOR
+        FROM {vendas} v
+        JOIN {principios} p ON p.ID = v.ID_PRINCIPIO_ATIVO
+        JOIN {municipios} m ON m.ID = v.ID_MUNICIPIO
+        JOIN {conselhos} c ON c.ID = v.ID_CONSELHO_PRESCRITOR
+        WHERE v.ANO_VENDA = %s AND v.MES_VENDA = %s
+    """,
+    'agregada': """
+        SELECT MUNICIPIO_VENDA, PRINCIPIO_ATIVO, TOTAL_VENDIDO, TOTAL_REGISTROS
+        FROM trampo.vendas_agregadas
+        WHERE ANO_VENDA = %s AND MES_VENDA = %s
+    """,
+}
+
+TABELAS_MESES = {
+    'detalhe': "trampo.vendas_medicamentos",
+    'codificada': None,  # dimensoes.TABELA_VENDAS_CODIFICADA
+    'agregada': "trampo.vendas_agregadas",
+}
+
+
+def _importar_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("pyarrow não instalado: pip install pyarrow") from None
+    return pa, pq
+
+
+def _consulta(origem):
+    """(consulta de um mês, tabela com os meses) de uma origem
+
+    dimensoes importa o meuDB, então só é importado aqui, para a origem codificada.
+    """
+    if origem != 'codificada':
+        return CONSULTAS[origem], TABELAS_MESES[origem]
+    from dimensoes import TABELA_VENDAS_CODIFICADA, TABELA_MUNICIPIOS, TABELA_PRINCIPIOS, TABELA_CONSELHOS
+    consulta = CONSULTAS[origem].format(vendas=TABELA_VENDAS_CODIFICADA, principios=TABELA_PRINCIPIOS,
+                                        municipios=TABELA_MUNICIPIOS, conselhos=TABELA_CONSELHOS)
+    return consulta, TABELA_VENDAS_CODIFICADA
+
+
+def caminho_conjunto(diretorio, conjunto):
+    """Diretório raiz de um conjunto exportado"""
+    return os.path.join(diretorio, conjunto)
+
+
+def padrao_arquivos(diretorio, conjunto):
+    """Glob com todos os arquivos Parquet de um conjunto (para read_parquet do DuckDB)"""
+    return os.path.join(caminho_conjunto(diretorio, conjunto), '**', '*.parquet').replace('\\', '/')
+
+
+class ExportadorParquet:
+    """Exporta os conjuntos do MySQL para Parquet, um arquivo por (ano, mês)"""
+
+    def __init__(self, diretorio=DIRETORIO_PARQUET, origem_detalhe='detalhe', tamanho_fetch=TAMANHO_FETCH):
+        if origem_detalhe not in ORIGENS_DETALHE:
+            raise ValueError(f"Origem inválida: {origem_detalhe} (opções: {', '.join(ORIGENS_DETALHE)})")
+        self.diretorio = diretorio
+        self.origem_detalhe = origem_detalhe  # 'codificada' lê vendas_medicamentos_cod + dimensões
+        self.tamanho_fetch = tamanho_fetch
+
+    def _origem(self, conjunto):
+        return self.origem_detalhe if conjunto == 'detalhe' else conjunto
+
+    def obter_meses(self, conjunto, ano=None, mes=None):
+        """Lista de (ano, mes) presentes na tabela de origem do conjunto"""
+        filtros, parametros = [], []
+        if ano is not None:
+            filtros.append("ANO_VENDA = %s")
+            parametros.append(ano)
+        if mes is not None:
+            filtros.append("MES_VENDA = %s")
+            parametros.append(mes)
+        where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+
+        from meuDB import get_db_cursor
+        _, tabela = _consulta(self._origem(conjunto))
+        with get_db_cursor(dictionary=True) as cursor:
+            cursor.execute(f"""
+                SELECT ANO_VENDA, MES_VENDA
+                FROM {tabela}
+                {where}
+                GROUP BY ANO_VENDA, MES_VENDA
+                ORDER BY ANO_VENDA, MES_VENDA
+            """, tuple(parametros))
+            return [(linha['ANO_VENDA'], linha['MES_VENDA']) for linha in cursor.fetchall()]
+
+    def _esquema(self, pa, conjunto):
+        campos = [pa.field(coluna, pa.dictionary(pa.int32(), pa.string())) for coluna in COLUNAS_TEXTO[conjunto]]
+        campos += [pa.field(coluna, pa.int64()) for coluna in COLUNAS_INTEIRAS[conjunto]]
+        return pa.schema(campos)
+
+    def _tabela_arrow(self, pa, esquema, nomes, lote):
+        """Tabela Arrow de um lote de tuplas (colunas na ordem de `nomes`), transposto com zip"""
+        valores = dict(zip(nomes, zip(*lote)))
+        colunas = []
+        for campo in esquema:
+            if pa.types.is_dictionary(campo.type):
+                colunas.append(pa.array(valores[campo.name], type=pa.string()).dictionary_encode())
+            else:
+                colunas.append(pa.array(valores[campo.name], type=campo.type))
+        return pa.Table.from_arrays(colunas, schema=esquema)
+
+    def exportar_mes(self, conjunto, ano, mes):
+        """Regrava a partição (ano, mês) de um conjunto; retorna o número de linhas
+
+        Grava num .tmp ao lado e só troca pelo arquivo final no fim; se algo
+        falhar no meio, o .tmp é apagado e a partição antiga fica como estava.
+        """
+        from meuDB import get_db_cursor
+        pa, pq = _importar_pyarrow()
+        consulta, _ = _consulta(self._origem(conjunto))
+        esquema = self._esquema(pa, conjunto)
+        destino = os.path.join(caminho_conjunto(self.diretorio, conjunto),
+                               f"ANO_VENDA={ano}", f"MES_VENDA={mes}")
+        os.makedirs(destino, exist_ok=True)
+        arquivo_final = os.path.join(destino, "parte-0.parquet")
+        arquivo_temporario = arquivo_final + ".tmp"
+
+        linhas = 0
+        try:
+            with get_db_cursor(dictionary=False) as cursor, \
+                    pq.ParquetWriter(arquivo_temporario, esquema, use_dictionary=True,
+                                     compression='zstd') as escritor:
+                cursor.execute(consulta, (ano, mes))
+                nomes = [coluna[0] for coluna in cursor.description]
+                while True:
+                    lote = cursor.fetchmany(self.tamanho_fetch)
+                    if not lote:
+                        break
+                    escritor.write_table(self._tabela_arrow(pa, esquema, nomes, lote))
+                    linhas += len(lote)
+        except BaseException:
+            if os.path.exists(arquivo_temporario):
+                os.remove(arquivo_temporario)
+            raise
+
+        # Troca atômica: quem estiver lendo vê a partição antiga ou a nova, nunca pela metade
+        for antigo in glob.glob(os.path.join(destino, "*.parquet")):
+            if antigo != arquivo_final:
+                os.remove(antigo)
+        os.replace(arquivo_temporario, arquivo_final)
+        return linhas
+
+    def exportar(self, conjuntos=CONJUNTOS, ano=None, mes=None):
+        """Exporta os conjuntos pedidos, mês a mês"""
+        print(f"\n📦 EXPORTANDO PARQUET PARA {self.diretorio}")
+        print("=" * 60)
+        inicio_total = time.time()
+        resultado = {"status": "success", "diretorio": self.diretorio, "conjuntos": {}}
+
+        for conjunto in conjuntos:
+            meses = self.obter_meses(conjunto, ano, mes)
+            total = 0
+            inicio = time.time()
+            for ano_venda, mes_venda in meses:
+                try:
+                    linhas = self.exportar_mes(conjunto, ano_venda, mes_venda)
+                except Exception as e:
+                    print(f"❌ {conjunto} {ano_venda}/{mes_venda:02d}: {e}")
+                    resultado["status"] = "error"
+                    continue
+                total += linhas
+                print(f"   ✅ {conjunto} {ano_venda}/{mes_venda:02d}: {linhas:,} linhas")
+            resultado["conjuntos"][conjunto] = {"meses": len(meses), "linhas": total,
+                                                "tempo_s": round(time.time() - inicio, 3)}
+            print(f"📊 {conjunto}: {total:,} linhas em {len(meses)} partições")
+
+        resultado["tempo_total_s"] = round(time.time() - inicio_total, 3)
+        print(f"⏱️  Tempo total: {resultado['tempo_total_s']:.1f}s")
+        return resultado
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Exporta vendas para Parquet particionado por ano/mês")
+    parser.add_argument("--diretorio", default=DIRETORIO_PARQUET,
+                        help=f"diretório de saída (padrão: {DIRETORIO_PARQUET})")
+    parser.add_argument("--conjuntos", nargs="+", choices=CONJUNTOS, default=list(CONJUNTOS),
+                        help="o que exportar (padrão: detalhe e agregada)")
+    parser.add_argument("--origem-detalhe", choices=ORIGENS_DETALHE, default='detalhe',
+                        help="detalhe = vendas_medicamentos; codificada = vendas_medicamentos_cod")
+    parser.add_argument("--ano", type=int, default=None, help="exporta só este ano")
+    parser.add_argument("--mes", type=int, default=None, help="exporta só este mês")
+    args = parser.parse_args()
+
+    exportador = ExportadorParquet(diretorio=args.diretorio, origem_detalhe=args.origem_detalhe)
+    resultado = exportador.exportar(conjuntos=args.conjuntos, ano=args.ano, mes=args.mes)
+    sys.exit(0 if resultado["status"] == "success" else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Gerador determinístico de arquivos EDA_Industrializados sintéticos (para benchmark e testes manuais)
+
+Os arquivos têm o mesmo layout de colunas dos arquivos do lago de dados
+(mais colunas do que as usadas na carga), encoding latin-1 e o delimitador
+escolhido. A mesma semente gera sempre os mesmos bytes, então dois
+benchmarks com os mesmos parâmetros leem exatamente os mesmos dados.
+
+Uso:
+    python gerador_sintetico.py --diretorio dados_sinteticos --linhas 500000 --proporcao-rj 0.1
+    python gerador_sintetico.py --diretorio dados_sinteticos --meses 12 --delimitador tab
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from leitura_csv import ENCODING_PADRAO
+
+# Layout dos arquivos EDA_Industrializados (a carga usa só COLUNAS_NECESSARIAS)
+COLUNAS_ARQUIVO = [
+    'ANO_VENDA',
+    'MES_VENDA',
+    'UF_VENDA',
+    'MUNICIPIO_VENDA',
+    'PRINCIPIO_ATIVO',
+    'DESCRICAO_APRESENTACAO',
+    'QTD_VENDIDA',
+    'UNIDADE_MEDIDA',
+    'CONSELHO_PRESCRITOR',
+    'UF_CONSELHO_PRESCRITOR',
+    'TIPO_RECEITUARIO',
+    'CID10',
+    'SEXO',
+    'IDADE',
+    'UNIDADE_IDADE',
+]
+
+# Nome na linha de comando -> caractere
+DELIMITADORES_GERADOR = {'ponto-e-virgula': ';', 'virgula': ',', 'tab': '\t', 'pipe': '|'}
+
+MUNICIPIOS_RJ = [
+    'RIO DE JANEIRO', 'SÃO GONÇALO', 'DUQUE DE CAXIAS', 'NOVA IGUAÇU', 'NITERÓI', 'BELFORD ROXO',
+    'CAMPOS DOS GOYTACAZES', 'SÃO JOÃO DE MERITI', 'PETRÓPOLIS', 'VOLTA REDONDA', 'MAGÉ', 'MACAÉ',
+    'ITABORAÍ', 'CABO FRIO', 'MARICÁ', 'NOVA FRIBURGO', 'BARRA MANSA', 'ANGRA DOS REIS',
+    'MESQUITA', 'TERESÓPOLIS', 'RIO DAS OSTRAS', 'NILÓPOLIS', 'QUEIMADOS', 'ARARUAMA', 'RESENDE',
+    'ITAGUAÍ', 'SÃO PEDRO DA ALDEIA', 'ITAPERUNA', 'JAPERI', 'BARRA DO PIRAÍ', 'SAQUAREMA',
+    'SEROPÉDICA', 'TRÊS RIOS', 'VALENÇA', 'RIO BONITO', 'GUAPIMIRIM', 'CACHOEIRAS DE MACACU',
+    'PARATY', 'PARACAMBI', 'SANTO ANTÔNIO DE PÁDUA',
+]
+
+# Outras UFs (o município não importa: as linhas são filtradas pela UF antes da validação)
+OUTRAS_UFS = ['SP', 'MG', 'ES', 'BA', 'PR', 'RS', 'SC', 'GO', 'PE', 'CE', 'DF', 'PA']
+MUNICIPIOS_OUTRAS_UFS = ['SÃO PAULO', 'BELO HORIZONTE', 'VITÓRIA', 'SALVADOR', 'CURITIBA', 'PORTO ALEGRE',
+                         'FLORIANÓPOLIS', 'GOIÂNIA', 'RECIFE', 'FORTALEZA', 'BRASÍLIA', 'BELÉM']
+
+PRINCIPIOS_ATIVOS = [
+    'CLONAZEPAM', 'ALPRAZOLAM', 'AMOXICILINA', 'AZITROMICINA', 'CEFALEXINA', 'CIPROFLOXACINO',
+    'DIAZEPAM', 'ZOLPIDEM', 'FLUOXETINA', 'SERTRALINA', 'ESCITALOPRAM', 'BUPROPIONA',
+    'METILFENIDATO', 'QUETIAPINA', 'RISPERIDONA', 'TRAMADOL', 'CODEÍNA + PARACETAMOL',
+    'SIBUTRAMINA', 'ISOTRETINOÍNA', 'LEVOFLOXACINO', 'AMOXICILINA + CLAVULANATO DE POTÁSSIO',
+    'NITROFURANTOÍNA', 'AMITRIPTILINA', 'CARBAMAZEPINA', 'FENOBARBITAL', 'LORAZEPAM',
+    'BROMAZEPAM', 'PAROXETINA', 'VENLAFAXINA', 'TOPIRAMATO',
+]
+CONSELHOS = ['CRM', 'CRO', 'CRMV', 'COREN']
+UFS_CONSELHO = ['RJ', 'SP', 'MG', 'ES', 'BA']
+RECEITUARIOS = ['1', '2', '3', '4', '5']
+UNIDADES = ['CAIXA', 'FRASCO']
+
+# Parte das linhas do RJ com problemas que a normalização precisa tratar
+PROPORCAO_MUNICIPIO_INVALIDO = 0.01
+PROPORCAO_QTD_AUSENTE = 0.005
+PROPORCAO_QTD_DECIMAL = 0.02
+
+
+def nome_arquivo(ano, mes):
+    """EDA_Industrializados_AAAAMM.csv"""
+    return f"EDA_Industrializados_{ano}{mes:02d}.csv"
+
+
+def meses_a_partir(ano, mes, quantidade):
+    """Lista de (ano, mês) consecutivos a partir de (ano, mês)"""
+    inicio = ano * 12 + mes - 1
+    return [(indice // 12, indice % 12 + 1) for indice in range(inicio, inicio + quantidade)]
+
+
+def gerar_dataframe(ano, mes, linhas, proporcao_rj=0.1, semente=0):
+    """DataFrame de um mês com `linhas` linhas, ~`proporcao_rj` delas do RJ
+
+    Cada (semente, ano, mês) tem seu próprio gerador, então um mês sai igual
+    qualquer que seja a quantidade de meses gerada junto com ele.
+    """
+    aleatorio = np.random.default_rng([semente, ano, mes])
+    eh_rj = aleatorio.random(linhas) < proporcao_rj
+
+    indice_outras = aleatorio.integers(0, len(OUTRAS_UFS), linhas)
+    uf = np.where(eh_rj, 'RJ', np.array(OUTRAS_UFS)[indice_outras])
+
+    # Distribuição concentrada nos primeiros municípios/princípios, como nos dados reais
+    indice_municipio = (aleatorio.zipf(1.6, linhas) - 1) % len(MUNICIPIOS_RJ)
+    municipio = np.where(eh_rj, np.array(MUNICIPIOS_RJ, dtype=object)[indice_municipio],
+                         np.array(MUNICIPIOS_OUTRAS_UFS, dtype=object)[indice_outras])
+    invalido = eh_rj & (aleatorio.random(linhas) < PROPORCAO_MUNICIPIO_INVALIDO)
+    municipio = np.where(invalido, 'MUNICIPIO INEXISTENTE', municipio)
+    # Espaços e minúsculas: a normalização faz strip + upper
+    sujo = aleatorio.random(linhas) < 0.05
+    municipio = np.where(sujo, np.char.add(' ', np.char.lower(municipio.astype(str))), municipio)
+
+    indice_principio = (aleatorio.zipf(1.3, linhas) - 1) % len(PRINCIPIOS_ATIVOS)
+    principio = np.array(PRINCIPIOS_ATIVOS, dtype=object)[indice_principio]
+
+    quantidade = aleatorio.integers(1, 30, linhas).astype(object)
+    decimal = aleatorio.random(linhas) < PROPORCAO_QTD_DECIMAL
+    quantidade[decimal] = [f"{valor},5" for valor in quantidade[decimal]]
+    quantidade[aleatorio.random(linhas) < PROPORCAO_QTD_AUSENTE] = None
+
+    return pd.DataFrame({
+        'ANO_VENDA': np.full(linhas, ano),
+        'MES_VENDA': np.full(linhas, mes),
+        'UF_VENDA': uf,
+        'MUNICIPIO_VENDA': municipio,
+        'PRINCIPIO_ATIVO': principio,
+        'DESCRICAO_APRESENTACAO': np.char.add(principio.astype(str), ' 10 MG COM CT BL AL PLAS TRANS X 30'),
+        'QTD_VENDIDA': quantidade,
+        'UNIDADE_MEDIDA': np.array(UNIDADES)[aleatorio.integers(0, len(UNIDADES), linhas)],
+        'CONSELHO_PRESCRITOR': np.array(CONSELHOS)[aleatorio.integers(0, len(CONSELHOS), linhas)],
+        'UF_CONSELHO_PRESCRITOR': np.array(UFS_CONSELHO)[aleatorio.integers(0, len(UFS_CONSELHO), linhas)],
+        'TIPO_RECEITUARIO': np.array(RECEITUARIOS)[aleatorio.integers(0, len(RECEITUARIOS), linhas)],
+        'CID10': '',
+        'SEXO': aleatorio.integers(1, 3, linhas),
+        'IDADE': aleatorio.integers(1, 95, linhas),
+        'UNIDADE_IDADE': 1,
+    }, columns=COLUNAS_ARQUIVO)
+
+
+def gerar_arquivo(diretorio, ano, mes, linhas, proporcao_rj=0.1, sep=';', semente=0):
+    """Grava o arquivo do mês em `diretorio` e retorna {caminho, arquivo, ano, mes, linhas, linhas_rj, bytes}"""
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, nome_arquivo(ano, mes))
+    df = gerar_dataframe(ano, mes, linhas, proporcao_rj, semente)
+    df.to_csv(caminho, sep=sep, index=False, encoding=ENCODING_PADRAO)
+    return {'caminho': caminho, 'arquivo': os.path.basename(caminho), 'ano': ano, 'mes': mes,
+            'linhas': linhas, 'linhas_rj': int((df['UF_VENDA'] == 'RJ').sum()),
+            'bytes': os.path.getsize(caminho)}
+
+
+def gerar_municipios_rj(caminho, sep=';'):
+    """Grava o CSV de municípios do RJ (colunas id e MUNICIPIO_VENDA, como o de inserir_municipios_do_rj)"""
+    pd.DataFrame({'id': range(1, len(MUNICIPIOS_RJ) + 1), 'MUNICIPIO_VENDA': MUNICIPIOS_RJ}).to_csv(
+        caminho, sep=sep, index=False, encoding=ENCODING_PADRAO)
+    return caminho
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Gera arquivos EDA_Industrializados sintéticos")
+    parser.add_argument("--diretorio", default="dados_sinteticos", help="onde gravar os arquivos")
+    parser.add_argument("--linhas", type=int, default=200_000, help="linhas por arquivo (padrão: 200000)")
+    parser.add_argument("--proporcao-rj", type=float, default=0.1,
+                        help="fração aproximada de linhas do RJ (padrão: 0.1)")
+    parser.add_argument("--delimitador", choices=DELIMITADORES_GERADOR, default='ponto-e-virgula')
+    parser.add_argument("--ano", type=int, default=2016, help="ano do primeiro arquivo (padrão: 2016)")
+    parser.add_argument("--mes", type=int, default=1, help="mês do primeiro arquivo (padrão: 1)")
+    parser.add_argument("--meses", type=int, default=1, help="quantidade de arquivos mensais (padrão: 1)")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    sep = DELIMITADORES_GERADOR[args.delimitador]
+    for ano, mes in meses_a_partir(args.ano, args.mes, args.meses):
+        inicio = time.time()
+        gerado = gerar_arquivo(args.diretorio, ano, mes, args.linhas, args.proporcao_rj, sep, args.semente)
+        print(f"✅ {gerado['arquivo']}: {gerado['linhas']:,} linhas ({gerado['linhas_rj']:,} RJ), "
+              f"{gerado['bytes'] / (1024 * 1024):.1f} MB em {time.time() - inicio:.1f}s")
+    caminho_municipios = gerar_municipios_rj(os.path.join(args.diretorio, 'municipios_rj.csv'))
+    print(f"🏙️ Municípios do RJ em: {caminho_municipios}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""
+Ingestão paralela de todos os arquivos EDA_Industrializados_YYYYMM.csv do lago de dados
+
+Os arquivos são lidos, filtrados e normalizados num pool de processos (um por
+núcleo). Os lotes normalizados passam por uma fila limitada até as threads
+escritoras, que gravam no MySQL; quando a fila enche, os leitores esperam.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+
+# Adicionar o diretório atual ao path para importar módulos
+sys.path.append(os.path.dirname(__file__))
+
+from meuDB import get_db_cursor
+from etl_vendas_medicamentos import EtlVendaMedicamento
+from insercao_em_lote import BACKENDS, INSERT_VENDAS, TAMANHO_LOTE_PADRAO, criar_gravador
+from normalizacao_vendas import normalizar_bloco, para_registros, formatar_rejeicoes
+from leitura_csv import DIRETORIO_LAGO, descobrir_arquivos, detectar_formato, ler_em_blocos
+from vendas_agregadas import VendasAgregadas
+from dimensoes import TABELA_VENDAS_CODIFICADA, criar_tabelas_codificadas
+from particionamento import GerenciadorParticoes
+from estados import (TABELA_VENDAS_UF, criar_tabelas_estados, municipios_por_uf, normalizar_ufs,
+                     tabela_manifesto)
+from manifesto_carga import (ManifestoCarga, STATUS_CONCLUIDO, TABELA_MANIFESTO, arquivo_inalterado,
+                             calcular_checksum, pular_registros)
+
+FIM_DA_FILA = None  # sentinela que encerra uma thread escritora
+
+
+def processar_arquivo(info, municipios_validos, fila, tamanho_bloco, tamanho_lote, uf='RJ',
+                      tabela_manifesto=TABELA_MANIFESTO):
+    """Lê, filtra e normaliza um arquivo (executa num processo do pool)
+
+    Os registros normalizados são enviados para `fila` em lotes de
+    `tamanho_lote`, cada um com o comando que avança o manifesto no mesmo
+    commit. Ano e mês vêm do nome do arquivo, o formato de leitura já vem
+    detectado em `info['config']` e `info['offset']` diz quantos registros
+    normalizados já foram gravados numa carga anterior. Com uma lista de UFs
+    em `uf`, `municipios_validos` é um dict {uf: nomes}.
+    """
+    inicio = time.time()
+    resultado = {
+        "status": "success",
+        "arquivo": info['arquivo'],
+        "ano": info['ano'],
+        "mes": info['mes'],
+        "linhas_lidas": 0,
+        "registros_uf": 0,
+        "registros_enviados": 0,
+        "registros_pulados": info['offset'],
+        "rejeicoes": {},
+    }
+
+    manifesto = ManifestoCarga(tabela_manifesto)
+    checksum = calcular_checksum(info['caminho'])
+    if info.get('checksum_manifesto') and info['checksum_manifesto'] != checksum:
+        resultado["status"] = "error"
+        resultado["message"] = "Arquivo alterado desde a carga parcial (use --recarregar)"
+        return resultado
+    manifesto.registrar_inicio(info['arquivo'], info['caminho'], info['ano'], info['mes'], checksum)
+
+    posicao = 0  # índice do próximo registro na sequência normalizada do arquivo
+    for bloco_uf, linhas_lidas in ler_em_blocos(info['caminho'], info['config'], tamanho_bloco, uf):
+        resultado["linhas_lidas"] += linhas_lidas
+        resultado["registros_uf"] += len(bloco_uf)
+        if len(bloco_uf) == 0:
+            continue
+
+        df_normalizado = normalizar_bloco(bloco_uf, info['ano'], info['mes'],
+                                          municipios_validos, resultado["rejeicoes"])
+        registros, posicao = pular_registros(para_registros(df_normalizado), posicao, info['offset'])
+        for i in range(0, len(registros), tamanho_lote):
+            lote = registros[i:i + tamanho_lote]
+            posicao += len(lote)
+            # bloqueia enquanto a fila estiver cheia
+            fila.put((lote, [manifesto.comando_progresso(info['arquivo'], posicao)]))
+            resultado["registros_enviados"] += len(lote)
+
+    total = max(posicao, info['offset'])
+    fila.put(([], [manifesto.comando_conclusao(info['arquivo'], total)]))
+
+    resultado["tempo_s"] = round(time.time() - inicio, 3)
+    return resultado
+
+
+class IngestaoParalela:
+    """Carrega todos os meses do diretório em paralelo"""
+
+    def __init__(self, diretorio=DIRETORIO_LAGO, processos=None, escritores=2,
+                 tamanho_bloco=200_000, tamanho_lote=TAMANHO_LOTE_PADRAO, tamanho_fila=None,
+                 backend='insert', recriar_indices=False, uf='RJ', recarregar=False, codificado=False,
+                 ufs=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend inválido: {backend} (opções: {', '.join(BACKENDS)})")
+        if ufs is not None and codificado:
+            raise ValueError("O modo codificado não suporta vários estados")
+
+        self.etl = EtlVendaMedicamento()
+        self.diretorio = diretorio
+        self.processos = processos or os.cpu_count() or 1
+        # LOAD DATA (e a recriação de índices) roda uma vez só, num único escritor
+        self.escritores = 1 if backend == 'load-data' else max(1, escritores)
+        self.tamanho_bloco = tamanho_bloco
+        self.tamanho_lote = tamanho_lote
+        self.tamanho_fila = tamanho_fila or self.processos * 2  # lotes em trânsito
+        self.backend = backend
+        self.recriar_indices = recriar_indices
+        self.uf = uf
+        self.recarregar = recarregar  # apaga e recarrega os meses mesmo se já concluídos
+        # Modo codificado: grava em vendas_medicamentos_cod (chaves das dimensões), com manifesto próprio
+        self.codificado = codificado
+        self.tabela = TABELA_VENDAS_CODIFICADA if codificado else "trampo.vendas_medicamentos"
+        self.manifesto = ManifestoCarga(TABELA_MANIFESTO + "_cod" if codificado else TABELA_MANIFESTO)
+        # Vários estados: grava em vendas_medicamentos_uf, com um manifesto por conjunto de UFs
+        self.ufs = normalizar_ufs(ufs) if ufs is not None else None
+        if self.ufs is not None:
+            self.uf = self.ufs
+            self.tabela = TABELA_VENDAS_UF
+            self.manifesto = ManifestoCarga(tabela_manifesto(self.ufs))
+        self.agregadas = VendasAgregadas()
+        self.particoes = GerenciadorParticoes(self.tabela)
+        self.estatisticas_escritores = []
+        self.erros_escrita = []
+
+    def limpar_mes(self, ano, mes):
+        """Remove os registros existentes de um (ano, mês), no detalhe e na agregada
+        
+        Com a tabela particionada por mês é um TRUNCATE da partição. Com
+        vários estados, apaga só as UFs desta carga (a agregada é só do RJ).
+        """
+        with get_db_cursor() as cursor:
+            if self.ufs is not None:
+                # Só as UFs desta carga; os outros estados do mês ficam
+                cursor.execute(f"""
+                    DELETE FROM {self.tabela}
+                    WHERE UF_VENDA IN ({', '.join(['%s'] * len(self.ufs))}) AND ANO_VENDA = %s AND MES_VENDA = %s
+                """, (*self.ufs, ano, mes))
+                return cursor.rowcount
+            # Agregada antes do TRUNCATE PARTITION, que faz commit implícito (ver particionamento.limpar_mes)
+            self.agregadas.limpar_mes(cursor, ano, mes)
+            return self.particoes.limpar_mes(cursor, ano, mes)
+
+    def obter_meses_carregados(self):
+        """Conjunto de (ano, mes) que já têm registros na tabela"""
+        filtro, parametros = "", ()
+        if self.ufs is not None:
+            filtro = f"WHERE UF_VENDA IN ({', '.join(['%s'] * len(self.ufs))})"
+            parametros = tuple(self.ufs)
+        with get_db_cursor(dictionary=True) as cursor:
+            cursor.execute(f"""
+                SELECT ANO_VENDA, MES_VENDA
+                FROM {self.tabela}
+                {filtro}
+                GROUP BY ANO_VENDA, MES_VENDA
+            """, parametros)
+            return {(linha['ANO_VENDA'], linha['MES_VENDA']) for linha in cursor.fetchall()}
+
+    def planejar(self, arquivos, resultados):
+        """Decide, pelo manifesto, o que pular, retomar ou carregar do zero
+
+        - concluído e arquivo inalterado: pula
+        - em andamento: retoma do último lote gravado (sem DELETE)
+        - concluído mas arquivo alterado, ou --recarregar: apaga o mês e recarrega
+        - sem manifesto e mês já com dados (carga antiga): pula com aviso
+        """
+        print("\n📒 CONSULTANDO MANIFESTO DE CARGA")
+        self.manifesto.criar_tabela()
+        self.agregadas.criar_tabela()
+        if self.codificado:
+            criar_tabelas_codificadas()
+        if self.ufs is not None:
+            criar_tabelas_estados()
+        entradas = self.manifesto.obter_todos()
+        meses_carregados = self.obter_meses_carregados()
+
+        a_carregar = []
+        for info in arquivos:
+            entrada = entradas.get(info['arquivo'])
+            info['offset'] = 0
+            info['checksum_manifesto'] = None
+
+            if entrada and not self.recarregar:
+                if entrada['STATUS'] == STATUS_CONCLUIDO and arquivo_inalterado(entrada, info['caminho']):
+                    print(f"   ⏭️  {info['arquivo']}: já concluído")
+                    resultados.append({"status": "success", "arquivo": info['arquivo'], "ano": info['ano'],
+                                       "mes": info['mes'], "pulado": True})
+                    continue
+                if entrada['STATUS'] != STATUS_CONCLUIDO:
+                    info['offset'] = entrada['REGISTROS_GRAVADOS']
+                    info['checksum_manifesto'] = entrada['CHECKSUM']
+                    print(f"   ▶️  {info['arquivo']}: retomando após {info['offset']:,} registros")
+                    a_carregar.append(info)
+                    continue
+
+            if entrada is None and not self.recarregar and (info['ano'], info['mes']) in meses_carregados:
+                print(f"   ⚠️  {info['arquivo']}: mês já tem dados sem manifesto (use --recarregar)")
+                resultados.append({"status": "success", "arquivo": info['arquivo'], "ano": info['ano'],
+                                   "mes": info['mes'], "pulado": True})
+                continue
+
+            # Partição própria do mês antes de limpar/carregar (sem efeito se não particionada)
+            self.particoes.garantir_particao(info['ano'], info['mes'])
+            if (info['ano'], info['mes']) in meses_carregados:
+                removidos = self.limpar_mes(info['ano'], info['mes'])
+                print(f"   🗑️  {info['arquivo']}: {removidos:,} registros removidos para recarga")
+            if entrada:
+                self.manifesto.remover(info['arquivo'])
+            a_carregar.append(info)
+
+        return a_carregar
+
+    def _escritor(self, fila):
+        """Thread escritora: consome lotes da fila até a sentinela"""
+        try:
+            with criar_gravador(self.backend, INSERT_VENDAS, self.tamanho_lote,
+                                self.recriar_indices, codificado=self.codificado,
+                                multi_estado=self.ufs is not None) as gravador:
+                while True:
+                    item = fila.get()
+                    if item is FIM_DA_FILA:
+                        break
+                    registros, comandos_extras = item
+                    gravador.gravar_lote(registros, comandos_extras)
+            self.estatisticas_escritores.append(gravador.obter_estatisticas())
+        except Exception as e:
+            print(f"❌ Erro no escritor: {e}")
+            self.erros_escrita.append(str(e))
+            # Continuar esvaziando a fila para não travar os leitores
+            while fila.get() is not FIM_DA_FILA:
+                pass
+
+    def executar(self):
+        """Executa a ingestão de todos os arquivos"""
+        print("🚀 INICIANDO INGESTÃO PARALELA")
+        print("=" * 60)
+
+        arquivos = descobrir_arquivos(self.diretorio)
+        if not arquivos:
+            print(f"❌ Nenhum arquivo EDA_Industrializados_YYYYMM.csv em {self.diretorio}")
+            return {"status": "error", "message": "Nenhum arquivo encontrado"}
+
+        print(f"📁 Arquivos encontrados: {len(arquivos)}")
+
+        # Detectar formato (só o início de cada arquivo, com cache) antes de distribuir
+        arquivos_validos = []
+        resultados = []
+        for info in arquivos:
+            info['config'] = detectar_formato(info['caminho'])
+            if info['config'] is None:
+                print(f"❌ {info['arquivo']}: não foi possível detectar o delimitador")
+                resultados.append({"status": "error", "arquivo": info['arquivo'], "ano": info['ano'],
+                                   "mes": info['mes'], "message": "Delimitador não detectado"})
+            else:
+                arquivos_validos.append(info)
+        arquivos = arquivos_validos
+        print(f"⚙️  Processos leitores: {self.processos} | Escritores: {self.escritores} | "
+              f"Fila: {self.tamanho_fila} lotes de {self.tamanho_lote:,}")
+
+        arquivos = self.planejar(arquivos, resultados)
+        if not arquivos:
+            print("✅ Nada a carregar: todos os arquivos já constam como concluídos no manifesto")
+
+        if self.ufs is not None:
+            municipios_validos = municipios_por_uf(self.ufs)
+            print(f"🗺️  UFs: {', '.join(self.ufs)} ({sum(map(len, municipios_validos.values())):,} municípios)")
+        else:
+            municipios_validos = frozenset(self.etl.criar_set_municipios_rj())
+        inicio = time.time()
+
+        with Manager() as manager:
+            # Uma fila por escritor: os lotes de um arquivo são gravados em ordem por um
+            # único escritor, então o offset do manifesto nunca pula lotes
+            filas = [manager.Queue(maxsize=self.tamanho_fila) for _ in range(self.escritores)]
+
+            threads = [threading.Thread(target=self._escritor, args=(fila,), daemon=True)
+                       for fila in filas]
+            for thread in threads:
+                thread.start()
+
+            try:
+                with ProcessPoolExecutor(max_workers=self.processos) as executor:
+                    futuros = {
+                        executor.submit(processar_arquivo, info, municipios_validos,
+                                        filas[indice % len(filas)],
+                                        self.tamanho_bloco, self.tamanho_lote, self.uf,
+                                        self.manifesto.tabela): info
+                        for indice, info in enumerate(arquivos)
+                    }
+                    for i, futuro in enumerate(as_completed(futuros), 1):
+                        info = futuros[futuro]
+                        try:
+                            resultado = futuro.result()
+                        except Exception as e:
+                            resultado = {"status": "error", "arquivo": info['arquivo'],
+                                         "ano": info['ano'], "mes": info['mes'], "message": str(e)}
+                        resultados.append(resultado)
+
+                        if resultado["status"] == "success":
+                            print(f"[{i}/{len(arquivos)}] ✅ {resultado['arquivo']}: "
+                                  f"{resultado['registros_enviados']:,} registros em {resultado['tempo_s']:.1f}s")
+                        else:
+                            print(f"[{i}/{len(arquivos)}] ❌ {resultado['arquivo']}: {resultado['message']}")
+            finally:
+                for fila in filas:
+                    fila.put(FIM_DA_FILA)
+                for thread in threads:
+                    thread.join()
+
+        tempo_total = time.time() - inicio
+        return self._resumir(resultados, tempo_total)
+
+    def _resumir(self, resultados, tempo_total):
+        """Monta e imprime o resumo da ingestão"""
+        rejeicoes = {}
+        for resultado in resultados:
+            for motivo, quantidade in resultado.get("rejeicoes", {}).items():
+                rejeicoes[motivo] = rejeicoes.get(motivo, 0) + quantidade
+
+        linhas_lidas = sum(r.get("linhas_lidas", 0) for r in resultados)
+        registros_inseridos = sum(e["registros_inseridos"] for e in self.estatisticas_escritores)
+        arquivos_com_erro = [r["arquivo"] for r in resultados if r["status"] != "success"]
+
+        resumo = {
+            "status": "success" if not arquivos_com_erro and not self.erros_escrita else "partial",
+            "arquivos_processados": len(resultados) - len(arquivos_com_erro),
+            "arquivos_pulados": sum(1 for r in resultados if r.get("pulado")),
+            "arquivos_com_erro": arquivos_com_erro,
+            "linhas_lidas": linhas_lidas,
+            "registros_inseridos": registros_inseridos,
+            "registros_rejeitados": rejeicoes,
+            "erros_escrita": len(self.erros_escrita),
+            "tempo_total_s": round(tempo_total, 3),
+            "linhas_por_segundo": round(linhas_lidas / tempo_total, 1) if tempo_total > 0 else 0.0,
+            "processos": self.processos,
+            "backend": self.backend,
+        }
+
+        print(f"\n🎉 INGESTÃO CONCLUÍDA!")
+        print("=" * 60)
+        print(f"📁 Arquivos processados: {resumo['arquivos_processados']}/{len(resultados)} "
+              f"({resumo['arquivos_pulados']} já concluídos)")
+        print(f"📖 Linhas lidas: {linhas_lidas:,}")
+        print(f"💾 Registros inseridos: {registros_inseridos:,}")
+        print(f"🚫 Rejeitados: {formatar_rejeicoes(rejeicoes)}")
+        print(f"⏱️  Tempo total: {tempo_total:.1f}s ({resumo['linhas_por_segundo']:,.0f} linhas/s)")
+
+        return resumo
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Ingestão paralela dos arquivos EDA_Industrializados")
+    parser.add_argument("--diretorio", default=DIRETORIO_LAGO,
+                        help="diretório com os arquivos EDA_Industrializados_YYYYMM.csv")
+    parser.add_argument("--processos", type=int, default=None,
+                        help="processos leitores (padrão: número de núcleos)")
+    parser.add_argument("--escritores", type=int, default=2,
+                        help="threads que gravam no MySQL (padrão: 2)")
+    parser.add_argument("--tamanho-bloco", type=int, default=200_000,
+                        help="linhas lidas do CSV por bloco (padrão: 200000)")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE_PADRAO,
+                        help=f"registros por INSERT/commit (padrão: {TAMANHO_LOTE_PADRAO})")
+    parser.add_argument("--tamanho-fila", type=int, default=None,
+                        help="lotes em trânsito entre leitores e escritores (padrão: 2 x processos)")
+    parser.add_argument("--backend", choices=BACKENDS, default='insert',
+                        help="insert = INSERTs em lote; load-data = LOAD DATA LOCAL INFILE (padrão: insert)")
+    parser.add_argument("--recriar-indices", action="store_true",
+                        help="remove e recria os índices secundários em volta do LOAD DATA")
+    parser.add_argument("--recarregar", action="store_true",
+                        help="apaga e recarrega todos os meses, ignorando o manifesto")
+    parser.add_argument("--codificado", action="store_true",
+                        help="grava em vendas_medicamentos_cod, com IDs das tabelas de dimensão")
+    parser.add_argument("--ufs", nargs="+", default=None,
+                        help="carrega estas UFs em vendas_medicamentos_uf (ex.: --ufs SP MG RJ)")
+    args = parser.parse_args()
+
+    ingestao = IngestaoParalela(diretorio=args.diretorio,
+                                processos=args.processos,
+                                escritores=args.escritores,
+                                tamanho_bloco=args.tamanho_bloco,
+                                tamanho_lote=args.tamanho_lote,
+                                tamanho_fila=args.tamanho_fila,
+                                backend=args.backend,
+                                recriar_indices=args.recriar_indices,
+                                recarregar=args.recarregar,
+                                codificado=args.codificado,
+                                ufs=args.ufs)
+    resultado = ingestao.executar()
+
+    print(f"\n📋 RESUMO FINAL:")
+    for chave, valor in resultado.items():
+        print(f"   {chave}: {valor}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Inserção em lotes (executemany) com commit por lote
+"""
+import os
+import sys
+import time
+
+# Adicionar o diretório atual ao path para importar meuDB
+sys.path.append(os.path.dirname(__file__))
+
+from meuDB import get_db_cursor
+from metricas import detalhado
+from vendas_agregadas import somar_registros
+
+TAMANHO_LOTE_PADRAO = 5000
+
+BACKENDS = ('insert', 'load-data')
+
+INSERT_VENDAS = """
+    INSERT INTO trampo.vendas_medicamentos 
+    (ANO_VENDA, MES_VENDA, PRINCIPIO_ATIVO, MUNICIPIO_VENDA, 
+    QTD_VENDIDA, CONSELHO_PRESCRITOR, UF_CONSELHO_PRESCRITOR)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+class InseridorEmLote:
+    """Acumula registros e grava em lotes, um commit por lote
+
+    Cada lote é enviado com `cursor.executemany`, que no conector MySQL vira
+    um único INSERT com vários VALUES. Com `tamanho_lote=1` o comportamento é
+    o mesmo do laço linha a linha antigo, útil para comparar a vazão.
+
+    Uso:
+        with InseridorEmLote(insert_query, tamanho_lote=5000) as inseridor:
+            for registro in registros:
+                inseridor.adicionar(registro)
+        print(inseridor.obter_estatisticas())
+    """
+
+    def __init__(self, insert_query, tamanho_lote=TAMANHO_LOTE_PADRAO, intervalo_progresso=10,
+                 manter_agregada=False, codificador=None, metricas=None, comandos_iniciais=()):
+        self.insert_query = insert_query
+        # (sql, parametros) executados antes do primeiro lote, na mesma transação
+        # (ex.: o DELETE de uma recarga, que só vale se o lote também for gravado)
+        self.comandos_iniciais = list(comandos_iniciais)
+        # metricas.Metricas opcional: etapas 'insercao' e 'commit', registros gravados
+        self.metricas = metricas
+        # Somar cada lote em vendas_agregadas no mesmo commit (só para vendas_medicamentos)
+        self.manter_agregada = manter_agregada
+        # Transforma os registros antes do INSERT (ex.: dimensoes.CodificadorVendas);
+        # None na saída descarta o registro
+        self.codificador = codificador
+        self.tamanho_lote = max(1, int(tamanho_lote))
+        self.intervalo_progresso = intervalo_progresso  # mostrar progresso a cada N lotes
+        self.lote = []
+        self.registros_inseridos = 0
+        self.lotes_gravados = 0
+        self.erros = []
+        self.tempo_gravacao = 0.0
+        self.inicio = None
+
+    def __enter__(self):
+        self.inicio = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Gravar o que sobrou apenas se não houve erro no laço de chamada
+        if exc_type is None:
+            self.descarregar()
+            if self.comandos_iniciais:
+                self._gravar([])  # nenhum registro: os comandos iniciais ainda valem
+        return False
+
+    def adicionar(self, registro):
+        """Adiciona um registro (tupla) ao lote, gravando quando o lote enche"""
+        if self.inicio is None:
+            self.inicio = time.time()
+
+        self.lote.append(registro)
+        if len(self.lote) >= self.tamanho_lote:
+            self.descarregar()
+
+    def adicionar_varios(self, registros):
+        """Adiciona vários registros de uma vez"""
+        for registro in registros:
+            self.adicionar(registro)
+
+    def descarregar(self):
+        """Grava o lote pendente numa transação própria"""
+        if not self.lote:
+            return 0
+
+        lote, self.lote = self.lote, []
+        return self._gravar(lote)
+
+    def gravar_lote(self, registros, comandos_extras=()):
+        """Grava `registros` numa transação própria, junto com `comandos_extras`
+
+        `comandos_extras` é uma lista de (sql, parametros) executada no mesmo
+        cursor, ou seja, no mesmo commit dos registros (ex.: atualizar o
+        manifesto de carga). O lote pendente de `adicionar` é gravado antes.
+        """
+        self.descarregar()
+        if not registros and not comandos_extras:
+            return 0
+        return self._gravar(list(registros), comandos_extras)
+
+    def _codificar(self, lote):
+        """Aplica o codificador; registros que não puderem ser codificados viram erro"""
+        if self.codificador is None:
+            return lote, lote
+
+        originais, linhas = [], []
+        for registro, linha in zip(lote, self.codificador(lote)):
+            if linha is None:
+                self.erros.append(f"❌ Registro não codificado: {registro}")
+                continue
+            originais.append(registro)
+            linhas.append(linha)
+        return originais, linhas
+
+    def _gravar(self, lote, comandos_extras=()):
+        inicio = time.time()
+        lote, linhas = self._codificar(lote)
+        iniciais, self.comandos_iniciais = self.comandos_iniciais, []
+
+        try:
+            with get_db_cursor() as cursor:
+                for sql, parametros in iniciais:
+                    cursor.execute(sql, parametros)
+                if lote:
+                    cursor.executemany(self.insert_query, linhas)
+                    if self.manter_agregada:
+                        somar_registros(cursor, lote)
+                for sql, parametros in comandos_extras:
+                    cursor.execute(sql, parametros)
+                inicio_commit = time.time()  # o commit acontece na saída do with
+            gravados = len(lote)
+        except Exception as e:
+            print(f"⚠️  Lote com erro ({e}) - gravando linha a linha")
+            inicio_commit = None
+            gravados = self._gravar_linha_a_linha(lote, linhas, comandos_extras, iniciais)
+
+        fim = time.time()
+        self.tempo_gravacao += fim - inicio
+        self.registros_inseridos += gravados
+        if lote:
+            self.lotes_gravados += 1
+        if self.metricas is not None:
+            self.metricas.registrar('insercao', (inicio_commit or fim) - inicio)
+            if inicio_commit is not None:
+                self.metricas.registrar('commit', fim - inicio_commit)
+            self.metricas.contar('registros_gravados', gravados)
+            if len(lote) > gravados:
+                self.metricas.contar('registros_com_erro', len(lote) - gravados)
+
+        if (lote and self.intervalo_progresso and self.lotes_gravados % self.intervalo_progresso == 0
+                and detalhado()):
+            print(f"📊 Progresso: {self.registros_inseridos:,} registros em "
+                  f"{self.lotes_gravados:,} lotes ({self.vazao():,.0f} registros/s)")
+
+        return gravados
+
+    def _gravar_linha_a_linha(self, lote, linhas, comandos_extras=(), comandos_iniciais=()):
+        """Fallback: isola as linhas problemáticas de um lote que falhou"""
+        gravados = []
+        with get_db_cursor() as cursor:
+            for sql, parametros in comandos_iniciais:
+                cursor.execute(sql, parametros)
+            for registro, linha in zip(lote, linhas):
+                try:
+                    cursor.execute(self.insert_query, linha)
+                    gravados.append(registro)
+                except Exception as e:
+                    self.erros.append(f"❌ Erro ao inserir {registro}: {e}")
+            if self.manter_agregada:
+                somar_registros(cursor, gravados)
+            for sql, parametros in comandos_extras:
+                cursor.execute(sql, parametros)
+        return len(gravados)
+
+    def vazao(self):
+        """Registros gravados por segundo de gravação"""
+        if self.tempo_gravacao <= 0:
+            return 0.0
+        return self.registros_inseridos / self.tempo_gravacao
+
+    def obter_estatisticas(self):
+        """Retorna as estatísticas da inserção"""
+        tempo_total = time.time() - self.inicio if self.inicio else 0.0
+        return {
+            "registros_inseridos": self.registros_inseridos,
+            "lotes_gravados": self.lotes_gravados,
+            "tamanho_lote": self.tamanho_lote,
+            "erros": len(self.erros),
+            "tempo_gravacao_s": round(self.tempo_gravacao, 3),
+            "tempo_total_s": round(tempo_total, 3),
+            "registros_por_segundo": round(self.vazao(), 1),
+        }
+
+
+def criar_gravador(backend='insert', insert_query=INSERT_VENDAS,
+                   tamanho_lote=TAMANHO_LOTE_PADRAO, recriar_indices=False, manter_agregada=True,
+                   codificado=False, multi_estado=False, metricas=None):
+    """Cria o gravador do backend escolhido para vendas_medicamentos
+
+    'insert' = InseridorEmLote; 'load-data' = CarregadorEmMassa (LOAD DATA LOCAL INFILE).
+    Com `manter_agregada`, cada commit também soma os registros em vendas_agregadas.
+    Com `codificado`, grava em vendas_medicamentos_cod com as chaves das dimensões.
+    Com `multi_estado`, grava em vendas_medicamentos_uf (registros com UF_VENDA na
+    frente); a agregada não é mantida, porque não tem UF na chave.
+    `metricas` (metricas.Metricas) recebe os tempos de gravação e commit.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend inválido: {backend} (opções: {', '.join(BACKENDS)})")
+
+    codificador = None
+    if codificado:
+        from dimensoes import (CodificadorVendas, INSERT_VENDAS_CODIFICADA, TABELA_VENDAS_CODIFICADA,
+                               COLUNAS_VENDAS_CODIFICADA, INDICES_VENDAS_CODIFICADA)
+        codificador = CodificadorVendas()
+        insert_query = INSERT_VENDAS_CODIFICADA
+
+    if multi_estado:
+        if codificado:
+            raise ValueError("O modo codificado não suporta vários estados")
+        from estados import INSERT_VENDAS_UF, INDICES_VENDAS_UF, TABELA_VENDAS_UF
+        from normalizacao_vendas import COLUNAS_VENDAS_UF
+        insert_query = INSERT_VENDAS_UF
+        manter_agregada = False
+
+    if backend == 'load-data':
+        from carga_em_massa import CarregadorEmMassa
+        if multi_estado:
+            return CarregadorEmMassa(tabela=TABELA_VENDAS_UF, colunas=COLUNAS_VENDAS_UF,
+                                     indices=INDICES_VENDAS_UF, recriar_indices=recriar_indices,
+                                     manter_agregada=False, metricas=metricas)
+        if codificado:
+            return CarregadorEmMassa(tabela=TABELA_VENDAS_CODIFICADA, colunas=COLUNAS_VENDAS_CODIFICADA,
+                                     indices=INDICES_VENDAS_CODIFICADA, recriar_indices=recriar_indices,
+                                     manter_agregada=manter_agregada, codificador=codificador,
+                                     metricas=metricas)
+        return CarregadorEmMassa(recriar_indices=recriar_indices, manter_agregada=manter_agregada,
+                                 metricas=metricas)
+    return InseridorEmLote(insert_query, tamanho_lote=tamanho_lote, manter_agregada=manter_agregada,
+                           codificador=codificador, metricas=metricas)
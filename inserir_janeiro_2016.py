@@ -1,9 +1,11 @@
 """
 Script específico para inserir Janeiro/2016 com delimitador correto
 """
+import argparse
 import pandas as pd
 import os
 import sys
+import time
 from pathlib import Path
 
 # Adicionar o diretório atual ao path para importar módulos
@@ -11,19 +13,48 @@ sys.path.append(os.path.dirname(__file__))
 
 from meuDB import get_db_cursor
 from etl_vendas_medicamentos import EtlVendaMedicamento
+from insercao_em_lote import BACKENDS, INSERT_VENDAS, TAMANHO_LOTE_PADRAO, criar_gravador
+from normalizacao_vendas import normalizar_bloco, para_registros, formatar_rejeicoes
+from leitura_csv import DIRETORIO_LAGO, detectar_formato, ler_em_blocos
+from metricas import (Metricas, NORMAL, adicionar_argumentos, definir_verbosidade, nivel_dos_argumentos,
+                      verbosidade)
+from vendas_agregadas import VendasAgregadas
+from dimensoes import TABELA_VENDAS_CODIFICADA, criar_tabelas_codificadas
+from particionamento import GerenciadorParticoes
+from manifesto_carga import (ManifestoCarga, STATUS_CONCLUIDO, TABELA_MANIFESTO, arquivo_inalterado,
+                             calcular_checksum, pular_registros)
 
 class InserirJaneiro2016:
     """Classe especializada para inserir Janeiro/2016 com delimitador correto"""
     
-    def __init__(self):
+    def __init__(self, tamanho_bloco=200_000, tamanho_lote=TAMANHO_LOTE_PADRAO,
+                 backend='insert', recriar_indices=False, codificado=False, metricas=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend inválido: {backend} (opções: {', '.join(BACKENDS)})")
+        
         self.etl = EtlVendaMedicamento()
+        self.tamanho_bloco = tamanho_bloco  # linhas lidas por bloco no modo streaming
+        self.tamanho_lote = tamanho_lote  # registros por INSERT/commit
+        self.backend = backend  # 'insert' (lotes) ou 'load-data' (LOAD DATA LOCAL INFILE)
+        self.recriar_indices = recriar_indices  # só para o backend 'load-data'
+        self.estatisticas_insercao = {}
+        self.registros_rj_lidos = 0
+        # Tempos por etapa (leitura, filtro, normalizacao, insercao, commit) e contagens da carga
+        self.metricas = metricas if metricas is not None else Metricas('inserir_janeiro_2016')
+        self.rejeicoes = {}  # motivo -> quantidade de linhas descartadas
+        self.erro_insercao = None  # mensagem da falha da última inserção
+        # Modo codificado: grava em vendas_medicamentos_cod (chaves das dimensões), com manifesto próprio
+        self.codificado = codificado
+        self.tabela = TABELA_VENDAS_CODIFICADA if codificado else "trampo.vendas_medicamentos"
+        self.manifesto = ManifestoCarga(TABELA_MANIFESTO + "_cod" if codificado else TABELA_MANIFESTO)
+        self.agregadas = VendasAgregadas()
+        self.particoes = GerenciadorParticoes(self.tabela)
         self.ano = 2016
         self.mes = 1
         self.arquivo = "EDA_Industrializados_201601.csv"
-        self.caminho_arquivo = os.path.join(
-            "D:\\LagoDeDados\\medicamentos\\medicamentos_venda", 
-            self.arquivo
-        )
+        self.caminho_arquivo = os.path.join(DIRETORIO_LAGO, self.arquivo)
+        # Janeiro/2016 usa ponto e vírgula; diagnosticar_arquivo confirma delimitador e encoding
+        self.config_leitura = {'sep': ';', 'encoding': 'latin-1'}
     
     def verificar_arquivo(self):
         """Verifica se o arquivo existe"""
@@ -37,73 +68,67 @@ class InserirJaneiro2016:
         return True
     
     def diagnosticar_arquivo(self):
-        """Faz diagnóstico completo do arquivo"""
+        """Detecta delimitador e encoding lendo só o início do arquivo (com cache)"""
         print("\n🔍 DIAGNÓSTICO DO ARQUIVO")
         print("=" * 50)
         
         try:
-            # Testar diferentes delimitadores
-            delimitadores = [';', '\t', ',', '|']
+            inicio = time.time()
+            config = detectar_formato(self.caminho_arquivo)
+            tempo_ms = (time.time() - inicio) * 1000
             
-            for delim in delimitadores:
-                try:
-                    df = pd.read_csv(self.caminho_arquivo, 
-                                   sep=delim, 
-                                   encoding='latin-1', 
-                                   nrows=5,  # Ler apenas 5 linhas para teste
-                                   low_memory=False)
-                    
-                    print(f"\n🎯 Delimitador '{repr(delim)}':")
-                    print(f"   Colunas: {len(df.columns)}")
-                    print(f"   Nomes das colunas: {df.columns.tolist()}")
-                    
-                    if 'UF_VENDA' in df.columns:
-                        print(f"   ✅ UF_VENDA encontrada!")
-                        return delim
-                    else:
-                        print(f"   ❌ UF_VENDA não encontrada")
-                        
-                except Exception as e:
-                    print(f"   ❌ Falhou com {repr(delim)}: {str(e)}")
+            if config is None:
+                print("❌ Não foi possível detectar o delimitador")
+                return None
             
-            return None
+            print(f"🎯 Delimitador: {repr(config['sep'])} | Encoding: {config['encoding']} ({tempo_ms:.1f} ms)")
+            print(f"   Colunas: {len(config['colunas'])}")
+            print(f"   Nomes das colunas: {config['colunas']}")
+            
+            if 'UF_VENDA' not in config['colunas']:
+                print(f"   ❌ UF_VENDA não encontrada")
+                return None
+            
+            print(f"   ✅ UF_VENDA encontrada!")
+            self.config_leitura = config
+            return config['sep']
             
         except Exception as e:
             print(f"❌ Erro no diagnóstico: {e}")
             return None
     
-    def ler_arquivo_corretamente(self):
-        """Lê o arquivo com o delimitador correto"""
-        print(f"\n📖 LENDO ARQUIVO COM DELIMITADOR CORRETO")
+    def ler_arquivo_em_blocos(self, uf='RJ'):
+        """Lê o arquivo em blocos, mantendo apenas as linhas da UF e as colunas necessárias
+        
+        Gerador: a memória fica limitada ao tamanho de um bloco, qualquer que
+        seja o tamanho do arquivo.
+        """
+        print(f"\n📖 LENDO ARQUIVO EM BLOCOS DE {self.tamanho_bloco:,} LINHAS")
         print("=" * 50)
         
-        try:
-            # Janeiro/2016 usa ponto e vírgula
-            df = pd.read_csv(self.caminho_arquivo, 
-                           sep=';', 
-                           encoding='latin-1', 
-                           low_memory=False)
-            
-            print(f"✅ Arquivo lido com sucesso!")
-            print(f"📊 Total de registros: {len(df):,}")
-            print(f"🏷️ Colunas: {df.columns.tolist()}")
+        self.registros_rj_lidos = 0
+        total_lido = 0
+        
+        leitor = ler_em_blocos(self.caminho_arquivo, self.config_leitura, self.tamanho_bloco, uf, self.metricas)
+        
+        inicio = time.time()
+        for numero_bloco, (bloco_uf, linhas_lidas) in enumerate(leitor, 1):
+            fim = time.time()
+            tempo_bloco = fim - inicio
+            linhas_por_segundo = linhas_lidas / tempo_bloco if tempo_bloco > 0 else 0.0
             
-            # Verificar registros RJ
-            if 'UF_VENDA' in df.columns:
-                df_rj = df[df['UF_VENDA'] == 'RJ']
-                print(f"🎯 Registros RJ: {len(df_rj):,}")
-                
-                if len(df_rj) > 0:
-                    print(f"🏙️ Municípios RJ (top 5):")
-                    municipios = df_rj['MUNICIPIO_VENDA'].value_counts().head(5)
-                    for municipio, qtd in municipios.items():
-                        print(f"   📍 {municipio}: {qtd:,} registros")
+            total_lido += linhas_lidas
+            self.registros_rj_lidos += len(bloco_uf)
+            if verbosidade() >= NORMAL:
+                print(f"📦 Bloco {numero_bloco}: {linhas_lidas:,} linhas lidas, "
+                      f"{len(bloco_uf):,} {uf} ({linhas_por_segundo:,.0f} linhas/s)")
             
-            return df
+            if len(bloco_uf) > 0:
+                yield bloco_uf
             
-        except Exception as e:
-            print(f"❌ Erro ao ler arquivo: {e}")
-            return None
+            inicio = time.time()
+        
+        print(f"✅ Leitura concluída: {total_lido:,} linhas, {self.registros_rj_lidos:,} {uf}")
     
     def limpar_dados_existentes(self):
         """Remove registros existentes de Janeiro/2016"""
@@ -112,12 +137,10 @@ class InserirJaneiro2016:
         
         try:
             with get_db_cursor() as cursor:
-                delete_query = """
-                    DELETE FROM trampo.vendas_medicamentos 
-                    WHERE ANO_VENDA = %s AND MES_VENDA = %s
-                """
-                cursor.execute(delete_query, (self.ano, self.mes))
-                affected_rows = cursor.rowcount
+                # Agregada antes: o TRUNCATE da partição (tabela particionada por mês) faz commit
+                # implícito, e se ele falhar o mês só fica faltando na agregada (meses_faltando)
+                self.agregadas.limpar_mes(cursor, self.ano, self.mes)
+                affected_rows = self.particoes.limpar_mes(cursor, self.ano, self.mes)
                 print(f"✅ Dados existentes removidos: {affected_rows} registros")
                 return True
                 
@@ -125,82 +148,79 @@ class InserirJaneiro2016:
             print(f"❌ Erro ao limpar dados: {e}")
             return False
     
-    def inserir_dados(self, df):
-        """Insere os dados no banco"""
+    def inserir_dados(self, dados, offset=0):
+        """Insere os dados no banco
+        
+        `dados` pode ser um DataFrame completo ou um iterável de blocos
+        (ver `ler_arquivo_em_blocos`). Os primeiros `offset` registros
+        normalizados (já gravados numa carga anterior) são pulados, e cada
+        lote avança o manifesto no mesmo commit.
+        
+        Retorna o número de registros inseridos, ou None se a inserção
+        falhar no meio (a mensagem fica em `self.erro_insercao`). Os lotes
+        já gravados continuam no banco e o manifesto fica "em andamento",
+        então a próxima execução retoma de onde parou.
+        """
         print(f"\n💾 INSERINDO DADOS NO BANCO")
         print("=" * 50)
         
-        if df is None:
+        if dados is None:
             print("❌ Nenhum dado para inserir")
             return 0
         
-        # Filtrar apenas registros RJ
-        df_rj = df[df['UF_VENDA'] == 'RJ']
-        total_registros = len(df_rj)
-        
-        if total_registros == 0:
-            print("❌ Nenhum registro RJ encontrado para inserir")
-            return 0
-        
-        print(f"🎯 Inserindo {total_registros:,} registros RJ...")
-        
-        insert_query = """
-            INSERT INTO trampo.vendas_medicamentos 
-            (ANO_VENDA, MES_VENDA, PRINCIPIO_ATIVO, MUNICIPIO_VENDA, 
-            QTD_VENDIDA, CONSELHO_PRESCRITOR, UF_CONSELHO_PRESCRITOR)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
+        if isinstance(dados, pd.DataFrame):
+            # Filtrar apenas registros RJ
+            df_rj = dados[dados['UF_VENDA'] == 'RJ']
+            if len(df_rj) == 0:
+                print("❌ Nenhum registro RJ encontrado para inserir")
+                return 0
+            print(f"🎯 Inserindo {len(df_rj):,} registros RJ...")
+            blocos = [df_rj]
+        else:
+            print(f"🎯 Inserindo registros RJ em modo streaming...")
+            blocos = dados
         
-        registros_inseridos = 0
         municipios_validos = self.etl.criar_set_municipios_rj()
+        self.rejeicoes = {}
+        self.erro_insercao = None
         
         try:
-            with get_db_cursor() as cursor:
-                for index, row in df_rj.iterrows():
-                    try:
-                        # Verificar se município é válido
-                        municipio = str(row['MUNICIPIO_VENDA']).strip().upper()
-                        if municipio not in municipios_validos:
-                            continue
-                        
-                        # Preparar dados
-                        principio_ativo = str(row['PRINCIPIO_ATIVO'])[:255] if pd.notna(row['PRINCIPIO_ATIVO']) else ''
-                        qtd_vendida = int(float(str(row['QTD_VENDIDA']).replace(',', '.'))) if pd.notna(row['QTD_VENDIDA']) else 0
-                        conselho = str(row['CONSELHO_PRESCRITOR'])[:50] if pd.notna(row['CONSELHO_PRESCRITOR']) else ''
-                        uf_conselho = str(row['UF_CONSELHO_PRESCRITOR'])[:2] if pd.notna(row['UF_CONSELHO_PRESCRITOR']) else ''
-                        
-                        insert_data = (
-                            self.ano,
-                            self.mes,
-                            principio_ativo,
-                            municipio[:100],  # Limitar tamanho
-                            qtd_vendida,
-                            conselho,
-                            uf_conselho
-                        )
-                        
-                        cursor.execute(insert_query, insert_data)
-                        registros_inseridos += 1
-                        
-                        # Mostrar progresso
-                        if registros_inseridos % 10000 == 0:
-                            print(f"📊 Progresso: {registros_inseridos:,}/{total_registros:,}")
-                            
-                    except Exception as e:
-                        # Ignorar erros em linhas individuais
-                        continue
+            with criar_gravador(self.backend, INSERT_VENDAS, self.tamanho_lote,
+                                self.recriar_indices, codificado=self.codificado,
+                                metricas=self.metricas) as inseridor:
+                posicao = 0  # índice do próximo registro na sequência normalizada do arquivo
+                for df_rj in blocos:
+                    with self.metricas.etapa('normalizacao'):
+                        df_normalizado = normalizar_bloco(df_rj, self.ano, self.mes,
+                                                          municipios_validos, self.rejeicoes)
+                        registros, posicao = pular_registros(para_registros(df_normalizado), posicao, offset)
+                    for i in range(0, len(registros), self.tamanho_lote):
+                        lote = registros[i:i + self.tamanho_lote]
+                        posicao += len(lote)
+                        inseridor.gravar_lote(lote, [self.manifesto.comando_progresso(self.arquivo, posicao)])
+                
+                inseridor.gravar_lote([], [self.manifesto.comando_conclusao(self.arquivo, max(posicao, offset))])
+            
+            self.estatisticas_insercao = inseridor.obter_estatisticas()
+            registros_inseridos = inseridor.registros_inseridos
+            self.metricas.registrar_rejeicoes(self.rejeicoes)
             
             print(f"✅ Inserção concluída: {registros_inseridos:,} registros")
+            print(f"⚡ Vazão: {self.estatisticas_insercao['registros_por_segundo']:,.0f} registros/s "
+                  f"(backend {self.backend})")
+            print(f"🚫 Rejeitados: {formatar_rejeicoes(self.rejeicoes)}")
             return registros_inseridos
             
         except Exception as e:
             print(f"❌ Erro na inserção: {e}")
-            return 0
+            self.erro_insercao = str(e)
+            return None
     
     def executar(self):
         """Executa o processo completo"""
         print("🚀 INICIANDO INSERÇÃO DE JANEIRO/2016")
         print("=" * 60)
+        self.metricas.rotulos.update(arquivo=self.arquivo, backend=self.backend)
         
         # 1. Verificar arquivo
         if not self.verificar_arquivo():
@@ -213,17 +233,38 @@ class InserirJaneiro2016:
         
         print(f"\n🎯 Delimitador identificado: '{repr(delimitador)}'")
         
-        # 3. Ler arquivo
-        df = self.ler_arquivo_corretamente()
-        if df is None:
-            return {"status": "error", "message": "Erro ao ler arquivo"}
+        # 3. Consultar manifesto: pular, retomar ou carregar do zero
+        self.manifesto.criar_tabela()
+        self.agregadas.criar_tabela()
+        if self.codificado:
+            criar_tabelas_codificadas()
+        self.particoes.garantir_particao(self.ano, self.mes)
+        entrada = self.manifesto.obter(self.arquivo)
+        if entrada and entrada['STATUS'] == STATUS_CONCLUIDO and arquivo_inalterado(entrada, self.caminho_arquivo):
+            print(f"\n⏭️  {self.arquivo} já consta como concluído no manifesto")
+            return {"status": "success", "ano": self.ano, "mes": self.mes, "arquivo": self.arquivo,
+                    "registros_inseridos": 0, "message": "Arquivo já carregado"}
+        
+        checksum = calcular_checksum(self.caminho_arquivo)
+        offset = 0
+        if entrada and entrada['STATUS'] != STATUS_CONCLUIDO and entrada['CHECKSUM'] == checksum:
+            offset = entrada['REGISTROS_GRAVADOS']
+            print(f"\n▶️  Retomando carga parcial após {offset:,} registros")
+        else:
+            # 4. Limpar dados existentes (carga antiga, sem manifesto, ou arquivo alterado)
+            if not self.limpar_dados_existentes():
+                return {"status": "error", "message": "Erro ao limpar dados existentes"}
+            if entrada:
+                self.manifesto.remover(self.arquivo)
         
-        # 4. Limpar dados existentes
-        if not self.limpar_dados_existentes():
-            return {"status": "error", "message": "Erro ao limpar dados existentes"}
+        self.manifesto.registrar_inicio(self.arquivo, self.caminho_arquivo, self.ano, self.mes, checksum)
         
-        # 5. Inserir dados
-        registros_inseridos = self.inserir_dados(df)
+        # 5. Ler (em blocos) e inserir dados
+        registros_inseridos = self.inserir_dados(self.ler_arquivo_em_blocos(), offset)
+        if registros_inseridos is None:
+            return {"status": "error", "ano": self.ano, "mes": self.mes, "arquivo": self.arquivo,
+                    "registros_retomados_apos": offset,
+                    "message": f"Erro na inserção: {self.erro_insercao} (carga parcial; rode de novo para retomar)"}
         
         # 6. Resultado final
         resultado = {
@@ -231,9 +272,15 @@ class InserirJaneiro2016:
             "ano": self.ano,
             "mes": self.mes,
             "arquivo": self.arquivo,
-            "delimitador_utilizado": ";",
-            "registros_rj_encontrados": len(df[df['UF_VENDA'] == 'RJ']) if 'UF_VENDA' in df.columns else 0,
+            "delimitador_utilizado": self.config_leitura['sep'],
+            "encoding_utilizado": self.config_leitura['encoding'],
+            "registros_rj_encontrados": self.registros_rj_lidos,
             "registros_inseridos": registros_inseridos,
+            "registros_retomados_apos": offset,
+            "backend": self.backend,
+            "tamanho_lote": self.tamanho_lote,
+            "registros_por_segundo": self.estatisticas_insercao.get('registros_por_segundo', 0),
+            "registros_rejeitados": self.rejeicoes,
             "message": f"Inserção de Janeiro/2016 concluída com sucesso"
         }
         
@@ -244,13 +291,35 @@ class InserirJaneiro2016:
         print(f"   ✅ Delimitador: {resultado['delimitador_utilizado']}")
         print(f"   ✅ Registros RJ encontrados: {resultado['registros_rj_encontrados']:,}")
         print(f"   ✅ Registros inseridos: {resultado['registros_inseridos']:,}")
+        print(f"   ⚡ Vazão: {resultado['registros_por_segundo']:,.0f} registros/s")
+        print(f"   ⏱️  Etapas: {' | '.join(self.metricas.resumo())}")
         
         return resultado
 
 def main():
     """Função principal"""
-    inseridor = InserirJaneiro2016()
+    parser = argparse.ArgumentParser(description="Insere Janeiro/2016 na tabela vendas_medicamentos")
+    parser.add_argument("--tamanho-bloco", type=int, default=200_000,
+                        help="linhas lidas do CSV por bloco (padrão: 200000)")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE_PADRAO,
+                        help=f"registros por INSERT/commit; 1 = linha a linha (padrão: {TAMANHO_LOTE_PADRAO})")
+    parser.add_argument("--backend", choices=BACKENDS, default='insert',
+                        help="insert = INSERTs em lote; load-data = LOAD DATA LOCAL INFILE (padrão: insert)")
+    parser.add_argument("--recriar-indices", action="store_true",
+                        help="remove e recria os índices secundários em volta do LOAD DATA")
+    parser.add_argument("--codificado", action="store_true",
+                        help="grava em vendas_medicamentos_cod, com IDs das tabelas de dimensão")
+    adicionar_argumentos(parser)
+    args = parser.parse_args()
+    definir_verbosidade(nivel_dos_argumentos(args.verbose, args.quiet))
+    
+    inseridor = InserirJaneiro2016(tamanho_bloco=args.tamanho_bloco,
+                                   tamanho_lote=args.tamanho_lote,
+                                   backend=args.backend,
+                                   recriar_indices=args.recriar_indices,
+                                   codificado=args.codificado)
     resultado = inseridor.executar()
+    inseridor.metricas.emitir(jsonl=args.metricas_jsonl, prometheus=args.metricas_prometheus)
     
     print(f"\n📋 RESUMO FINAL:")
     for chave, valor in resultado.items():
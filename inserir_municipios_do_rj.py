@@ -1,3 +1,4 @@
+import argparse
 import pandas as pd
 import os
 import sys
@@ -6,11 +7,18 @@ import sys
 sys.path.append(os.path.dirname(__file__))
 
 from meuDB import get_db_cursor
+from insercao_em_lote import InseridorEmLote, TAMANHO_LOTE_PADRAO
+from leitura_csv import detectar_formato
+from metricas import Metricas, adicionar_argumentos, definir_verbosidade, nivel_dos_argumentos
 
-def inserir_municipios_rj():
+def inserir_municipios_rj(tamanho_lote=TAMANHO_LOTE_PADRAO, metricas=None):
     """
     Insere os municípios do RJ na tabela trampo.municipios_rj
+    
+    `metricas` (metricas.Metricas) recebe os tempos de leitura, inserção e commit.
     """
+    if metricas is None:
+        metricas = Metricas('inserir_municipios_rj')
     caminho_csv = "municipios_rj.csv"
     
     print("🏙️ INICIANDO INSERÇÃO DE MUNICÍPIOS DO RJ")
@@ -26,47 +34,41 @@ def inserir_municipios_rj():
                     print(f"   📄 {file}")
             return {"status": "error", "message": f"Arquivo {caminho_csv} não encontrado"}
         
-        # ⚠️ CORREÇÃO: Usar latin-1 em vez de utf-8
-        print("🔤 Tentando encoding: latin-1")
-        df = pd.read_csv(caminho_csv, sep=';', encoding='latin-1')
+        # Detectar delimitador e encoding (o arquivo original é latin-1 com ';')
+        config = detectar_formato(caminho_csv) or {'sep': ';', 'encoding': 'latin-1'}
+        print(f"🔤 Encoding: {config['encoding']} | Delimitador: {repr(config['sep'])}")
+        with metricas.etapa('leitura'):
+            df = pd.read_csv(caminho_csv, sep=config['sep'], encoding=config['encoding'])
+        metricas.contar('linhas_lidas', len(df))
         print(f"📊 CSV lido: {len(df)} municípios encontrados")
         
         # Verificar estrutura
         print("📋 Primeiras linhas do CSV:")
         print(df.head())
         
-        # Conectar ao banco e inserir
+        # Query de inserção
+        insert_query = """
+            INSERT INTO trampo.municipios_rj (ID, NOME)
+            VALUES (%s, %s)
+        """
+        
+        # Inserir municípios em lotes; a tabela existente é limpa na mesma
+        # transação do primeiro lote, então uma falha não a deixa vazia
+        limpar_tabela = [("DELETE FROM trampo.municipios_rj", ())]
+        with InseridorEmLote(insert_query, tamanho_lote=tamanho_lote, metricas=metricas,
+                             comandos_iniciais=limpar_tabela) as inseridor:
+            for id_municipio, nome in zip(df['id'], df['MUNICIPIO_VENDA']):
+                inseridor.adicionar((int(id_municipio), nome))
+        print("🗑️  Tabela substituída")
+        
+        registros_inseridos = inseridor.registros_inseridos
+        erros = inseridor.erros
+        estatisticas_insercao = inseridor.obter_estatisticas()
+        
         with get_db_cursor() as cursor:
-            # Limpar tabela existente (opcional)
-            cursor.execute("DELETE FROM trampo.municipios_rj")
-            print("🗑️  Tabela limpa")
-            
-            # Query de inserção
-            insert_query = """
-                INSERT INTO trampo.municipios_rj (ID, NOME)
-                VALUES (%s, %s)
-            """
-            
-            registros_inseridos = 0
-            erros = []
-            
-            # Inserir cada município
-            for index, row in df.iterrows():
-                try:
-                    cursor.execute(insert_query, (int(row['id']), row['MUNICIPIO_VENDA']))
-                    registros_inseridos += 1
-                    
-                    # Mostrar progresso a cada 10 registros
-                    if registros_inseridos % 10 == 0:
-                        print(f"📝 Inseridos: {registros_inseridos}/{len(df)}")
-                        
-                except Exception as e:
-                    erro_msg = f"❌ Erro ao inserir {row['id']} - {row['MUNICIPIO_VENDA']}: {e}"
-                    erros.append(erro_msg)
-                    print(erro_msg)
-            
             print(f"\n✅ INSERÇÃO CONCLUÍDA")
             print(f"📈 Registros inseridos: {registros_inseridos}/{len(df)}")
+            print(f"⚡ Vazão: {estatisticas_insercao['registros_por_segundo']:,.0f} registros/s")
             
             if erros:
                 print(f"⚠️  Erros encontrados: {len(erros)}")
@@ -89,7 +91,8 @@ def inserir_municipios_rj():
                 "status": "success",
                 "registros_inseridos": registros_inseridos,
                 "total_tabela": total_tabela,
-                "erros": len(erros)
+                "erros": len(erros),
+                "registros_por_segundo": estatisticas_insercao['registros_por_segundo']
             }
             
     except Exception as e:
@@ -101,8 +104,21 @@ def inserir_municipios_rj():
             "message": str(e)
         }
 
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Insere os municípios do RJ em trampo.municipios_rj")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE_PADRAO,
+                        help=f"registros por INSERT/commit (padrão: {TAMANHO_LOTE_PADRAO})")
+    adicionar_argumentos(parser)
+    args = parser.parse_args()
+    definir_verbosidade(nivel_dos_argumentos(args.verbose, args.quiet))
+    
+    print("🚀 INICIANDO SCRIPT DE INSERÇÃO DE MUNICÍPIOS")
+    metricas = Metricas('inserir_municipios_rj')
+    resultado = inserir_municipios_rj(args.tamanho_lote, metricas)
+    metricas.emitir(jsonl=args.metricas_jsonl, prometheus=args.metricas_prometheus)
+    print(f"\n🎯 RESULTADO FINAL: {resultado}")
+
 # Executar
 if __name__ == "__main__":
-    print("🚀 INICIANDO SCRIPT DE INSERÇÃO DE MUNICÍPIOS")
-    resultado = inserir_municipios_rj()
-    print(f"\n🎯 RESULTADO FINAL: {resultado}")
\ No newline at end of file
+    main()
\ No newline at end of file
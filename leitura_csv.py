@@ -0,0 +1,232 @@
+"""
+Leitura dos arquivos EDA_Industrializados do lago de dados
+"""
+import json
+import os
+import re
+import time
+
+import pandas as pd
+
+DIRETORIO_LAGO = "D:\\LagoDeDados\\medicamentos\\medicamentos_venda"
+
+# EDA_Industrializados_YYYYMM.csv
+PADRAO_ARQUIVO = re.compile(r'^EDA_Industrializados_(\d{4})(\d{2})\.csv$', re.IGNORECASE)
+
+ENCODING_PADRAO = 'latin-1'
+DELIMITADORES = [';', '\t', ',', '|']
+BYTES_AMOSTRA = 64 * 1024  # quanto do início do arquivo é lido para detectar o formato
+
+# Cache dos formatos detectados: memória + JSON em disco, chave (caminho, tamanho, mtime)
+CAMINHO_CACHE_FORMATOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache_formatos_csv.json')
+_cache_formatos = None
+
+# Colunas da tabela vendas_medicamentos + UF_VENDA (usada apenas no filtro)
+COLUNAS_NECESSARIAS = [
+    'ANO_VENDA',
+    'MES_VENDA',
+    'UF_VENDA',
+    'PRINCIPIO_ATIVO',
+    'MUNICIPIO_VENDA',
+    'QTD_VENDIDA',
+    'CONSELHO_PRESCRITOR',
+    'UF_CONSELHO_PRESCRITOR',
+]
+
+
+def extrair_ano_mes(nome_arquivo):
+    """Retorna (ano, mes) a partir do nome do arquivo, ou None se não casar com o padrão"""
+    correspondencia = PADRAO_ARQUIVO.match(os.path.basename(nome_arquivo))
+    if not correspondencia:
+        return None
+    ano, mes = int(correspondencia.group(1)), int(correspondencia.group(2))
+    if not 1 <= mes <= 12:
+        return None
+    return ano, mes
+
+
+def descobrir_arquivos(diretorio=DIRETORIO_LAGO):
+    """Lista os arquivos mensais do diretório como dicts {caminho, arquivo, ano, mes}, em ordem cronológica"""
+    arquivos = []
+    for nome in os.listdir(diretorio):
+        ano_mes = extrair_ano_mes(nome)
+        if ano_mes is None:
+            continue
+        arquivos.append({
+            'caminho': os.path.join(diretorio, nome),
+            'arquivo': nome,
+            'ano': ano_mes[0],
+            'mes': ano_mes[1],
+        })
+    return sorted(arquivos, key=lambda item: (item['ano'], item['mes']))
+
+
+def _detectar_encoding(amostra, final=b''):
+    """Encoding a partir de uma amostra do início e outra do fim do arquivo
+
+    - BOM no início: utf-8-sig
+    - as duas amostras só com ASCII: ENCODING_PADRAO (latin-1). Qualquer byte
+      é latin-1 válido, então um acento no meio do arquivo não quebra a
+      leitura (o formato original do lago é latin-1)
+    - bytes não ASCII que decodificam como UTF-8 nas duas amostras: utf-8
+    - senão: latin-1
+    """
+    if amostra.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    if amostra.isascii() and final.isascii():
+        return ENCODING_PADRAO
+    try:
+        amostra.decode('utf-8')
+        final.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return ENCODING_PADRAO
+
+
+def _detectar_delimitador(linhas):
+    """Escolhe o delimitador a partir das primeiras linhas
+
+    Preferência para o delimitador que separa UF_VENDA no cabeçalho; senão, o
+    que aparece o mesmo número de vezes (> 0) em todas as linhas da amostra.
+    """
+    if not linhas:
+        return None
+
+    cabecalho = linhas[0]
+    for delimitador in DELIMITADORES:
+        colunas = [coluna.strip().strip('"') for coluna in cabecalho.split(delimitador)]
+        if 'UF_VENDA' in colunas:
+            return delimitador
+
+    melhor, melhor_contagem = None, 0
+    for delimitador in DELIMITADORES:
+        contagens = {linha.count(delimitador) for linha in linhas}
+        contagem = cabecalho.count(delimitador)
+        if len(contagens) == 1 and contagem > melhor_contagem:
+            melhor, melhor_contagem = delimitador, contagem
+    return melhor
+
+
+def _chave_cache(caminho):
+    estado = os.stat(caminho)
+    return f"{os.path.abspath(caminho)}|{estado.st_size}|{estado.st_mtime_ns}"
+
+
+def configurar_cache_formatos(caminho):
+    """Troca o arquivo do cache de formatos (ex.: um diretório temporário), descartando o cache em memória"""
+    global CAMINHO_CACHE_FORMATOS, _cache_formatos
+    CAMINHO_CACHE_FORMATOS = caminho
+    _cache_formatos = None
+
+
+def _carregar_cache():
+    global _cache_formatos
+    if _cache_formatos is None:
+        try:
+            with open(CAMINHO_CACHE_FORMATOS, 'r', encoding='utf-8') as arquivo:
+                _cache_formatos = json.load(arquivo)
+        except (OSError, ValueError):
+            _cache_formatos = {}
+    return _cache_formatos
+
+
+def _salvar_cache():
+    try:
+        with open(CAMINHO_CACHE_FORMATOS, 'w', encoding='utf-8') as arquivo:
+            json.dump(_cache_formatos, arquivo, ensure_ascii=False)
+    except OSError:
+        pass  # o cache em disco é só uma otimização
+
+
+def detectar_formato(caminho, bytes_amostra=BYTES_AMOSTRA, usar_cache=True):
+    """Detecta delimitador e encoding lendo só o início e o fim do arquivo
+
+    O delimitador vem do início; o encoding, do início e do fim (ver
+    `_detectar_encoding`: amostras só com ASCII dão latin-1). Retorna a
+    configuração de leitura como dict:
+        {'sep': ';', 'encoding': 'latin-1', 'colunas': [...]}
+    ou None se o delimitador não puder ser detectado. O resultado fica em
+    cache por (caminho, tamanho, mtime), em memória e em disco.
+    """
+    cache = _carregar_cache() if usar_cache else {}
+    chave = _chave_cache(caminho)
+    if chave in cache:
+        return dict(cache[chave])
+
+    with open(caminho, 'rb') as arquivo:
+        amostra = arquivo.read(bytes_amostra)
+        final = b''
+        tamanho = os.fstat(arquivo.fileno()).st_size
+        if tamanho > bytes_amostra:
+            arquivo.seek(max(bytes_amostra, tamanho - bytes_amostra))
+            final = arquivo.read()
+            # Descartar o começo da amostra final, que pode cortar um caractere multibyte
+            if b'\n' in final:
+                final = final[final.index(b'\n') + 1:]
+
+    # Descartar a última linha, que pode ter sido cortada no meio
+    if len(amostra) == bytes_amostra and b'\n' in amostra:
+        amostra = amostra[:amostra.rindex(b'\n')]
+
+    encoding = _detectar_encoding(amostra, final)
+    linhas = [linha for linha in amostra.decode(encoding).splitlines() if linha.strip()]
+    delimitador = _detectar_delimitador(linhas)
+    if delimitador is None:
+        return None
+
+    config = {
+        'sep': delimitador,
+        'encoding': encoding,
+        'colunas': [coluna.strip().strip('"') for coluna in linhas[0].split(delimitador)],
+    }
+
+    if usar_cache:
+        cache[chave] = config
+        _salvar_cache()
+    return dict(config)
+
+
+def detectar_delimitador(caminho):
+    """Atalho: só o delimitador de `detectar_formato`"""
+    config = detectar_formato(caminho)
+    return config['sep'] if config else None
+
+
+def ler_em_blocos(caminho, config, tamanho_bloco, uf='RJ', metricas=None):
+    """Lê o arquivo em blocos, mantendo apenas as linhas da UF e as colunas necessárias
+
+    `config` é o dict retornado por `detectar_formato`. Gerador de
+    (bloco_uf, linhas_lidas_no_bloco): a memória fica limitada ao tamanho de
+    um bloco, qualquer que seja o tamanho do arquivo. Com uma lista de UFs
+    em `uf`, a coluna UF_VENDA é mantida no bloco. Com `metricas`, o tempo
+    de leitura e o do filtro de UF vão para as etapas 'leitura' e 'filtro'.
+    """
+    leitor = pd.read_csv(caminho,
+                         sep=config['sep'],
+                         encoding=config['encoding'],
+                         usecols=COLUNAS_NECESSARIAS,
+                         dtype=str,
+                         chunksize=tamanho_bloco)
+
+    if isinstance(uf, str):
+        filtrar = lambda bloco: bloco[bloco['UF_VENDA'] == uf].drop(columns='UF_VENDA')
+    else:
+        ufs = list(uf)
+        filtrar = lambda bloco: bloco[bloco['UF_VENDA'].isin(ufs)]
+
+    if metricas is None:
+        for bloco in leitor:
+            yield filtrar(bloco), len(bloco)
+        return
+
+    while True:
+        inicio = time.perf_counter()
+        bloco = next(leitor, None)
+        if bloco is None:
+            return
+        metricas.registrar('leitura', time.perf_counter() - inicio)
+        with metricas.etapa('filtro'):
+            bloco_uf = filtrar(bloco)
+        metricas.contar('linhas_lidas', len(bloco))
+        metricas.contar('linhas_uf', len(bloco_uf))
+        yield bloco_uf, len(bloco)
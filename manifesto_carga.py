@@ -0,0 +1,133 @@
+"""
+Manifesto de carga: estado de cada arquivo CSV carregado em vendas_medicamentos
+
+Cada lote gravado atualiza REGISTROS_GRAVADOS na mesma transação dos INSERTs,
+então depois de uma queda o manifesto diz exatamente de onde retomar.
+"""
+import hashlib
+import os
+import sys
+
+# Adicionar o diretório atual ao path para importar meuDB
+sys.path.append(os.path.dirname(__file__))
+
+TABELA_MANIFESTO = "trampo.manifesto_carga"
+
+STATUS_EM_ANDAMENTO = 'em_andamento'
+STATUS_CONCLUIDO = 'concluido'
+
+DDL_MANIFESTO = f"""
+    CREATE TABLE IF NOT EXISTS {TABELA_MANIFESTO} (
+        ARQUIVO varchar(100) NOT NULL,
+        ANO_VENDA int NOT NULL,
+        MES_VENDA int NOT NULL,
+        CHECKSUM char(64) NOT NULL,
+        TAMANHO_BYTES bigint NOT NULL,
+        MTIME_NS bigint NOT NULL,
+        REGISTROS_GRAVADOS bigint NOT NULL DEFAULT 0,
+        TOTAL_REGISTROS bigint DEFAULT NULL,
+        STATUS varchar(20) NOT NULL,
+        ATUALIZADO_EM timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (ARQUIVO)
+    )
+"""
+
+
+def calcular_checksum(caminho, tamanho_bloco=8 * 1024 * 1024):
+    """SHA-256 do arquivo, lido em blocos"""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def arquivo_inalterado(entrada, caminho):
+    """Compara tamanho e mtime do arquivo com os registrados no manifesto"""
+    estado = os.stat(caminho)
+    return entrada['TAMANHO_BYTES'] == estado.st_size and entrada['MTIME_NS'] == estado.st_mtime_ns
+
+
+class ManifestoCarga:
+    """Leitura e escrita do manifesto de carga"""
+
+    def __init__(self, tabela=TABELA_MANIFESTO):
+        self.tabela = tabela
+
+    def criar_tabela(self):
+        """Cria a tabela do manifesto se ainda não existir"""
+        from meuDB import get_db_cursor
+        with get_db_cursor() as cursor:
+            cursor.execute(DDL_MANIFESTO.replace(TABELA_MANIFESTO, self.tabela))
+
+    def obter_todos(self):
+        """Retorna {arquivo: entrada} com todas as entradas do manifesto"""
+        from meuDB import get_db_cursor
+        with get_db_cursor(dictionary=True) as cursor:
+            cursor.execute(f"""
+                SELECT ARQUIVO, ANO_VENDA, MES_VENDA, CHECKSUM, TAMANHO_BYTES, MTIME_NS,
+                       REGISTROS_GRAVADOS, TOTAL_REGISTROS, STATUS
+                FROM {self.tabela}
+            """)
+            return {entrada['ARQUIVO']: entrada for entrada in cursor.fetchall()}
+
+    def obter(self, arquivo):
+        """Retorna a entrada de um arquivo ou None"""
+        from meuDB import get_db_cursor
+        with get_db_cursor(dictionary=True) as cursor:
+            cursor.execute(f"""
+                SELECT ARQUIVO, ANO_VENDA, MES_VENDA, CHECKSUM, TAMANHO_BYTES, MTIME_NS,
+                       REGISTROS_GRAVADOS, TOTAL_REGISTROS, STATUS
+                FROM {self.tabela}
+                WHERE ARQUIVO = %s
+            """, (arquivo,))
+            return cursor.fetchone()
+
+    def registrar_inicio(self, arquivo, caminho, ano, mes, checksum):
+        """Cria (ou reabre) a entrada do arquivo como em andamento
+
+        REGISTROS_GRAVADOS de uma entrada existente é preservado para a retomada.
+        """
+        from meuDB import get_db_cursor
+        estado = os.stat(caminho)
+        with get_db_cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {self.tabela}
+                (ARQUIVO, ANO_VENDA, MES_VENDA, CHECKSUM, TAMANHO_BYTES, MTIME_NS,
+                 REGISTROS_GRAVADOS, STATUS)
+                VALUES (%s, %s, %s, %s, %s, %s, 0, %s)
+                ON DUPLICATE KEY UPDATE
+                    CHECKSUM = VALUES(CHECKSUM),
+                    TAMANHO_BYTES = VALUES(TAMANHO_BYTES),
+                    MTIME_NS = VALUES(MTIME_NS),
+                    STATUS = VALUES(STATUS)
+            """, (arquivo, ano, mes, checksum, estado.st_size, estado.st_mtime_ns, STATUS_EM_ANDAMENTO))
+
+    def remover(self, arquivo):
+        """Apaga a entrada do arquivo (recarga do zero)"""
+        from meuDB import get_db_cursor
+        with get_db_cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.tabela} WHERE ARQUIVO = %s", (arquivo,))
+
+    def comando_progresso(self, arquivo, registros_gravados):
+        """(sql, parametros) que registra o offset do último lote; executar no commit do lote"""
+        return (f"UPDATE {self.tabela} SET REGISTROS_GRAVADOS = %s WHERE ARQUIVO = %s",
+                (registros_gravados, arquivo))
+
+    def comando_conclusao(self, arquivo, total_registros):
+        """(sql, parametros) que marca o arquivo como concluído"""
+        return (f"UPDATE {self.tabela} SET REGISTROS_GRAVADOS = %s, TOTAL_REGISTROS = %s, STATUS = %s "
+                f"WHERE ARQUIVO = %s",
+                (total_registros, total_registros, STATUS_CONCLUIDO, arquivo))
+
+
+def pular_registros(registros, posicao, offset):
+    """Descarta os registros já gravados numa carga anterior
+
+    `posicao` é o índice (na sequência normalizada do arquivo) do primeiro
+    registro de `registros`. Retorna (registros_restantes, posicao_do_primeiro).
+    """
+    if posicao >= offset:
+        return registros, posicao
+    inicio = min(len(registros), offset - posicao)
+    return registros[inicio:], posicao + inicio
@@ -0,0 +1,186 @@
+"""
+Métricas estruturadas da carga e do agrupamento: tempo por etapa, contagens e rejeições
+
+Um `Metricas` acumula o tempo e o número de execuções de cada etapa
+(leitura, filtro, normalizacao, insercao, commit, consulta, fetch,
+concatenacao, serializacao) e contadores (linhas lidas, gravadas,
+rejeitadas por motivo...). No fim da execução ele é gravado como uma linha
+JSON (um objeto por execução, acrescentado ao arquivo) ou como um arquivo
+texto no formato do Prometheus (para o textfile collector do node_exporter).
+
+A verbosidade do console também fica aqui: as mensagens por linha, por
+lote ou por município só aparecem com nível DETALHADO (-v nos scripts),
+porque na granularidade de progresso da carga o próprio print pesa no laço.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+ETAPAS = ('leitura', 'filtro', 'normalizacao', 'insercao', 'commit',
+          'consulta', 'fetch', 'concatenacao', 'serializacao')
+
+PREFIXO_PROMETHEUS = 'vendas_medicamentos'
+
+SILENCIOSO = 0  # só erros e o resumo final
+NORMAL = 1  # etapas e blocos
+DETALHADO = 2  # cada lote, consulta e município
+_nivel_verbosidade = NORMAL
+
+
+def definir_verbosidade(nivel):
+    """Nível de mensagens no console (SILENCIOSO, NORMAL ou DETALHADO)"""
+    global _nivel_verbosidade
+    _nivel_verbosidade = max(SILENCIOSO, min(DETALHADO, int(nivel)))
+
+
+def verbosidade():
+    return _nivel_verbosidade
+
+
+def detalhado():
+    """True se as mensagens por lote/consulta devem aparecer"""
+    return _nivel_verbosidade >= DETALHADO
+
+
+def nivel_dos_argumentos(verbose=0, quiet=False):
+    """Nível a partir de -v (contagem) e -q dos argparse dos scripts"""
+    return SILENCIOSO if quiet else NORMAL + verbose
+
+
+def adicionar_argumentos(parser):
+    """Acrescenta -v/-q e os destinos das métricas a um ArgumentParser"""
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="mostra cada lote, consulta e município")
+    parser.add_argument("-q", "--quiet", action="store_true", help="só erros e o resumo final")
+    parser.add_argument("--metricas-jsonl", metavar="ARQUIVO", default=None,
+                        help="acrescenta as métricas da execução como uma linha JSON")
+    parser.add_argument("--metricas-prometheus", metavar="ARQUIVO", default=None,
+                        help="grava as métricas no formato texto do Prometheus")
+
+
+def _rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metricas:
+    """Tempos por etapa e contadores de uma execução (seguro entre threads)
+
+    Uso:
+        metricas = Metricas('carga', arquivo='EDA_Industrializados_201601.csv')
+        with metricas.etapa('leitura'):
+            ...
+        metricas.contar('linhas_lidas', len(bloco))
+        metricas.emitir(jsonl='metricas.jsonl')
+    """
+
+    def __init__(self, processo, **rotulos):
+        self.processo = processo
+        self.rotulos = rotulos
+        self.inicio = time.time()
+        self.tempos = {}  # etapa -> segundos
+        self.execucoes = {}  # etapa -> vezes
+        self.contadores = {}
+        self.rejeicoes = {}  # motivo -> linhas descartadas
+        self._trava = threading.Lock()
+
+    @contextmanager
+    def etapa(self, nome):
+        """Soma o tempo do bloco na etapa `nome`"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, time.perf_counter() - inicio)
+
+    def registrar(self, nome, segundos, vezes=1):
+        """Soma `segundos` (medidos fora de um `etapa`) na etapa `nome`"""
+        with self._trava:
+            self.tempos[nome] = self.tempos.get(nome, 0.0) + segundos
+            self.execucoes[nome] = self.execucoes.get(nome, 0) + vezes
+
+    def contar(self, nome, quantidade=1):
+        with self._trava:
+            self.contadores[nome] = self.contadores.get(nome, 0) + quantidade
+
+    def registrar_rejeicoes(self, rejeicoes):
+        """Soma um dict motivo -> quantidade (o de normalizar_bloco)"""
+        with self._trava:
+            for motivo, quantidade in rejeicoes.items():
+                self.rejeicoes[motivo] = self.rejeicoes.get(motivo, 0) + quantidade
+
+    def como_dict(self):
+        """Execução em tipos nativos (o objeto de cada linha do JSON lines)"""
+        with self._trava:
+            return {
+                "processo": self.processo,
+                "rotulos": dict(self.rotulos),
+                "inicio": datetime.fromtimestamp(self.inicio).isoformat(),
+                "duracao_s": round(time.time() - self.inicio, 4),
+                "etapas": {nome: {"segundos": round(self.tempos[nome], 4), "execucoes": self.execucoes[nome]}
+                           for nome in sorted(self.tempos, key=_ordem_etapa)},
+                "contadores": dict(self.contadores),
+                "rejeicoes": dict(self.rejeicoes),
+            }
+
+    def texto_prometheus(self, prefixo=PREFIXO_PROMETHEUS):
+        """Métricas no formato de exposição texto do Prometheus"""
+        dados = self.como_dict()
+        base = {"processo": self.processo, **self.rotulos}
+
+        def serie(nome, valor, **extras):
+            rotulos = ','.join(f'{chave}="{_rotulo(valor_rotulo)}"'
+                               for chave, valor_rotulo in {**base, **extras}.items())
+            return f"{prefixo}_{nome}{{{rotulos}}} {valor}"
+
+        linhas = [f"# HELP {prefixo}_etapa_segundos_total Tempo acumulado em cada etapa",
+                  f"# TYPE {prefixo}_etapa_segundos_total counter"]
+        linhas += [serie("etapa_segundos_total", etapa["segundos"], etapa=nome)
+                   for nome, etapa in dados["etapas"].items()]
+        linhas += [f"# HELP {prefixo}_etapa_execucoes_total Vezes que cada etapa rodou",
+                   f"# TYPE {prefixo}_etapa_execucoes_total counter"]
+        linhas += [serie("etapa_execucoes_total", etapa["execucoes"], etapa=nome)
+                   for nome, etapa in dados["etapas"].items()]
+        for nome, valor in dados["contadores"].items():
+            linhas += [f"# TYPE {prefixo}_{nome}_total counter", serie(f"{nome}_total", valor)]
+        if dados["rejeicoes"]:
+            linhas += [f"# HELP {prefixo}_rejeitados_total Linhas descartadas na normalização",
+                       f"# TYPE {prefixo}_rejeitados_total counter"]
+            linhas += [serie("rejeitados_total", valor, motivo=motivo) for motivo, valor in dados["rejeicoes"].items()]
+        linhas += [f"# TYPE {prefixo}_duracao_segundos gauge", serie("duracao_segundos", dados["duracao_s"]),
+                   f"# TYPE {prefixo}_inicio_timestamp_segundos gauge",
+                   serie("inicio_timestamp_segundos", round(self.inicio, 3))]
+        return '\n'.join(linhas) + '\n'
+
+    def gravar_jsonl(self, caminho):
+        """Acrescenta a execução como uma linha em `caminho`"""
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        with open(caminho, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps(self.como_dict(), ensure_ascii=False) + '\n')
+
+    def gravar_prometheus(self, caminho, prefixo=PREFIXO_PROMETHEUS):
+        """Substitui `caminho` pelo texto do Prometheus (atômico: o coletor nunca lê pela metade)"""
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(self.texto_prometheus(prefixo))
+        os.replace(temporario, caminho)
+
+    def emitir(self, jsonl=None, prometheus=None):
+        """Grava nos destinos informados (os dois são opcionais)"""
+        if jsonl:
+            self.gravar_jsonl(jsonl)
+        if prometheus:
+            self.gravar_prometheus(prometheus)
+
+    def resumo(self):
+        """Uma linha por etapa, para o console"""
+        with self._trava:
+            etapas = sorted(self.tempos.items(), key=lambda item: _ordem_etapa(item[0]))
+        return [f"{nome}: {segundos:.2f}s" for nome, segundos in etapas]
+
+
+def _ordem_etapa(nome):
+    return (ETAPAS.index(nome), nome) if nome in ETAPAS else (len(ETAPAS), nome)
@@ -0,0 +1,104 @@
+"""
+Normalização vetorizada dos registros de venda (operações por coluna, sem iterrows)
+"""
+import numpy as np
+import pandas as pd
+
+# Colunas da tabela vendas_medicamentos, na ordem dos INSERTs/LOAD DATA
+COLUNAS_VENDAS = (
+    'ANO_VENDA',
+    'MES_VENDA',
+    'PRINCIPIO_ATIVO',
+    'MUNICIPIO_VENDA',
+    'QTD_VENDIDA',
+    'CONSELHO_PRESCRITOR',
+    'UF_CONSELHO_PRESCRITOR',
+)
+
+# Colunas de vendas_medicamentos_uf (vários estados): UF_VENDA na frente
+COLUNAS_VENDAS_UF = ('UF_VENDA',) + COLUNAS_VENDAS
+
+# Tamanhos máximos dos varchar da tabela
+TAMANHOS_COLUNAS = {
+    'PRINCIPIO_ATIVO': 255,
+    'MUNICIPIO_VENDA': 100,
+    'CONSELHO_PRESCRITOR': 50,
+    'UF_CONSELHO_PRESCRITOR': 2,
+}
+
+MOTIVO_MUNICIPIO_INVALIDO = 'municipio_invalido'
+MOTIVO_QTD_INVALIDA = 'qtd_invalida'
+
+
+def _texto_truncado(serie, tamanho):
+    """NaN vira '' e o texto é cortado no tamanho da coluna"""
+    return serie.astype(object).where(serie.notna(), '').astype(str).str.slice(0, tamanho)
+
+
+def normalizar_bloco(df, ano, mes, municipios_validos, rejeicoes=None):
+    """Aplica a limpeza de inserir_dados em colunas inteiras
+
+    - MUNICIPIO_VENDA: strip + upper, validado com isin(municipios_validos)
+      (com a coluna UF_VENDA no bloco, `municipios_validos` é um dict
+      {uf: nomes} e o município é validado dentro da própria UF)
+    - PRINCIPIO_ATIVO / CONSELHO_PRESCRITOR / UF_CONSELHO_PRESCRITOR: NaN -> '' e truncados
+    - QTD_VENDIDA: vírgula decimal -> ponto, truncada para inteiro; NaN -> 0
+
+    Retorna um DataFrame com as colunas de COLUNAS_VENDAS (COLUNAS_VENDAS_UF
+    quando o bloco tem UF_VENDA). As linhas
+    descartadas são somadas em `rejeicoes` (dict motivo -> quantidade).
+    """
+    if rejeicoes is None:
+        rejeicoes = {}
+
+    municipio = df['MUNICIPIO_VENDA'].astype('string').str.strip().str.upper()
+    por_uf = 'UF_VENDA' in df.columns
+    if por_uf:
+        uf = df['UF_VENDA'].astype('string').str.strip().str.upper()
+        chaves_validas = {f"{sigla}|{nome}" for sigla, nomes in municipios_validos.items() for nome in nomes}
+        municipio_valido = (uf + '|' + municipio).isin(chaves_validas).fillna(False).to_numpy(dtype=bool)
+    else:
+        municipio_valido = municipio.isin(municipios_validos).fillna(False).to_numpy(dtype=bool)
+
+    qtd_texto = df['QTD_VENDIDA'].astype('string').str.strip()
+    qtd_ausente = qtd_texto.isna().to_numpy()
+    qtd = pd.to_numeric(qtd_texto.str.replace(',', '.', regex=False), errors='coerce').to_numpy(dtype='float64')
+    qtd_valida = qtd_ausente | np.isfinite(qtd)
+
+    rejeitados_municipio = int((~municipio_valido).sum())
+    rejeitados_qtd = int((municipio_valido & ~qtd_valida).sum())
+    if rejeitados_municipio:
+        rejeicoes[MOTIVO_MUNICIPIO_INVALIDO] = rejeicoes.get(MOTIVO_MUNICIPIO_INVALIDO, 0) + rejeitados_municipio
+    if rejeitados_qtd:
+        rejeicoes[MOTIVO_QTD_INVALIDA] = rejeicoes.get(MOTIVO_QTD_INVALIDA, 0) + rejeitados_qtd
+
+    mascara = municipio_valido & qtd_valida
+    qtd = np.where(qtd_ausente, 0.0, qtd)[mascara]
+
+    colunas = {'UF_VENDA': uf[mascara].astype(str).to_numpy()} if por_uf else {}
+    colunas.update({
+        'ANO_VENDA': np.full(int(mascara.sum()), ano, dtype='int64'),
+        'MES_VENDA': np.full(int(mascara.sum()), mes, dtype='int64'),
+        'PRINCIPIO_ATIVO': _texto_truncado(df['PRINCIPIO_ATIVO'][mascara], TAMANHOS_COLUNAS['PRINCIPIO_ATIVO']).to_numpy(),
+        'MUNICIPIO_VENDA': municipio[mascara].astype(str).str.slice(0, TAMANHOS_COLUNAS['MUNICIPIO_VENDA']).to_numpy(),
+        'QTD_VENDIDA': np.trunc(qtd).astype('int64'),
+        'CONSELHO_PRESCRITOR': _texto_truncado(df['CONSELHO_PRESCRITOR'][mascara], TAMANHOS_COLUNAS['CONSELHO_PRESCRITOR']).to_numpy(),
+        'UF_CONSELHO_PRESCRITOR': _texto_truncado(df['UF_CONSELHO_PRESCRITOR'][mascara], TAMANHOS_COLUNAS['UF_CONSELHO_PRESCRITOR']).to_numpy(),
+    })
+    return pd.DataFrame(colunas, columns=list(COLUNAS_VENDAS_UF if por_uf else COLUNAS_VENDAS))
+
+
+def para_registros(df, colunas=COLUNAS_VENDAS):
+    """Converte o DataFrame normalizado em tuplas com tipos nativos do Python
+
+    `tolist()` devolve int/str do Python, que o conector MySQL aceita
+    (ao contrário de numpy.int64).
+    """
+    return list(zip(*(df[coluna].tolist() for coluna in colunas)))
+
+
+def formatar_rejeicoes(rejeicoes):
+    """Texto curto com as rejeições por motivo"""
+    if not rejeicoes:
+        return "nenhuma"
+    return ", ".join(f"{motivo}: {quantidade:,}" for motivo, quantidade in sorted(rejeicoes.items()))
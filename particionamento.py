@@ -0,0 +1,224 @@
+"""
+Particionamento por RANGE de vendas_medicamentos (por ano ou por ano/mês)
+
+Com uma partição por mês, recarregar um mês é um TRUNCATE PARTITION em vez
+de um DELETE linha a linha, e toda consulta com WHERE ANO_VENDA = ... lê só
+as partições daquele ano (pruning do MySQL). A última partição (pmax)
+recebe o que ainda não tem partição própria; antes de cada carga a partição
+do mês é criada a partir dela.
+
+Uso:
+    python particionamento.py --listar
+    python particionamento.py --particionar --granularidade mes --ano-inicial 2014 --ano-final 2021
+    python particionamento.py --particionar --tabela trampo.vendas_medicamentos_cod
+"""
+import argparse
+import os
+import sys
+import time
+
+# Adicionar o diretório atual ao path para importar meuDB
+sys.path.append(os.path.dirname(__file__))
+
+from meuDB import get_db_cursor
+
+TABELA_VENDAS = "trampo.vendas_medicamentos"
+GRANULARIDADES_PARTICAO = ('ano', 'mes')
+PARTICAO_ANTERIOR = 'panterior'
+PARTICAO_MAXIMA = 'pmax'
+
+
+def nome_particao(ano, mes=None):
+    """p2016 (por ano) ou p201601 (por mês)"""
+    return f"p{ano}" if mes is None else f"p{ano}{mes:02d}"
+
+
+def _definicao(ano, mes=None):
+    """PARTITION ... VALUES LESS THAN do ano (ou mês) seguinte"""
+    if mes is None:
+        return f"PARTITION {nome_particao(ano)} VALUES LESS THAN ({ano + 1})"
+    limite = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return f"PARTITION {nome_particao(ano, mes)} VALUES LESS THAN {limite}"
+
+
+def clausula_particionamento(granularidade, ano_inicial, ano_final):
+    """PARTITION BY RANGE COLUMNS com uma partição por ano/mês entre os anos informados"""
+    if granularidade not in GRANULARIDADES_PARTICAO:
+        raise ValueError(f"Granularidade inválida: {granularidade} "
+                         f"(opções: {', '.join(GRANULARIDADES_PARTICAO)})")
+    if granularidade == 'mes':
+        colunas = "ANO_VENDA, MES_VENDA"
+        anterior = f"PARTITION {PARTICAO_ANTERIOR} VALUES LESS THAN ({ano_inicial}, 1)"
+        definicoes = [_definicao(ano, mes) for ano in range(ano_inicial, ano_final + 1) for mes in range(1, 13)]
+        maxima = f"PARTITION {PARTICAO_MAXIMA} VALUES LESS THAN (MAXVALUE, MAXVALUE)"
+    else:
+        colunas = "ANO_VENDA"
+        anterior = f"PARTITION {PARTICAO_ANTERIOR} VALUES LESS THAN ({ano_inicial})"
+        definicoes = [_definicao(ano) for ano in range(ano_inicial, ano_final + 1)]
+        maxima = f"PARTITION {PARTICAO_MAXIMA} VALUES LESS THAN (MAXVALUE)"
+    particoes = ",\n        ".join([anterior] + definicoes + [maxima])
+    return f"PARTITION BY RANGE COLUMNS ({colunas}) (\n        {particoes}\n    )"
+
+
+class GerenciadorParticoes:
+    """Consulta e mantém as partições de uma tabela de vendas (detalhe ou codificada)
+
+    O MySQL exige a coluna de partição em toda chave única, então a chave
+    primária passa a ser (indice_global, ANO_VENDA, MES_VENDA).
+    """
+
+    def __init__(self, tabela=TABELA_VENDAS):
+        self.tabela = tabela
+        self.esquema, self.nome_tabela = tabela.split('.', 1)
+        self._particoes = None
+
+    def obter_particoes(self):
+        """Lista de {nome, expressao, limite, linhas} (vazia se a tabela não for particionada)"""
+        if self._particoes is None:
+            with get_db_cursor(dictionary=True) as cursor:
+                cursor.execute("""
+                    SELECT PARTITION_NAME, PARTITION_EXPRESSION, PARTITION_DESCRIPTION, TABLE_ROWS
+                    FROM information_schema.PARTITIONS
+                    WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+                    ORDER BY PARTITION_ORDINAL_POSITION
+                """, (self.esquema, self.nome_tabela))
+                self._particoes = [{"nome": linha['PARTITION_NAME'], "expressao": linha['PARTITION_EXPRESSION'],
+                                    "limite": linha['PARTITION_DESCRIPTION'], "linhas": linha['TABLE_ROWS']}
+                                   for linha in cursor.fetchall()]
+        return self._particoes
+
+    @property
+    def particionada(self):
+        return bool(self.obter_particoes())
+
+    @property
+    def granularidade(self):
+        """'mes', 'ano' ou None (sem partições)"""
+        particoes = self.obter_particoes()
+        if not particoes:
+            return None
+        return 'mes' if 'MES_VENDA' in (particoes[0]['expressao'] or '') else 'ano'
+
+    def particionar(self, granularidade='mes', ano_inicial=2014, ano_final=2021):
+        """Converte a tabela para RANGE COLUMNS (uma cópia da tabela inteira; rodar uma vez)"""
+        print(f"🔧 Particionando {self.tabela} por {granularidade} ({ano_inicial}-{ano_final})...")
+        inicio = time.time()
+        with get_db_cursor(dictionary=True) as cursor:
+            cursor.execute("""
+                SELECT COLUMN_NAME, COLUMN_TYPE
+                FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND COLUMN_NAME IN ('ANO_VENDA', 'MES_VENDA')
+            """, (self.esquema, self.nome_tabela))
+            tipos = {linha['COLUMN_NAME']: linha['COLUMN_TYPE'] for linha in cursor.fetchall()}
+            # Colunas de partição não podem ser nulas para o TRUNCATE do mês ser exato
+            cursor.execute(f"""
+                ALTER TABLE {self.tabela}
+                    MODIFY ANO_VENDA {tipos['ANO_VENDA']} NOT NULL,
+                    MODIFY MES_VENDA {tipos['MES_VENDA']} NOT NULL,
+                    DROP PRIMARY KEY,
+                    ADD PRIMARY KEY (indice_global, ANO_VENDA, MES_VENDA)
+                {clausula_particionamento(granularidade, ano_inicial, ano_final)}
+            """)
+        self._particoes = None
+        print(f"✅ {len(self.obter_particoes())} partições criadas em {time.time() - inicio:.1f}s")
+
+    def garantir_particao(self, ano, mes):
+        """Cria a partição do mês (ou ano) separando-a de pmax, se ainda não existir
+
+        Os meses entre a última partição e o pedido ganham partição também,
+        para nenhuma partição cobrir mais de um mês. Meses anteriores à
+        última partição continuam onde estão (sem TRUNCATE na recarga).
+        """
+        granularidade = self.granularidade
+        if granularidade is None:
+            return False
+        por_mes = granularidade == 'mes'
+        nomes = [particao['nome'] for particao in self.obter_particoes()]
+        if nome_particao(ano, mes if por_mes else None) in nomes or nomes[-1] != PARTICAO_MAXIMA:
+            return False
+
+        ultima = nomes[-2] if len(nomes) > 1 and nomes[-2] != PARTICAO_ANTERIOR else None
+        if ultima is None:
+            novas = [(ano, mes)]
+        elif por_mes:
+            atual, alvo = int(ultima[1:5]) * 12 + int(ultima[5:7]) - 1, ano * 12 + mes - 1
+            novas = [(indice // 12, indice % 12 + 1) for indice in range(atual + 1, alvo + 1)]
+        else:
+            novas = [(indice, None) for indice in range(int(ultima[1:]) + 1, ano + 1)]
+        if not novas:
+            return False  # anterior à última partição: já está coberto por outra
+
+        definicoes = [_definicao(ano_nova, mes_nova if por_mes else None) for ano_nova, mes_nova in novas]
+        maxima = "(MAXVALUE, MAXVALUE)" if por_mes else "(MAXVALUE)"
+        with get_db_cursor() as cursor:
+            cursor.execute(f"""
+                ALTER TABLE {self.tabela} REORGANIZE PARTITION {PARTICAO_MAXIMA} INTO (
+                    {', '.join(definicoes)},
+                    PARTITION {PARTICAO_MAXIMA} VALUES LESS THAN {maxima}
+                )
+            """)
+        self._particoes = None
+        print(f"🧱 {len(definicoes)} partição(ões) criada(s) em {self.tabela} até "
+              f"{nome_particao(ano, mes if por_mes else None)}")
+        return True
+
+    def limpar_mes(self, cursor, ano, mes):
+        """Remove os registros de um (ano, mês) no cursor informado; retorna quantos saíram
+
+        Com partição própria do mês é um TRUNCATE PARTITION (DDL: faz commit
+        implícito do que veio antes no cursor, e o que vier depois fica em
+        outra transação). Por isso quem limpa também a vendas_agregadas deve
+        fazê-lo antes: se o TRUNCATE falhar, o mês só fica faltando na
+        agregada, em vez de ela ficar com totais de um detalhe já apagado.
+        Sem partição própria, um DELETE, que com a tabela particionada só
+        toca a partição do mês/ano.
+        """
+        nome = nome_particao(ano, mes)
+        if self.granularidade == 'mes' and nome in {particao['nome'] for particao in self.obter_particoes()}:
+            cursor.execute(f"SELECT COUNT(*) FROM {self.tabela} PARTITION ({nome})")
+            linha = cursor.fetchone()
+            removidos = list(linha.values())[0] if isinstance(linha, dict) else linha[0]
+            cursor.execute(f"ALTER TABLE {self.tabela} TRUNCATE PARTITION {nome}")
+            return removidos
+
+        cursor.execute(f"""
+            DELETE FROM {self.tabela}
+            WHERE ANO_VENDA = %s AND MES_VENDA = %s
+        """, (ano, mes))
+        return cursor.rowcount
+
+    def listar(self):
+        """Mostra as partições e a estimativa de linhas de cada uma"""
+        particoes = self.obter_particoes()
+        if not particoes:
+            print(f"📭 {self.tabela} não é particionada")
+            return
+        print(f"🧱 {self.tabela}: {len(particoes)} partições por {self.granularidade}")
+        for particao in particoes:
+            print(f"   {particao['nome']:<12} < {particao['limite']:<22} ~{particao['linhas'] or 0:,} linhas")
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Particionamento por ano/mês das tabelas de vendas")
+    parser.add_argument("--tabela", default=TABELA_VENDAS, help=f"tabela (padrão: {TABELA_VENDAS})")
+    parser.add_argument("--listar", action="store_true", help="mostra as partições atuais")
+    parser.add_argument("--particionar", action="store_true", help="converte a tabela para RANGE COLUMNS")
+    parser.add_argument("--granularidade", choices=GRANULARIDADES_PARTICAO, default='mes',
+                        help="uma partição por mês (padrão, permite TRUNCATE na recarga) ou por ano")
+    parser.add_argument("--ano-inicial", type=int, default=2014)
+    parser.add_argument("--ano-final", type=int, default=2021)
+    args = parser.parse_args()
+
+    gerenciador = GerenciadorParticoes(args.tabela)
+    if args.particionar:
+        if gerenciador.particionada:
+            print(f"⚠️  {args.tabela} já é particionada por {gerenciador.granularidade}")
+            sys.exit(1)
+        gerenciador.particionar(args.granularidade, args.ano_inicial, args.ano_final)
+    if args.listar or not args.particionar:
+        gerenciador.listar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Pool de conexões e controle adaptativo de paralelismo para consultas concorrentes
+"""
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Adicionar o diretório atual ao path para importar meuDB
+sys.path.append(os.path.dirname(__file__))
+
+from meuDB import get_db_cursor
+
+INTERVALO_REABERTURA = 1.0  # segundos esperando um cursor livre antes de tentar reabrir uma conexão perdida
+
+
+class PoolCursores:
+    """Pool fixo de cursores do meuDB, cada um com sua conexão aberta
+
+    As conexões são abertas uma vez e reaproveitadas entre consultas. Um
+    cursor que falhar é descartado e substituído por uma conexão nova; se a
+    nova não abrir, a vaga fica perdida e é reaberta quando alguém esperar
+    por um cursor. Com todas as vagas perdidas e o banco ainda fora, `cursor()`
+    falha com ConnectionError em vez de esperar para sempre. `espera_maxima`
+    (segundos) limita também a espera por um cursor ocupado (TimeoutError).
+
+    Uso:
+        with PoolCursores(4) as pool:
+            with pool.cursor() as cursor:
+                cursor.execute(...)
+    """
+
+    def __init__(self, tamanho, dictionary=True, espera_maxima=None):
+        self.tamanho = max(1, int(tamanho))
+        self.dictionary = dictionary
+        self.espera_maxima = espera_maxima
+        self.perdidos = 0  # vagas cuja conexão não pôde ser reaberta
+        self._livres = queue.Queue()
+        self._contextos = []
+        self._trava = threading.Lock()
+
+    def __enter__(self):
+        for _ in range(self.tamanho):
+            self._livres.put(self._abrir())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.fechar()
+        return False
+
+    def _abrir(self):
+        contexto = get_db_cursor(dictionary=self.dictionary)
+        cursor = contexto.__enter__()
+        with self._trava:
+            self._contextos.append(contexto)
+        return contexto, cursor
+
+    def _descartar(self, contexto, erro):
+        with self._trava:
+            if contexto in self._contextos:
+                self._contextos.remove(contexto)
+        try:
+            contexto.__exit__(type(erro), erro, erro.__traceback__)
+        except Exception:
+            pass
+
+    def _emprestar(self):
+        """Pega um cursor livre, reabrindo uma vaga perdida se a espera passar de INTERVALO_REABERTURA"""
+        limite = None if self.espera_maxima is None else time.monotonic() + self.espera_maxima
+        while True:
+            try:
+                return self._livres.get(timeout=INTERVALO_REABERTURA)
+            except queue.Empty:
+                pass
+
+            with self._trava:
+                reabrir = self.perdidos > 0
+                if reabrir:
+                    self.perdidos -= 1
+            if reabrir:
+                try:
+                    return self._abrir()
+                except Exception as e:
+                    with self._trava:
+                        self.perdidos += 1
+                        esgotado = self.perdidos >= self.tamanho
+                    if esgotado:
+                        raise ConnectionError(f"Pool sem conexões: nenhuma das {self.tamanho} "
+                                              f"pôde ser reaberta ({e})") from e
+
+            if limite is not None and time.monotonic() >= limite:
+                raise TimeoutError(f"Nenhum cursor livre em {self.espera_maxima}s")
+
+    @contextmanager
+    def cursor(self):
+        """Empresta um cursor do pool (espera até haver um livre, ver a classe)"""
+        contexto, cursor = self._emprestar()
+        try:
+            yield cursor
+        except Exception as e:
+            # Conexão em estado desconhecido: trocar por uma nova
+            self._descartar(contexto, e)
+            try:
+                self._livres.put(self._abrir())
+            except Exception:
+                with self._trava:
+                    self.perdidos += 1
+            raise
+        else:
+            self._livres.put((contexto, cursor))
+
+    def fechar(self):
+        """Fecha todas as conexões do pool"""
+        with self._trava:
+            contextos, self._contextos = self._contextos, []
+        for contexto in contextos:
+            try:
+                contexto.__exit__(None, None, None)
+            except Exception:
+                pass
+
+
+class LimitadorAdaptativo:
+    """Limita quantas consultas rodam ao mesmo tempo, ajustando o limite pela latência
+
+    Aumento aditivo / redução multiplicativa: enquanto a latência fica perto
+    da melhor já observada o limite sobe de 1 em 1 (até `maximo`); quando
+    passa de `fator_lentidao` vezes essa referência, o limite cai pela metade
+    e novas consultas esperam `espera_base` segundos (dobrando a cada redução
+    seguida) antes de começar.
+
+    A latência é dividida pelas `unidades` informadas (ex.: linhas
+    retornadas), para que municípios grandes não pareçam lentidão do banco.
+    Só consultas iniciadas depois da última redução podem reduzir de novo.
+    """
+
+    def __init__(self, maximo, fator_lentidao=2.0, espera_base=1.0, espera_maxima=30.0):
+        self.maximo = max(1, int(maximo))
+        self.limite = self.maximo
+        self.fator_lentidao = fator_lentidao
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.em_execucao = 0
+        self.latencia_referencia = None
+        self.latencia_media = None
+        self.espera_atual = 0.0
+        self.geracao = 0  # incrementada a cada redução do limite
+        self._condicao = threading.Condition()
+
+    @contextmanager
+    def vaga(self):
+        """Espera uma vaga dentro do limite atual e mede a latência da consulta
+
+        Produz um dict onde o chamador pode informar `unidades`.
+        """
+        with self._condicao:
+            while self.em_execucao >= self.limite:
+                self._condicao.wait()
+            self.em_execucao += 1
+            espera = self.espera_atual
+            geracao = self.geracao
+
+        if espera > 0:
+            time.sleep(espera)
+
+        medicao = {'unidades': 1}
+        inicio = time.time()
+        try:
+            yield medicao
+        finally:
+            self.registrar(time.time() - inicio, medicao['unidades'], geracao)
+
+    def registrar(self, latencia, unidades=1, geracao=None):
+        """Atualiza o limite a partir da latência de uma consulta que terminou"""
+        latencia = latencia / max(1, unidades)
+        with self._condicao:
+            self.em_execucao -= 1
+            self.latencia_media = latencia if self.latencia_media is None else \
+                0.7 * self.latencia_media + 0.3 * latencia
+            if self.latencia_referencia is None or self.latencia_media < self.latencia_referencia:
+                self.latencia_referencia = self.latencia_media
+
+            if self.latencia_media > self.latencia_referencia * self.fator_lentidao:
+                if geracao is None or geracao == self.geracao:
+                    self.limite = max(1, self.limite // 2)
+                    self.espera_atual = min(self.espera_maxima,
+                                            self.espera_atual * 2 if self.espera_atual else self.espera_base)
+                    self.geracao += 1
+            else:
+                self.limite = min(self.maximo, self.limite + 1)
+                self.espera_atual = 0.0
+            self._condicao.notify_all()
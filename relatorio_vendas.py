@@ -0,0 +1,232 @@
+"""
+Relatório do agrupamento de vendas: estatísticas por ano, por município e top-N de princípios ativos
+
+Tudo é calculado de uma vez (duas agregações vetorizadas sobre colunas
+categóricas) e guardado num RelatorioVendas, que é o que o console e os
+arquivos de resumo usam. `calcular_ranking` dá o top-K de qualquer
+dimensão por grupo (os rankings gravados para o dashboard).
+"""
+from datetime import datetime
+
+import pandas as pd
+
+
+class RelatorioVendas:
+    """Resultado do relatório de um DataFrame agrupado (ANO_VENDA, MUNICIPIO_VENDA, PRINCIPIO_ATIVO, TOTAL_VENDIDO)
+
+    por_ano: lista de dicts {ano, total_vendido, municipios, registros, top_principios}
+    por_municipio: lista de (município, total vendido), do maior para o menor
+    amostra: DataFrame com as primeiras linhas de `ano_amostra` (ou None)
+    """
+
+    def __init__(self, total_registros=0, total_vendido=0.0, municipios_unicos=0, anos_unicos=0,
+                 principios_unicos=0, por_ano=None, por_municipio=None, top_n=3, ano_amostra=None,
+                 amostra=None):
+        self.total_registros = total_registros
+        self.total_vendido = total_vendido
+        self.municipios_unicos = municipios_unicos
+        self.anos_unicos = anos_unicos
+        self.principios_unicos = principios_unicos
+        self.por_ano = por_ano or []
+        self.por_municipio = por_municipio or []
+        self.top_n = top_n
+        self.ano_amostra = ano_amostra
+        self.amostra = amostra
+        self.data_geracao = datetime.now().isoformat()
+
+    @property
+    def vazio(self):
+        return self.total_registros == 0
+
+    def ano(self, ano):
+        """Entrada de por_ano de um ano (ou None)"""
+        for entrada in self.por_ano:
+            if entrada['ano'] == ano:
+                return entrada
+        return None
+
+    def estatisticas(self):
+        """Dict de estatísticas gerais (formato de obter_estatisticas)"""
+        if self.vazio:
+            return {"status": "vazio"}
+        return {
+            "total_registros": self.total_registros,
+            "municipios_unicos": self.municipios_unicos,
+            "anos_unicos": self.anos_unicos,
+            "principios_unicos": self.principios_unicos,
+            "total_vendido": self.total_vendido,
+            "data_geracao": self.data_geracao
+        }
+
+    def como_dict(self):
+        """Relatório completo em tipos nativos, para gravar em JSON"""
+        resumo = self.estatisticas()
+        if self.vazio:
+            return resumo
+        resumo["por_ano"] = [
+            {**entrada, "top_principios": [{"principio": principio, "total_vendido": total}
+                                           for principio, total in entrada['top_principios']]}
+            for entrada in self.por_ano
+        ]
+        resumo["por_municipio"] = [{"municipio": municipio, "total_vendido": total}
+                                   for municipio, total in self.por_municipio]
+        return resumo
+
+
+def _categoria(serie):
+    return serie if isinstance(serie.dtype, pd.CategoricalDtype) else serie.astype('category')
+
+
+def calcular_relatorio(df, top_n=3, ano_amostra=2016, tamanho_amostra=5):
+    """Calcula o RelatorioVendas de `df` sem filtrar o DataFrame ano a ano
+
+    Uma agregação por (ano, princípio ativo) dá totais, registros e top-N por
+    ano; outra por (ano, município) dá municípios por ano e totais por
+    município. O resto sai dessas tabelas pequenas. Se o agrupamento não
+    tiver município ou princípio ativo, as estatísticas dele ficam zeradas.
+    """
+    if df is None or df.empty:
+        return RelatorioVendas(top_n=top_n, ano_amostra=ano_amostra)
+
+    tem_municipio = 'MUNICIPIO_VENDA' in df.columns
+    tem_principio = 'PRINCIPIO_ATIVO' in df.columns
+    base = pd.DataFrame({
+        'ANO_VENDA': df['ANO_VENDA'].to_numpy(),
+        'TOTAL_VENDIDO': df['TOTAL_VENDIDO'].to_numpy(dtype=float),
+    })
+    if tem_municipio:
+        base['MUNICIPIO_VENDA'] = _categoria(df['MUNICIPIO_VENDA']).array
+    if tem_principio:
+        base['PRINCIPIO_ATIVO'] = _categoria(df['PRINCIPIO_ATIVO']).array
+
+    # dropna=False: linhas sem princípio ativo ainda contam nos totais do ano
+    ano_principio = (base.groupby(['ANO_VENDA'] + (['PRINCIPIO_ATIVO'] if tem_principio else []),
+                                  observed=True, sort=False, dropna=False)
+                     ['TOTAL_VENDIDO'].agg(['sum', 'size']))
+    totais_ano = ano_principio.groupby(level='ANO_VENDA').agg({'sum': 'sum', 'size': 'sum'})
+
+    top_por_ano = {}
+    principios_unicos = 0
+    if tem_principio:
+        principios = ano_principio.index.get_level_values('PRINCIPIO_ATIVO')
+        principios_unicos = int(principios.nunique())
+        # Numera dentro de cada ano e só ordena o que ficou no top
+        somas = ano_principio['sum'][principios.notna()]
+        posicao = somas.groupby(level='ANO_VENDA', sort=False).rank(method='first', ascending=False)
+        top = somas[posicao.to_numpy() <= top_n].sort_values(ascending=False, kind='stable')
+        for (ano, principio), total in top.items():
+            top_por_ano.setdefault(ano, []).append((principio, float(total)))
+
+    municipios_ano = pd.Series(dtype='int64')
+    por_municipio = pd.Series(dtype=float)
+    municipios_unicos = 0
+    if tem_municipio:
+        ano_municipio = (base.groupby(['ANO_VENDA', 'MUNICIPIO_VENDA'], observed=True, sort=False)
+                         ['TOTAL_VENDIDO'].sum())
+        municipios_ano = ano_municipio.groupby(level='ANO_VENDA').size()
+        municipios_unicos = int(ano_municipio.index.get_level_values('MUNICIPIO_VENDA').nunique())
+        por_municipio = (ano_municipio.groupby(level='MUNICIPIO_VENDA', observed=True).sum()
+                         .sort_values(ascending=False, kind='stable'))
+
+    por_ano = [{
+        "ano": int(ano),
+        "total_vendido": float(totais_ano.at[ano, 'sum']),
+        "municipios": int(municipios_ano.get(ano, 0)),
+        "registros": int(totais_ano.at[ano, 'size']),
+        "top_principios": top_por_ano.get(ano, []),
+    } for ano in sorted(totais_ano.index)]
+
+    amostra = None
+    if ano_amostra is not None and ano_amostra in totais_ano.index:
+        amostra = df[df['ANO_VENDA'].to_numpy() == ano_amostra].head(tamanho_amostra)
+
+    return RelatorioVendas(
+        total_registros=len(df),
+        total_vendido=float(totais_ano['sum'].sum()),
+        municipios_unicos=municipios_unicos,
+        anos_unicos=len(totais_ano),
+        principios_unicos=principios_unicos,
+        por_ano=por_ano,
+        por_municipio=[(municipio, float(total)) for municipio, total in por_municipio.items()],
+        top_n=top_n,
+        ano_amostra=ano_amostra,
+        amostra=amostra,
+    )
+
+
+def calcular_ranking(df, grupos=('ANO_VENDA',), item='PRINCIPIO_ATIVO', top_k=3):
+    """Top `top_k` de `item` (maior TOTAL_VENDIDO) em cada combinação de `grupos`
+
+    Soma TOTAL_VENDIDO por grupos + item (o DataFrame pode ter mais
+    dimensões ou MES_VENDA), numera dentro de cada grupo com rank e só as
+    linhas do top são ordenadas. Empates ficam na ordem alfabética do item
+    (as chaves da soma saem ordenadas). Itens ou grupos nulos ficam de fora.
+    Retorna as colunas grupos, item, TOTAL_VENDIDO e POSICAO (1 = maior).
+    """
+    grupos = list(grupos)
+    colunas = grupos + [item]
+    if df is None or df.empty:
+        return pd.DataFrame({coluna: [] for coluna in colunas + ['TOTAL_VENDIDO', 'POSICAO']})
+
+    base = pd.DataFrame({coluna: (df[coluna].to_numpy() if pd.api.types.is_numeric_dtype(df[coluna])
+                                  else _categoria(df[coluna]).array) for coluna in colunas})
+    base['TOTAL_VENDIDO'] = df['TOTAL_VENDIDO'].to_numpy(dtype=float)
+    totais = base.groupby(colunas, observed=True)['TOTAL_VENDIDO'].sum().reset_index()
+    if grupos:
+        posicao = totais.groupby(grupos, observed=True, sort=False)['TOTAL_VENDIDO'].rank(
+            method='first', ascending=False)
+    else:
+        posicao = totais['TOTAL_VENDIDO'].rank(method='first', ascending=False)
+    top = totais[posicao.to_numpy() <= top_k].copy()
+    top['POSICAO'] = posicao[posicao.to_numpy() <= top_k].to_numpy(dtype='int32')
+    return top.sort_values(grupos + ['POSICAO'], ignore_index=True)
+
+
+def lideres_ranking(ranking):
+    """DataFrame de calcular_ranking -> lista de {grupos..., "top": [{nome, total_vendido}]} (para JSON)"""
+    grupos, item = list(ranking.columns[:-3]), ranking.columns[-3]  # ... item, TOTAL_VENDIDO, POSICAO
+    lideres = []
+    for linha in ranking.itertuples(index=False):
+        chave = {grupo: getattr(linha, grupo) for grupo in grupos}
+        if not lideres or any(lideres[-1][grupo] != valor for grupo, valor in chave.items()):
+            lideres.append({**chave, "top": []})
+        lideres[-1]["top"].append({"nome": getattr(linha, item), "total_vendido": float(linha.TOTAL_VENDIDO)})
+    return lideres
+
+
+def imprimir_analise_por_ano(relatorio, origem="DATAFRAME"):
+    """Mostra no console a análise detalhada por ano"""
+    if relatorio.vazio:
+        print("⚠️ DataFrame vazio")
+        return
+
+    print("\n🔍 ANÁLISE DETALHADA POR ANO:")
+    print("=" * 50)
+    print(f"📅 ANOS NO {origem}: {[entrada['ano'] for entrada in relatorio.por_ano]}")
+
+    for entrada in relatorio.por_ano:
+        print(f"\n📊 {entrada['ano']}:")
+        print(f"   📦 Total vendido: {entrada['total_vendido']:,.0f} unidades")
+        print(f"   🏙️  Municípios: {entrada['municipios']}")
+        print(f"   📋 Registros: {entrada['registros']:,}")
+        print(f"   💊 Top {relatorio.top_n} princípios ativos:")
+        for principio, total in entrada['top_principios']:
+            print(f"      - {principio}: {total:,.0f}")
+
+
+def imprimir_amostra(relatorio):
+    """Mostra a amostra do ano de amostra do relatório"""
+    if relatorio.vazio:
+        return
+
+    entrada = relatorio.ano(relatorio.ano_amostra)
+    if entrada is None or relatorio.amostra is None:
+        print(f"\n❌ Nenhum dado encontrado para {relatorio.ano_amostra}")
+        return
+
+    print(f"\n🎯 AMOSTRA DE DADOS DE {relatorio.ano_amostra} (primeiros {len(relatorio.amostra)} registros):")
+    print("=" * 60)
+    print(relatorio.amostra.to_string(index=False))
+
+    print(f"\n📈 Total de registros de {relatorio.ano_amostra}: {entrada['registros']:,}")
+    print(f"📦 Volume total {relatorio.ano_amostra}: {entrada['total_vendido']:,.0f} unidades")
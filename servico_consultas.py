@@ -0,0 +1,414 @@
+"""
+Serviço HTTP local de consultas sobre o agrupamento de vendas (para o dashboard)
+
+Carrega o resultado do agrupamento uma vez (o CSV gravado por salvar_csv
+ou pelo modo incremental, ou um agrupamento feito na hora) em colunas
+compactas, com um índice por dimensão (valor -> posições das linhas), e
+responde consultas filtradas, paginadas e top-K em JSON. O navegador pede
+só o que vai desenhar, em vez de baixar o JSON inteiro.
+
+Cada resposta leva um ETag (versão dos dados + consulta): com
+If-None-Match igual a resposta é 304 sem corpo, e as respostas recentes
+ficam em memória. Com um CSV, o arquivo é recarregado quando muda.
+
+Rotas (GET):
+    /saude                          registros e versão dos dados
+    /dimensoes                      valores distintos de cada coluna filtrável
+    /vendas?municipio=NITERÓI&ano=2016&pagina=1&por_pagina=100&ordem=-TOTAL_VENDIDO
+    /ranking?por=ano,municipio&item=principio&k=3&ano=2016
+
+Filtros: ano, mes, municipio, principio, conselho, uf_conselho, uf (repetir
+o parâmetro, ou separar por vírgula, para mais de um valor).
+
+Uso:
+    python servico_consultas.py --csv dados_agrupados/vendas_agrupadas_incremental.csv
+    python servico_consultas.py --fonte agregada --porta 8765
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+# Adicionar o diretório atual ao path para importar os módulos do projeto
+sys.path.append(os.path.dirname(__file__))
+
+from colunas_compactas import TIPOS_COLUNAS, compactar, ler_csv
+from relatorio_vendas import calcular_ranking, lideres_ranking
+
+PORTA_PADRAO = 8765
+POR_PAGINA_PADRAO = 100
+POR_PAGINA_MAXIMO = 5000
+RESPOSTAS_EM_CACHE = 512  # respostas recentes guardadas em memória
+TAMANHO_MINIMO_GZIP = 1024  # bytes; respostas menores vão sem compressão
+
+# Parâmetro da URL -> coluna do agrupamento
+FILTROS = {
+    'ano': 'ANO_VENDA',
+    'mes': 'MES_VENDA',
+    'municipio': 'MUNICIPIO_VENDA',
+    'principio': 'PRINCIPIO_ATIVO',
+    'conselho': 'CONSELHO_PRESCRITOR',
+    'uf_conselho': 'UF_CONSELHO_PRESCRITOR',
+    'uf': 'UF_VENDA',
+}
+
+
+class ErroConsulta(ValueError):
+    """Parâmetro inválido na URL (vira resposta 400)"""
+
+
+def _valores(parametros, nome):
+    """Valores de um parâmetro repetido ou separado por vírgula, sem repetições (na ordem da URL)"""
+    return list(dict.fromkeys(valor.strip() for bruto in parametros.get(nome, [])
+                              for valor in bruto.split(',') if valor.strip()))
+
+
+def _inteiro(parametros, nome, padrao, minimo=1, maximo=None):
+    valores = parametros.get(nome)
+    if not valores:
+        return padrao
+    try:
+        valor = int(valores[-1])
+    except ValueError:
+        raise ErroConsulta(f"'{nome}' precisa ser inteiro") from None
+    if valor < minimo or (maximo is not None and valor > maximo):
+        raise ErroConsulta(f"'{nome}' fora do intervalo ({minimo} a {maximo or '∞'})")
+    return valor
+
+
+def _coluna(nome):
+    """Coluna a partir do nome curto (municipio) ou do nome da coluna (MUNICIPIO_VENDA)"""
+    return FILTROS.get(nome, nome.upper())
+
+
+def _nativo(valor):
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    return None if isinstance(valor, float) and np.isnan(valor) else valor
+
+
+def _etag_confere(etag, if_none_match):
+    """Comparação fraca do If-None-Match (RFC 9110): aceita W/"..." e *"""
+    validadores = [parte.strip() for parte in if_none_match.split(',')]
+    return '*' in validadores or any(
+        (validador[2:] if validador.startswith('W/') else validador) == etag for validador in validadores)
+
+
+def versao_dataframe(df):
+    """Versão (hash do conteúdo) do DataFrame, usada nos ETags"""
+    resumo = hashlib.sha1(','.join(df.columns).encode('utf-8'))
+    resumo.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return resumo.hexdigest()[:16]
+
+
+class IndiceVendas:
+    """DataFrame do agrupamento com um índice por coluna filtrável (valor -> posições, em ordem)"""
+
+    def __init__(self, df):
+        self.df = compactar(df.reset_index(drop=True))
+        self.versao = versao_dataframe(self.df)
+        self.filtraveis = [coluna for coluna in FILTROS.values() if coluna in self.df.columns]
+        self.indices = {coluna: self._indexar(self.df[coluna]) for coluna in self.filtraveis}
+
+    @staticmethod
+    def _indexar(serie):
+        categorias = serie.cat.categories if isinstance(serie.dtype, pd.CategoricalDtype) else None
+        if categorias is None:
+            codigos, categorias = pd.factorize(serie, sort=True)
+        else:
+            codigos = serie.cat.codes.to_numpy()
+        # Uma ordenação estável dos códigos agrupa as posições de cada valor, já em ordem
+        ordem = np.argsort(codigos, kind='stable').astype(np.int32)
+        contagens = np.bincount(codigos[codigos >= 0], minlength=len(categorias))
+        nulos = int((codigos < 0).sum())
+        partes = np.split(ordem[nulos:], np.cumsum(contagens)[:-1]) if len(categorias) else []
+        return {_nativo(valor): posicoes for valor, posicoes in zip(categorias, partes) if len(posicoes)}
+
+    def _chave(self, coluna, texto):
+        if coluna in TIPOS_COLUNAS:
+            try:
+                return int(texto)
+            except ValueError:
+                raise ErroConsulta(f"'{texto}' não é um valor de {coluna}") from None
+        return texto.upper()
+
+    def posicoes(self, parametros):
+        """Posições das linhas que passam nos filtros da URL (None = todas)"""
+        selecoes = []
+        for nome, coluna in FILTROS.items():
+            valores = _valores(parametros, nome)
+            if not valores:
+                continue
+            if coluna not in self.indices:
+                raise ErroConsulta(f"O agrupamento carregado não tem {coluna}")
+            # Chaves normalizadas sem repetição ('a,A' é um valor só): as listas de posições
+            # ficam disjuntas e a interseção abaixo pode assumir valores únicos
+            chaves = dict.fromkeys(self._chave(coluna, valor) for valor in valores)
+            vazio = np.empty(0, dtype=np.int32)
+            partes = [self.indices[coluna].get(chave, vazio) for chave in chaves]
+            selecoes.append(partes[0] if len(partes) == 1 else np.sort(np.concatenate(partes)))
+        if not selecoes:
+            return None
+        # Interseção começando pelo filtro mais seletivo
+        selecoes.sort(key=len)
+        resultado = selecoes[0]
+        for selecao in selecoes[1:]:
+            if not len(resultado):
+                break
+            resultado = np.intersect1d(resultado, selecao, assume_unique=True)
+        return resultado
+
+    def vendas(self, parametros):
+        """Página de registros filtrados, na ordem pedida ('ordem=-TOTAL_VENDIDO', 'ordem=municipio'...)"""
+        pagina = _inteiro(parametros, 'pagina', 1)
+        por_pagina = _inteiro(parametros, 'por_pagina', POR_PAGINA_PADRAO, maximo=POR_PAGINA_MAXIMO)
+        posicoes = self.posicoes(parametros)
+        total = len(self.df) if posicoes is None else len(posicoes)
+        inicio, fim = (pagina - 1) * por_pagina, min(pagina * por_pagina, total)
+
+        ordem = (parametros.get('ordem') or [None])[-1]
+        if ordem:
+            decrescente = ordem.startswith('-')
+            coluna = _coluna(ordem.lstrip('-+'))
+            if coluna not in self.df.columns:
+                raise ErroConsulta(f"Não dá para ordenar por {coluna}")
+            base = np.arange(len(self.df), dtype=np.int32) if posicoes is None else posicoes
+            # Chave de ordenação em float: nulos (NaN, código -1) sempre no fim e, no decrescente,
+            # o valor negado, para a ordenação estável manter empates na ordem das linhas
+            serie = self.df[coluna].iloc[base]
+            if coluna in TIPOS_COLUNAS:
+                chave = serie.to_numpy(dtype=float)
+            else:
+                codigos = serie.cat.codes.to_numpy()
+                chave = np.where(codigos >= 0, codigos, np.nan)
+            if decrescente:
+                chave = -chave
+            if fim < total:
+                # Só as `fim` primeiras posições são ordenadas (partition), não a seleção inteira;
+                # no limite, os empates entram na ordem das linhas, como na ordenação completa
+                chave = np.nan_to_num(chave, nan=np.inf)
+                limite = np.partition(chave, fim - 1)[fim - 1]
+                antes = np.flatnonzero(chave < limite)
+                escolhidas = np.concatenate([antes, np.flatnonzero(chave == limite)[:fim - len(antes)]])
+                escolhidas.sort()
+                posicoes = base[escolhidas[np.argsort(chave[escolhidas], kind='stable')]]
+            else:
+                posicoes = base[np.argsort(chave, kind='stable')]
+        pagina_df = self.df.iloc[inicio:fim] if posicoes is None else self.df.iloc[posicoes[inicio:fim]]
+
+        registros = [{coluna: _nativo(valor) for coluna, valor in registro.items()}
+                     for registro in pagina_df.to_dict('records')]
+        return {"status": "success", "total": total, "pagina": pagina, "por_pagina": por_pagina,
+                "paginas": -(-total // por_pagina), "registros": registros}
+
+    def ranking(self, parametros):
+        """Top-K de `item` por `por` (ex.: por=ano,municipio&item=principio&k=3) sobre as linhas filtradas"""
+        grupos = [_coluna(nome) for nome in _valores(parametros, 'por')]
+        item = _coluna((parametros.get('item') or ['principio'])[-1])
+        k = _inteiro(parametros, 'k', 3, maximo=1000)
+        invalidas = [coluna for coluna in grupos + [item] if coluna not in self.filtraveis]
+        if invalidas or item in grupos:
+            raise ErroConsulta(f"Ranking inválido: {item} por {grupos} (colunas: {', '.join(self.filtraveis)})")
+        posicoes = self.posicoes(parametros)
+        df = self.df if posicoes is None else self.df.iloc[posicoes]
+        lideres = lideres_ranking(calcular_ranking(df, grupos, item, k))
+        return {"status": "success", "grupos": grupos, "item": item, "k": k,
+                "lideres": [{chave: _nativo(valor) if chave != "top" else valor for chave, valor in lider.items()}
+                            for lider in lideres]}
+
+    def dimensoes(self, parametros):
+        """Valores distintos de cada coluna filtrável (para montar os filtros da página)"""
+        return {"status": "success", "registros": len(self.df),
+                "dimensoes": {nome: sorted(self.indices[coluna]) for nome, coluna in FILTROS.items()
+                              if coluna in self.indices}}
+
+    def saude(self, parametros):
+        return {"status": "success", "registros": len(self.df), "versao": self.versao}
+
+
+class ServicoConsultas:
+    """Índice atual, cache de respostas e recarga do CSV quando ele muda"""
+
+    ROTAS = {'/vendas': 'vendas', '/ranking': 'ranking', '/dimensoes': 'dimensoes', '/saude': 'saude'}
+
+    def __init__(self, carregar, caminho_csv=None, origem_cors='*'):
+        self.carregar = carregar  # função sem argumentos que devolve o DataFrame do agrupamento
+        self.caminho_csv = caminho_csv
+        self.origem_cors = origem_cors
+        self._estado_csv = None
+        self._trava = threading.Lock()
+        self._trava_recarga = threading.Lock()  # uma recarga por vez, mesmo com várias requisições
+        self._respostas = OrderedDict()  # ETag -> corpo JSON (bytes)
+        self.indice = None
+        self.recarregar()
+
+    def recarregar(self):
+        inicio = time.time()
+        estado = self._estado_do_csv()
+        indice = IndiceVendas(self.carregar())
+        with self._trava:
+            self.indice, self._estado_csv = indice, estado
+            self._respostas.clear()
+        print(f"✅ {len(indice.df):,} registros carregados (versão {indice.versao}) em {time.time() - inicio:.2f}s")
+
+    def _estado_do_csv(self):
+        if not self.caminho_csv:
+            return None
+        estado = os.stat(self.caminho_csv)
+        return estado.st_size, estado.st_mtime_ns
+
+    def atualizar_se_mudou(self):
+        """Recarrega o CSV se ele foi regravado (ex.: pela atualização incremental)"""
+        if not (self.caminho_csv and os.path.exists(self.caminho_csv)):
+            return
+        if self._estado_do_csv() != self._estado_csv:
+            with self._trava_recarga:
+                if self._estado_do_csv() != self._estado_csv:
+                    self.recarregar()
+
+    def responder(self, caminho, consulta, etag_cliente=None):
+        """(status, ETag, corpo) de uma rota; corpo None quando o cliente já tem a versão (304)"""
+        if caminho not in self.ROTAS:
+            return 404, None, json.dumps({"status": "error", "message": f"Rota inexistente: {caminho}"}).encode()
+        self.atualizar_se_mudou()
+        indice = self.indice
+        parametros = parse_qs(consulta, keep_blank_values=False)
+        normalizada = '&'.join(f"{nome}={','.join(valores)}" for nome, valores in sorted(parametros.items()))
+        etag = '"%s-%s"' % (indice.versao, hashlib.sha1(f"{caminho}?{normalizada}".encode('utf-8')).hexdigest()[:16])
+        if etag_cliente and _etag_confere(etag, etag_cliente):
+            return 304, etag, None
+
+        with self._trava:
+            corpo = self._respostas.get(etag)
+            if corpo is not None:
+                self._respostas.move_to_end(etag)
+                return 200, etag, corpo
+        try:
+            resultado = getattr(indice, self.ROTAS[caminho])(parametros)
+        except ErroConsulta as e:
+            return 400, None, json.dumps({"status": "error", "message": str(e)}, ensure_ascii=False).encode('utf-8')
+        corpo = json.dumps(resultado, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        with self._trava:
+            if indice is self.indice:
+                self._respostas[etag] = corpo
+                while len(self._respostas) > RESPOSTAS_EM_CACHE:
+                    self._respostas.popitem(last=False)
+        return 200, etag, corpo
+
+
+class ManipuladorConsultas(BaseHTTPRequestHandler):
+    """GET nas rotas do ServicoConsultas (self.server.servico), com ETag e gzip"""
+
+    server_version = "ServicoVendas/1.0"
+    registrar_requisicoes = False
+
+    def do_GET(self):
+        partes = urlsplit(self.path)
+        servico = self.server.servico
+        try:
+            status, etag, corpo = servico.responder(partes.path.rstrip('/') or '/', partes.query,
+                                                    self.headers.get('If-None-Match'))
+        except Exception as e:
+            status, etag = 500, None
+            corpo = json.dumps({"status": "error", "message": str(e)}, ensure_ascii=False).encode('utf-8')
+
+        comprimir = corpo is not None and len(corpo) >= TAMANHO_MINIMO_GZIP and \
+            'gzip' in self.headers.get('Accept-Encoding', '')
+        if comprimir:
+            corpo = gzip.compress(corpo, compresslevel=5)
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')  # o navegador revalida sempre com If-None-Match
+        if servico.origem_cors:
+            self.send_header('Access-Control-Allow-Origin', servico.origem_cors)
+            self.send_header('Access-Control-Expose-Headers', 'ETag')
+        if corpo is not None:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            if comprimir:
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        if corpo is not None:
+            self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        if self.registrar_requisicoes:
+            super().log_message(formato, *args)
+
+
+def carregar_csv(caminho):
+    """Função de carga a partir de um CSV do agrupamento (salvar_csv / modo incremental)"""
+    return lambda: ler_csv(caminho)
+
+
+def carregar_agrupamento(fonte='agregada', dimensoes=None, granularidade='ano'):
+    """Função de carga que roda o agrupamento em consulta única (precisa do banco ou do Parquet)"""
+    from agrupamento_vendas_medicamentos import AgrupadorVendasMedicamentos, DIMENSOES_PADRAO, escolher_fonte
+
+    def carregar():
+        agrupador = AgrupadorVendasMedicamentos(fonte=escolher_fonte(fonte), dimensoes=dimensoes or DIMENSOES_PADRAO,
+                                                granularidade=granularidade)
+        if not agrupador.processar_consulta_unica():
+            raise RuntimeError(f"Agrupamento da fonte {fonte} falhou")
+        return agrupador.df_final
+    return carregar
+
+
+def criar_servidor(servico, host='127.0.0.1', porta=PORTA_PADRAO, registrar_requisicoes=False):
+    """ThreadingHTTPServer pronto para serve_forever()"""
+    manipulador = type('Manipulador', (ManipuladorConsultas,), {'registrar_requisicoes': registrar_requisicoes})
+    servidor = ThreadingHTTPServer((host, porta), manipulador)
+    servidor.servico = servico
+    return servidor
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Serviço HTTP local de consultas sobre o agrupamento de vendas")
+    origem = parser.add_mutually_exclusive_group()
+    origem.add_argument("--csv", default=None,
+                        help="CSV do agrupamento (padrão: dados_agrupados/vendas_agrupadas_incremental.csv)")
+    origem.add_argument("--fonte", default=None, help="roda o agrupamento nesta fonte em vez de ler um CSV")
+    parser.add_argument("--dimensoes", nargs="+", default=None, help="com --fonte, dimensões do agrupamento")
+    parser.add_argument("--granularidade", choices=('ano', 'mes'), default='ano', help="com --fonte")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--origem-cors", default='*',
+                        help="valor de Access-Control-Allow-Origin ('' desliga; padrão: *)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="mostra cada requisição")
+    args = parser.parse_args()
+
+    if args.fonte:
+        servico = ServicoConsultas(carregar_agrupamento(args.fonte, args.dimensoes, args.granularidade),
+                                   origem_cors=args.origem_cors)
+    else:
+        caminho = args.csv or os.path.join('dados_agrupados', 'vendas_agrupadas_incremental.csv')
+        if not os.path.exists(caminho):
+            print(f"❌ CSV não encontrado: {caminho}")
+            sys.exit(1)
+        servico = ServicoConsultas(carregar_csv(caminho), caminho_csv=caminho, origem_cors=args.origem_cors)
+
+    servidor = criar_servidor(servico, args.host, args.porta, args.verbose)
+    print(f"🌐 Servindo em http://{args.host}:{args.porta} (/vendas, /ranking, /dimensoes, /saude)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Encerrando")
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
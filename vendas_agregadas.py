@@ -0,0 +1,273 @@
+"""
+Tabela de totais pré-agregados (vendas_agregadas), mantida a cada lote carregado
+
+Chave: (ANO_VENDA, MES_VENDA, MUNICIPIO_VENDA, PRINCIPIO_ATIVO). Os gravadores
+de insercao_em_lote / carga_em_massa somam cada lote aqui na mesma transação
+dos registros de detalhe (ou dos codificados, na carga --codificado), então as
+tabelas andam juntas.
+
+Uso:
+    python vendas_agregadas.py --criar
+    python vendas_agregadas.py --reconstruir   # recalcula tudo a partir do detalhe
+    python vendas_agregadas.py --verificar     # compara com vendas_medicamentos
+    python vendas_agregadas.py --verificar --fonte codificada   # base carregada com --codificado
+"""
+import argparse
+import os
+import sys
+import time
+
+# Adicionar o diretório atual ao path para importar meuDB
+sys.path.append(os.path.dirname(__file__))
+
+from dimensoes import TABELA_MUNICIPIOS, TABELA_PRINCIPIOS, TABELA_VENDAS_CODIFICADA
+
+TABELA_AGREGADA = "trampo.vendas_agregadas"
+TABELA_DETALHE = "trampo.vendas_medicamentos"
+
+# Tabelas que alimentam a agregada: FROM (com alias v) e expressões de município e princípio ativo.
+# Na codificada os nomes voltam pelas dimensões, como a carga --codificado os soma.
+FONTES_AGREGADA = {
+    'detalhe': {
+        'tabela': TABELA_DETALHE,
+        'origem': f"{TABELA_DETALHE} v",
+        'municipio': "COALESCE(v.MUNICIPIO_VENDA, '')",
+        'principio': "COALESCE(v.PRINCIPIO_ATIVO, '')",
+    },
+    'codificada': {
+        'tabela': TABELA_VENDAS_CODIFICADA,
+        'origem': f"""{TABELA_VENDAS_CODIFICADA} v
+                      JOIN {TABELA_MUNICIPIOS} m ON m.ID = v.ID_MUNICIPIO
+                      JOIN {TABELA_PRINCIPIOS} p ON p.ID = v.ID_PRINCIPIO_ATIVO""",
+        'municipio': "m.NOME",
+        'principio': "p.NOME",
+    },
+}
+
+DDL_AGREGADA = f"""
+    CREATE TABLE IF NOT EXISTS {TABELA_AGREGADA} (
+        ANO_VENDA int NOT NULL,
+        MES_VENDA int NOT NULL,
+        MUNICIPIO_VENDA varchar(100) NOT NULL,
+        PRINCIPIO_ATIVO varchar(255) NOT NULL,
+        TOTAL_VENDIDO bigint NOT NULL DEFAULT 0,
+        TOTAL_REGISTROS bigint NOT NULL DEFAULT 0,
+        PRIMARY KEY (ANO_VENDA, MES_VENDA, MUNICIPIO_VENDA, PRINCIPIO_ATIVO)
+    )
+"""
+
+UPSERT_AGREGADA = f"""
+    INSERT INTO {TABELA_AGREGADA}
+    (ANO_VENDA, MES_VENDA, MUNICIPIO_VENDA, PRINCIPIO_ATIVO, TOTAL_VENDIDO, TOTAL_REGISTROS)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        TOTAL_VENDIDO = TOTAL_VENDIDO + VALUES(TOTAL_VENDIDO),
+        TOTAL_REGISTROS = TOTAL_REGISTROS + VALUES(TOTAL_REGISTROS)
+"""
+
+
+def acumular(acumulado, registros):
+    """Soma registros de detalhe (tuplas na ordem de COLUNAS_VENDAS) em `acumulado`
+
+    `acumulado` é um dict (ano, mes, municipio, principio) -> [total, registros].
+    """
+    for ano, mes, principio, municipio, qtd, _, _ in registros:
+        chave = (ano, mes, municipio, principio)
+        totais = acumulado.get(chave)
+        if totais is None:
+            acumulado[chave] = [qtd, 1]
+        else:
+            totais[0] += qtd
+            totais[1] += 1
+    return acumulado
+
+
+def gravar_acumulado(cursor, acumulado):
+    """Aplica os totais acumulados na tabela agregada (no commit do cursor)"""
+    if not acumulado:
+        return 0
+    cursor.executemany(UPSERT_AGREGADA,
+                       [chave + (totais[0], totais[1]) for chave, totais in acumulado.items()])
+    return len(acumulado)
+
+
+def somar_registros(cursor, registros):
+    """Atalho: acumula `registros` e grava os totais no mesmo cursor"""
+    return gravar_acumulado(cursor, acumular({}, registros))
+
+
+def tabelas_existentes(cursor, tabelas):
+    """Subconjunto de `tabelas` (nomes esquema.tabela) que existe no banco"""
+    existentes = set()
+    for tabela in tabelas:
+        esquema, nome = tabela.split('.', 1)
+        cursor.execute("SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+                       (esquema, nome))
+        linha = cursor.fetchone()
+        if (list(linha.values())[0] if isinstance(linha, dict) else linha[0]):
+            existentes.add(tabela)
+    return existentes
+
+
+class VendasAgregadas:
+    """Manutenção da tabela vendas_agregadas
+
+    `fontes` são as tabelas de onde a agregada é recalculada e verificada
+    ('detalhe' e/ou 'codificada', conforme o modo da carga); com as duas, os
+    totais de cada chave são somados, como fazem as cargas.
+    """
+
+    def __init__(self, fontes=('detalhe',)):
+        invalidas = [fonte for fonte in fontes if fonte not in FONTES_AGREGADA]
+        if invalidas or not fontes:
+            raise ValueError(f"Fontes inválidas: {invalidas} (opções: {', '.join(FONTES_AGREGADA)})")
+        self.fontes = list(fontes)
+
+    def criar_tabela(self):
+        """Cria a tabela agregada se ainda não existir"""
+        from meuDB import get_db_cursor
+        with get_db_cursor() as cursor:
+            cursor.execute(DDL_AGREGADA)
+
+    def limpar_mes(self, cursor, ano, mes):
+        """Remove os totais de um (ano, mês) no cursor informado"""
+        cursor.execute(f"DELETE FROM {TABELA_AGREGADA} WHERE ANO_VENDA = %s AND MES_VENDA = %s",
+                       (ano, mes))
+
+    def reconstruir(self):
+        """Recalcula a tabela agregada inteira a partir das fontes"""
+        from meuDB import get_db_cursor
+        print(f"🔧 Reconstruindo vendas_agregadas a partir de: {', '.join(self.fontes)}...")
+        inicio = time.time()
+        self.criar_tabela()
+        with get_db_cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABELA_AGREGADA}")
+            linhas = 0
+            for fonte in self.fontes:
+                # Com mais de uma fonte, a mesma chave pode vir das duas: soma como a carga faz
+                cursor.execute(f"""
+                    INSERT INTO {TABELA_AGREGADA}
+                    (ANO_VENDA, MES_VENDA, MUNICIPIO_VENDA, PRINCIPIO_ATIVO, TOTAL_VENDIDO, TOTAL_REGISTROS)
+                    {self._consulta_totais(fonte, detalhado=True)}
+                    ON DUPLICATE KEY UPDATE
+                        TOTAL_VENDIDO = TOTAL_VENDIDO + VALUES(TOTAL_VENDIDO),
+                        TOTAL_REGISTROS = TOTAL_REGISTROS + VALUES(TOTAL_REGISTROS)
+                """)
+                linhas += cursor.rowcount
+        print(f"✅ {linhas:,} linhas agregadas em {time.time() - inicio:.1f}s")
+        return linhas
+
+    @staticmethod
+    def _consulta_totais(fonte, detalhado):
+        """SELECT de (ano, mês[, município, princípio]) com total vendido e registros de uma fonte"""
+        config = FONTES_AGREGADA[fonte]
+        chave = colunas = "v.ANO_VENDA, v.MES_VENDA"
+        if detalhado:
+            chave += f", {config['municipio']}, {config['principio']}"
+            # Com alias: m.NOME e p.NOME viram a mesma chave num cursor de dicts
+            colunas += f", {config['municipio']} AS MUNICIPIO_VENDA, {config['principio']} AS PRINCIPIO_ATIVO"
+        return f"""
+            SELECT {colunas}, COALESCE(SUM(v.QTD_VENDIDA), 0) AS TOTAL_VENDIDO, COUNT(*) AS TOTAL_REGISTROS
+            FROM {config['origem']}
+            GROUP BY {chave}
+        """
+
+    def meses_faltando(self):
+        """(ano, mês) com registros em alguma fonte e nenhuma linha na agregada
+
+        Meses carregados antes de a agregada existir só entram nela com
+        --reconstruir. Fontes cuja tabela não existe são ignoradas. As
+        consultas são varreduras soltas de índices que começam por
+        (ANO_VENDA, MES_VENDA).
+        """
+        from meuDB import get_db_cursor
+        self.criar_tabela()
+        carregados = set()
+        with get_db_cursor() as cursor:
+            existentes = tabelas_existentes(cursor, [FONTES_AGREGADA[fonte]['tabela'] for fonte in self.fontes])
+            for fonte in self.fontes:
+                tabela = FONTES_AGREGADA[fonte]['tabela']
+                if tabela in existentes:
+                    cursor.execute(f"SELECT DISTINCT ANO_VENDA, MES_VENDA FROM {tabela}")
+                    carregados.update(self._tuplas(cursor))
+            cursor.execute(f"SELECT DISTINCT ANO_VENDA, MES_VENDA FROM {TABELA_AGREGADA}")
+            agregada = set(self._tuplas(cursor))
+        return sorted(carregados - agregada)
+
+    def verificar(self, detalhado=False):
+        """Compara os totais por (ano, mês) da agregada com os das fontes
+
+        Com `detalhado=True` compara também por município e princípio ativo.
+        Retorna a lista de divergências (vazia se tudo bate).
+        """
+        from meuDB import get_db_cursor
+        print(f"🔍 Verificando vendas_agregadas contra: {', '.join(self.fontes)}...")
+        if detalhado:
+            chave_agregada = "ANO_VENDA, MES_VENDA, MUNICIPIO_VENDA, PRINCIPIO_ATIVO"
+        else:
+            chave_agregada = "ANO_VENDA, MES_VENDA"
+
+        with get_db_cursor() as cursor:
+            detalhe = {}
+            for fonte in self.fontes:
+                cursor.execute(self._consulta_totais(fonte, detalhado))
+                for linha in self._tuplas(cursor):
+                    total, registros = detalhe.get(tuple(linha[:-2]), (0, 0))
+                    detalhe[tuple(linha[:-2])] = (total + int(linha[-2]), registros + int(linha[-1]))
+
+            cursor.execute(f"""
+                SELECT {chave_agregada}, SUM(TOTAL_VENDIDO), SUM(TOTAL_REGISTROS)
+                FROM {TABELA_AGREGADA}
+                GROUP BY {chave_agregada}
+            """)
+            agregada = {tuple(linha[:-2]): (int(linha[-2]), int(linha[-1])) for linha in self._tuplas(cursor)}
+
+        divergencias = []
+        for chave in sorted(set(detalhe) | set(agregada), key=str):
+            esperado = detalhe.get(chave, (0, 0))
+            obtido = agregada.get(chave, (0, 0))
+            if esperado != obtido:
+                divergencias.append({"chave": chave, "detalhe": esperado, "agregada": obtido})
+
+        if divergencias:
+            print(f"❌ {len(divergencias):,} divergências (total vendido, registros):")
+            for divergencia in divergencias[:10]:
+                print(f"   {divergencia['chave']}: detalhe={divergencia['detalhe']} "
+                      f"agregada={divergencia['agregada']}")
+        else:
+            print(f"✅ Tabela agregada confere ({len(detalhe):,} chaves)")
+        return divergencias
+
+    @staticmethod
+    def _tuplas(cursor):
+        """Linhas do cursor como tuplas, seja ele de dicts ou de tuplas"""
+        for linha in cursor.fetchall():
+            yield tuple(linha.values()) if isinstance(linha, dict) else tuple(linha)
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Manutenção da tabela vendas_agregadas")
+    parser.add_argument("--criar", action="store_true", help="cria a tabela se não existir")
+    parser.add_argument("--reconstruir", action="store_true", help="recalcula a tabela a partir das fontes")
+    parser.add_argument("--verificar", action="store_true", help="compara a tabela com as fontes")
+    parser.add_argument("--detalhado", action="store_true",
+                        help="na verificação, compara por município e princípio ativo")
+    parser.add_argument("--fonte", nargs='+', choices=list(FONTES_AGREGADA), default=['detalhe'],
+                        help="de onde recalcular/verificar: detalhe (vendas_medicamentos), codificada "
+                             "(vendas_medicamentos_cod, carga --codificado) ou as duas (padrão: detalhe)")
+    args = parser.parse_args()
+
+    agregadas = VendasAgregadas(fontes=args.fonte)
+    if args.criar:
+        agregadas.criar_tabela()
+        print("✅ Tabela vendas_agregadas pronta")
+    if args.reconstruir:
+        agregadas.reconstruir()
+    if args.verificar:
+        divergencias = agregadas.verificar(detalhado=args.detalhado)
+        sys.exit(1 if divergencias else 0)
+
+
+if __name__ == "__main__":
+    main()